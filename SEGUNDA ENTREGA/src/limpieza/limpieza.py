@@ -124,6 +124,8 @@ test = aux[~((aux["month"].isin([11, 12])) | (aux["day"] < 15))].drop(columns=["
 # Ajustar el preprocesador a los datos de entrenamiento
 preprocessor.fit(train)
 feature_names = get_ct_feature_names(preprocessor)
+# tiempoReal aplica este mismo preprocesador a las variables calculadas en línea
+joblib.dump(preprocessor, "../../models/preprocesador.joblib")
 
 train_transformed = preprocessor.transform(train)
 test_transformed = preprocessor.transform(test)
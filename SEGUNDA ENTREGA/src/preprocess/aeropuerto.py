@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from pyproj import Transformer
+
+RUNWAYS_GEOJSON  = "../json/puntosespera/runways.geojson"
+HOLDINGS_GEOJSON = "../json/puntosespera/holding_points.geojson"
+TAXIWAYS_GEOJSON = "../json/puntosespera/taxiways.geojson"
+RUNWAY_CENTERS   = "../json/runway_takeoffs_centers.json"
+HOLDING_BUFFER   = 0.0002  # ~20 metros, en grados como en filtrado.adding_holding_points
+UTM_EPSG         = 32630   # UTM 30N, la proyección de filtrado.adding_runways
+R_TIERRA         = 6371000 # metros, el mismo radio que filtrado.haversine
+
+# Rejilla de zonas precalculada (ver build_zone_grid)
+GRID_RESOLUTION  = 4.0     # metros por celda, entre 2 y 5 m
+GRID_PATH        = "../json/puntosespera/zonas_{resolution:g}m.npy"
+GRID_MARGIN      = 2       # celdas libres alrededor de la geometría
+CAPAS            = ["runway", "holding", "taxiway"]
+BORDE            = 255     # celda cortada por algún borde: se resuelve con el test exacto
+
+class Aeropuerto:
+    """Pistas (proyectadas a UTM) y puntos de espera (con su buffer) preparados una sola vez.
+
+    Responde a qué pista / punto de espera pertenece cada posición sobre arrays de lat/lon,
+    con shapely.contains_xy y sin crear un Point por posición.
+    """
+    def __init__(self, runways_path=RUNWAYS_GEOJSON, holdings_path=HOLDINGS_GEOJSON,
+                 buffer_radius=HOLDING_BUFFER, centers_path=RUNWAY_CENTERS, taxiways_path=TAXIWAYS_GEOJSON):
+        self.paths = {"runway": runways_path, "holding": holdings_path, "taxiway": taxiways_path}
+        self.buffer_radius = buffer_radius
+        self.to_utm = Transformer.from_crs("EPSG:4326", f"EPSG:{UTM_EPSG}", always_xy=True)
+
+        with open(runways_path, 'r', encoding='utf-8') as f:
+            runways = json.load(f)['features']
+        self.runway_names = np.array([feat['properties']['RWY'] for feat in runways], dtype=object)
+        self.runways_lonlat = np.array([shape(feat['geometry']) for feat in runways], dtype=object)
+        self.runways = shapely.transform(self.runways_lonlat, self._project)
+        self.runway_bounds = shapely.bounds(self.runways)
+        shapely.prepare(self.runways)
+
+        with open(holdings_path, 'r', encoding='utf-8') as f:
+            holdings = json.load(f)['features']
+        # mismo id que asigna filtrado (posición en el fichero) cuando el geojson no trae 'id'
+        self.holding_ids = np.array([feat['properties'].get('id', i) for i, feat in enumerate(holdings)])
+        points = np.array([shape(feat['geometry']) for feat in holdings], dtype=object)
+        self.holding_xy = shapely.get_coordinates(points)[:, :2]
+        # 16 segmentos por cuadrante, los mismos que usa GeoSeries.buffer
+        self.holdings = shapely.buffer(points, buffer_radius, quad_segs=16)
+        self.holding_bounds = shapely.bounds(self.holdings)
+        shapely.prepare(self.holdings)
+
+        self.taxiways = None
+        self.taxiways_lonlat = np.array([], dtype=object)
+        if taxiways_path is not None and os.path.exists(taxiways_path):
+            with open(taxiways_path, 'r', encoding='utf-8') as f:
+                taxiways = json.load(f)['features']
+            self.taxiways_lonlat = np.array([shape(feat['geometry']) for feat in taxiways], dtype=object)
+            self.taxiways = shapely.transform(self.taxiways_lonlat, self._project)
+            self.taxiway_bounds = shapely.bounds(self.taxiways)
+            shapely.prepare(self.taxiways)
+
+        with open(centers_path, 'r', encoding='utf-8') as f:
+            self.centers = json.load(f)
+        # cada punto de espera se asigna a la pista con el centro de despegue más cercano
+        self.runway_order = sorted(self.centers)
+        centros = np.array([[self.centers[rw]['lon_despegue_onground'], self.centers[rw]['lat_despegue_onground']] for rw in self.runway_order])
+        dist = np.hypot(self.holding_xy[:, None, 0] - centros[None, :, 0], self.holding_xy[:, None, 1] - centros[None, :, 1])
+        self.holding_runway = [self.runway_order[i] for i in dist.argmin(axis=1)]
+
+    def _project(self, coords):
+        x, y = self.to_utm.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+
+    @staticmethod
+    def _first_within(geoms, bounds, x, y):
+        """Índice de la primera geometría que contiene estrictamente cada punto (-1 si ninguna)."""
+        idx = np.full(len(x), -1, dtype=np.int64)
+        for i, (geom, (xmin, ymin, xmax, ymax)) in enumerate(zip(geoms, bounds)):
+            cand = np.flatnonzero((idx < 0) & (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))
+            if len(cand):
+                idx[cand[shapely.contains_xy(geom, x[cand], y[cand])]] = i
+        return idx
+
+    def runway_of(self, lat, lon):
+        """Pista (RWY) de cada posición, None fuera de pista."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        x, y = self.to_utm.transform(lon, lat)
+        idx = self._first_within(self.runways, self.runway_bounds, np.asarray(x), np.asarray(y))
+        out = np.full(len(lat), None, dtype=object)
+        out[idx >= 0] = self.runway_names[idx[idx >= 0]]
+        return out
+
+    def holding_of(self, lat, lon):
+        """Id del punto de espera de cada posición (NaN fuera de todos)."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        idx = self._first_within(self.holdings, self.holding_bounds, lon, lat)
+        out = np.full(len(lat), np.nan)
+        out[idx >= 0] = self.holding_ids[idx[idx >= 0]]
+        return out
+
+    def taxiway_of(self, lat, lon):
+        """True para las posiciones dentro de alguna calle de rodaje."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if self.taxiways is None:
+            return np.zeros(len(lat), dtype=bool)
+        x, y = self.to_utm.transform(lon, lat)
+        return self._first_within(self.taxiways, self.taxiway_bounds, np.asarray(x), np.asarray(y)) >= 0
+
+    def runway_at(self, lon, lat):
+        return self.runway_of([lat], [lon])[0]
+
+    def holding_at(self, lon, lat):
+        holding = self.holding_of([lat], [lon])[0]
+        return None if np.isnan(holding) else int(holding)
+
+# ---------------------------------------------------------------- rejilla de zonas
+
+def _dilatar(mask):
+    """Añade a la máscara las 8 celdas vecinas de cada celda marcada."""
+    h, w = mask.shape
+    p = np.pad(mask, 1)
+    out = np.zeros_like(mask)
+    for dy in range(3):
+        for dx in range(3):
+            out |= p[dy:dy + h, dx:dx + w]
+    return out
+
+def _rasterize(layer, geoms, values, x0, y0, resolution):
+    """Pinta cada geometría (en metros) sobre la capa.
+
+    El contorno se muestrea cada media celda y se marcan como borde las celdas de las muestras y sus
+    vecinas: así quedan marcadas todas las que corta el contorno, con más de media celda de margen
+    para la diferencia entre la proyección local y la del test exacto (UTM o grados). El resto de
+    celdas está entera dentro o fuera y basta con su centro. Si dos geometrías se solapan gana la
+    primera, como en Aeropuerto._first_within.
+    """
+    ny, nx = layer.shape
+    for geom, value in zip(geoms, values):
+        gx0, gy0, gx1, gy1 = geom.bounds
+        c0 = max(int(np.floor((gx0 - x0) / resolution)) - 1, 0)
+        c1 = min(int(np.floor((gx1 - x0) / resolution)) + 2, nx)
+        r0 = max(int(np.floor((gy0 - y0) / resolution)) - 1, 0)
+        r1 = min(int(np.floor((gy1 - y0) / resolution)) + 2, ny)
+        xs = x0 + resolution * (np.arange(c0, c1) + 0.5)
+        ys = y0 + resolution * (np.arange(r0, r1) + 0.5)
+        X, Y = np.meshgrid(xs, ys)
+        dentro = shapely.contains_xy(geom, X, Y)
+
+        muestras = shapely.get_coordinates(shapely.segmentize(geom, resolution / 2))
+        cols = np.floor((muestras[:, 0] - x0) / resolution).astype(np.int64) - c0
+        rows = np.floor((muestras[:, 1] - y0) / resolution).astype(np.int64) - r0
+        ok = (cols >= 0) & (cols < c1 - c0) & (rows >= 0) & (rows < r1 - r0)
+        borde = np.zeros_like(dentro)
+        borde[rows[ok], cols[ok]] = True
+        borde = _dilatar(borde)
+
+        sub = layer[r0:r1, c0:c1]
+        sub[dentro & ~borde & (sub == 0)] = value
+        sub[borde] = BORDE
+
+def grid_meta_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+def grid_sources(index):
+    """Huella de la geometría de la que sale la rejilla: si cambia, la rejilla se reconstruye."""
+    from manifest import sha256_file
+    sources = {capa: (sha256_file(path) if path is not None and os.path.exists(path) else None)
+               for capa, path in index.paths.items()}
+    sources["buffer_radius"] = index.buffer_radius
+    return sources
+
+def build_zone_grid(index, resolution=GRID_RESOLUTION, path=None):
+    """Rasteriza pistas, puntos de espera (con buffer) y calles de rodaje en una rejilla métrica local.
+
+    La proyección es equirectangular centrada en el aeropuerto: lineal en lat/lon, así que localizar la
+    celda de una posición son dos multiplicaciones, sin pyproj. Guarda un .npy uint8 de forma (capas, filas, columnas) que se abre con mmap, y un .json con el
+    origen, la resolución y las fuentes. En cada capa 0 es fuera, k la geometría k-1 y BORDE una celda
+    que hay que resolver con el test exacto.
+    """
+    path = path or GRID_PATH.format(resolution=resolution)
+    start = time.perf_counter()
+    capas = {"runway": index.runways_lonlat, "holding": index.holdings, "taxiway": index.taxiways_lonlat}
+    for capa in ("runway", "holding"):
+        if len(capas[capa]) >= BORDE:
+            raise ValueError(f"Demasiadas geometrías en la capa {capa} para una rejilla uint8: {len(capas[capa])}")
+
+    bounds = np.vstack([shapely.bounds(geoms) for geoms in capas.values() if len(geoms)])
+    lon0 = float((bounds[:, 0].min() + bounds[:, 2].max()) / 2)
+    lat0 = float((bounds[:, 1].min() + bounds[:, 3].max()) / 2)
+    ky = R_TIERRA * np.pi / 180
+    kx = ky * np.cos(np.radians(lat0))
+    local = lambda coords: np.column_stack([(coords[:, 0] - lon0) * kx, (coords[:, 1] - lat0) * ky])
+    capas = {capa: shapely.transform(geoms, local) for capa, geoms in capas.items()}
+    bounds = np.vstack([shapely.bounds(geoms) for geoms in capas.values() if len(geoms)])
+    margin = GRID_MARGIN * resolution
+    x0 = np.floor((bounds[:, 0].min() - margin) / resolution) * resolution
+    y0 = np.floor((bounds[:, 1].min() - margin) / resolution) * resolution
+    nx = int(np.ceil((bounds[:, 2].max() + margin - x0) / resolution))
+    ny = int(np.ceil((bounds[:, 3].max() + margin - y0) / resolution))
+
+    grid = np.zeros((len(CAPAS), ny, nx), dtype=np.uint8)
+    for k, capa in enumerate(CAPAS):
+        geoms = capas[capa]
+        # las calles de rodaje sólo marcan dentro / fuera
+        values = np.ones(len(geoms), dtype=np.uint8) if capa == "taxiway" else np.arange(1, len(geoms) + 1, dtype=np.uint8)
+        _rasterize(grid[k], geoms, values, x0, y0, resolution)
+
+    meta = {
+        "proyeccion": {"lon0": lon0, "lat0": lat0, "kx": float(kx), "ky": float(ky)},
+        "resolution": resolution,
+        "x0": float(x0),
+        "y0": float(y0),
+        "shape": list(grid.shape),
+        "capas": CAPAS,
+        "borde": BORDE,
+        "sources": grid_sources(index),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # escritura atómica: los workers pueden estar abriendo la rejilla a la vez
+    tmp = os.path.splitext(path)[0] + f".{os.getpid()}.tmp.npy"
+    np.save(tmp, grid)
+    with open(tmp[:-4] + ".json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp[:-4] + ".json", grid_meta_path(path))
+    os.replace(tmp, path)
+    bordes = (grid == BORDE).mean(axis=(1, 2))
+    print(f"🗺️ Rejilla de zonas {ny}x{nx} a {resolution:g} m ({grid.nbytes / 1024 ** 2:.1f} MB) en {time.perf_counter() - start:.1f}s; "
+          f"celdas de borde: " + ", ".join(f"{capa} {100 * b:.2f}%" for capa, b in zip(CAPAS, bordes)))
+    return path
+
+class ZonasGrid:
+    """Clasificación de posiciones con un acceso a la rejilla precalculada por capa.
+
+    Sólo las posiciones que caen en celdas de borde pasan por el test exacto de Aeropuerto,
+    así que el resultado es idéntico al de runway_of / holding_of / taxiway_of.
+    """
+    def __init__(self, index, path):
+        self.index = index
+        self.path = path
+        with open(grid_meta_path(path), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.grid = np.load(path, mmap_mode='r')
+        self.capas = {capa: k for k, capa in enumerate(self.meta["capas"])}
+        # columna = lon * col_a + col_b, fila = lat * row_a + row_b
+        proj = self.meta["proyeccion"]
+        resolution = self.meta["resolution"]
+        self.col_a = proj["kx"] / resolution
+        self.col_b = (-proj["lon0"] * proj["kx"] - self.meta["x0"]) / resolution
+        self.row_a = proj["ky"] / resolution
+        self.row_b = (-proj["lat0"] * proj["ky"] - self.meta["y0"]) / resolution
+
+    def lookup(self, capa, lat, lon):
+        """Código de la rejilla para cada posición (0 fuera de la rejilla o con lat/lon NaN)."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        _, ny, nx = self.grid.shape
+        with np.errstate(invalid='ignore'):
+            col = np.floor(lon * self.col_a + self.col_b)
+            row = np.floor(lat * self.row_a + self.row_b)
+            dentro = (col >= 0) & (col < nx) & (row >= 0) & (row < ny)
+        codes = np.zeros(len(lat), dtype=np.uint8)
+        codes[dentro] = self.grid[self.capas[capa], row[dentro].astype(np.int64), col[dentro].astype(np.int64)]
+        return codes
+
+    def _utm(self, lat, lon):
+        x, y = self.index.to_utm.transform(lon, lat)
+        return np.asarray(x), np.asarray(y)
+
+    def runway_of(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        codes = self.lookup("runway", lat, lon)
+        idx = codes.astype(np.int64) - 1
+        borde = codes == BORDE
+        if borde.any():
+            # sólo las posiciones de borde se proyectan a UTM para el test exacto
+            x, y = self._utm(lat[borde], lon[borde])
+            idx[borde] = self.index._first_within(self.index.runways, self.index.runway_bounds, x, y)
+        out = np.full(len(codes), None, dtype=object)
+        out[idx >= 0] = self.index.runway_names[idx[idx >= 0]]
+        return out
+
+    def holding_of(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        codes = self.lookup("holding", lat, lon)
+        idx = codes.astype(np.int64) - 1
+        borde = codes == BORDE
+        if borde.any():
+            # los buffers están en grados: el test exacto usa lat/lon como Aeropuerto.holding_of
+            idx[borde] = self.index._first_within(self.index.holdings, self.index.holding_bounds, lon[borde], lat[borde])
+        out = np.full(len(codes), np.nan)
+        out[idx >= 0] = self.index.holding_ids[idx[idx >= 0]]
+        return out
+
+    def taxiway_of(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        codes = self.lookup("taxiway", lat, lon)
+        out = codes == 1
+        borde = codes == BORDE
+        if borde.any() and self.index.taxiways is not None:
+            x, y = self._utm(lat[borde], lon[borde])
+            out[borde] = self.index._first_within(self.index.taxiways, self.index.taxiway_bounds, x, y) >= 0
+        return out
+
+_aeropuertos = {}
+_zonas = {}
+
+def get_aeropuerto(runways_path=RUNWAYS_GEOJSON, holdings_path=HOLDINGS_GEOJSON, buffer_radius=HOLDING_BUFFER):
+    """Índice del aeropuerto de este proceso: se construye en la primera llamada de cada worker."""
+    key = (runways_path, holdings_path, buffer_radius)
+    if key not in _aeropuertos:
+        _aeropuertos[key] = Aeropuerto(runways_path, holdings_path, buffer_radius)
+    return _aeropuertos[key]
+
+def get_zonas(resolution=GRID_RESOLUTION, runways_path=RUNWAYS_GEOJSON, holdings_path=HOLDINGS_GEOJSON,
+              buffer_radius=HOLDING_BUFFER, path=None):
+    """Rejilla de zonas de este proceso, abierta con mmap (todos los workers comparten las páginas).
+    Se reconstruye si no existe o si ha cambiado la geometría de la que salió."""
+    key = (resolution, runways_path, holdings_path, buffer_radius, path)
+    if key not in _zonas:
+        index = get_aeropuerto(runways_path, holdings_path, buffer_radius)
+        path = path or GRID_PATH.format(resolution=resolution)
+        meta = None
+        if os.path.exists(path) and os.path.exists(grid_meta_path(path)):
+            with open(grid_meta_path(path), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        if meta is None or meta.get("sources") != grid_sources(index) or meta.get("resolution") != resolution:
+            build_zone_grid(index, resolution, path)
+        _zonas[key] = ZonasGrid(index, path)
+    return _zonas[key]
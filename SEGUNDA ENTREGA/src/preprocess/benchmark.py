@@ -0,0 +1,351 @@
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import tempfile
+import tracemalloc
+import multiprocessing as mp
+from contextlib import contextmanager
+import pandas as pd
+import sintetico
+
+# Rendimiento de las cuatro etapas y de sus funciones más pesadas sobre días sintéticos (sintetico.py) de
+# varios tamaños. Cada etapa corre en un proceso nuevo para que su pico de memoria sea sólo suyo; las medidas
+# se comparan con una referencia guardada y cualquier regresión (más lento, más memoria o filas distintas,
+# el día sintético es determinista) hace fallar el benchmark
+
+# Argumentos de sintetico.generate por escala
+ESCALAS = {
+    "pequeña": dict(n_aviones=4,  n_rotaciones=3, n_sobrevuelos=10, n_ruido=20),
+    "media":   dict(n_aviones=8,  n_rotaciones=6, n_sobrevuelos=30, n_ruido=40),
+    "grande":  dict(n_aviones=24, n_rotaciones=6, n_sobrevuelos=90, n_ruido=120, horas=12, antenas=2),
+}
+ETAPAS    = ["decodificacion", "filtrado", "puntosEspera", "despeguesPrevios"]
+FUNCIONES = ["process_chunk", "process_chunk_estela", "add_position", "adding_runways", "process_flight"]
+
+PROCESSES    = 2   # núcleos de los pools de decodificacion, filtrado y despeguesPrevios
+REPETICIONES = 3   # las funciones se miden REPETICIONES veces y se queda el mejor tiempo
+MAX_VUELOS   = 5   # vuelos de despeguesPrevios.process_flight por medida (va fila a fila)
+
+BASELINE           = "D:/data/benchmark/baseline.json"
+TOLERANCIA_TIEMPO  = 0.25  # fracción más lento que la referencia que se acepta
+TOLERANCIA_MEMORIA = 0.25
+
+DIA = sintetico.DIA
+
+# ------------------------------------------------------------------ rutas del día sintético
+
+def rutas(base):
+    a, m, d = str(DIA.year), str(DIA.month), DIA.day
+    semana = f"{d}_{d + 1}"
+    return {
+        "raw":         os.path.join(base, "raw", a, f"{DIA.month:02d}", f"{d:02d}"),
+        "decodificado": os.path.join(base, "decodificado", a, m, f"{d}.parquet"),
+        "despegues":   os.path.join(base, "filtrado", "despegues", a, m, f"{d}.parquet"),
+        "aterrizajes": os.path.join(base, "filtrado", "aterrizajes", a, m, f"{d}.parquet"),
+        "raros":       os.path.join(base, "filtrado", "raros", a, m, f"{d}.parquet"),
+        "enEspera":    os.path.join(base, "enEspera", a, m, f"{semana}.parquet"),
+        "processed":   os.path.join(base, "processed", a, m, f"{semana}.parquet"),
+        "base_despegues": os.path.join(base, "filtrado", "despegues"),
+        "estela":      os.path.join(base, "estela", "registro.parquet"),
+        "estela_dias": os.path.join(base, "estela", "dias"),
+    }
+
+@contextmanager
+def rutas_globales(r):
+    """despeguesPrevios.DESPEGUES, estela.REGISTRO y estela.PARTES dentro del directorio del día sintético mientras dura el bloque."""
+    import despeguesPrevios
+    import estela
+    anteriores = despeguesPrevios.DESPEGUES, estela.REGISTRO, estela.PARTES
+    despeguesPrevios.DESPEGUES, estela.REGISTRO, estela.PARTES = r["base_despegues"], r["estela"], r["estela_dias"]
+    try:
+        yield
+    finally:
+        despeguesPrevios.DESPEGUES, estela.REGISTRO, estela.PARTES = anteriores
+
+def run_stage(etapa, r):
+    """Ejecuta una etapa sobre las rutas r del día sintético; devuelve la ruta de su telemetría."""
+    for path in r.values():
+        if path.endswith(".parquet"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    with rutas_globales(r):
+        if etapa == "decodificacion":
+            import decodificacion
+            import estela
+            ok, salida = decodificacion.process_data(r["raw"], r["decodificado"], processes=PROCESSES), r["decodificado"]
+            # el registro que leen puntosEspera y despeguesPrevios es la suma de las partes por día
+            estela.consolidar()
+        elif etapa == "filtrado":
+            import filtrado
+            ok, salida = filtrado.process_data(r["decodificado"], r["despegues"], r["aterrizajes"], r["raros"], processes=PROCESSES), r["despegues"]
+        elif etapa == "puntosEspera":
+            import puntosEspera
+            ok, salida = puntosEspera.process_data(os.path.dirname(r["despegues"]), os.path.dirname(r["enEspera"]), DIA.day, DIA.day + 1), r["enEspera"]
+        else:
+            import despeguesPrevios
+            ok, salida = despeguesPrevios.process_week(r["enEspera"], r["processed"], processes=PROCESSES), r["processed"]
+    if ok is False:
+        raise RuntimeError(f"{etapa} devolvió False")
+    return os.path.splitext(salida)[0] + ".telemetria.json"
+
+def _stage_process(etapa, r, cola):
+    try:
+        cola.put(("ok", run_stage(etapa, r)))
+    except Exception as e:
+        cola.put(("error", repr(e)))
+
+def measure_stage(etapa, r):
+    """Una etapa en un proceso nuevo: segundos, mensajes/s y pico de memoria del padre y de sus workers.
+
+    Los tiempos son los de la telemetría de la propia etapa, sin el arranque del proceso.
+    """
+    ctx = mp.get_context("spawn")
+    cola = ctx.Queue()
+    proceso = ctx.Process(target=_stage_process, args=(etapa, r, cola))
+    proceso.start()
+    estado, valor = cola.get()
+    proceso.join()
+    if estado != "ok":
+        raise RuntimeError(f"{etapa}: {valor}")
+    with open(valor, 'r', encoding='utf-8') as f:
+        resumen = json.load(f)
+    # las etapas sin pool registran sus tareas con el pid del propio proceso
+    workers = {pid: mb for pid, mb in (resumen.get('peak_rss_mb_workers') or {}).items() if int(pid) != proceso.pid}
+    return {
+        'seconds':     resumen['seconds'],
+        'rows_in':     resumen['rows_in'],
+        'rows_out':    resumen['rows_out'],
+        'msgs_per_s':  resumen['msgs_per_s'],
+        'peak_mb':     resumen['peak_rss_mb_parent'],
+        'peak_mb_workers': max(workers.values(), default=None),
+    }
+
+# ------------------------------------------------------------------ funciones
+
+def measure(funcion, rows, repeticiones=REPETICIONES):
+    """Mejor tiempo de funcion() en repeticiones ejecuciones y pico de memoria asignada (tracemalloc) en una más."""
+    tiempos = []
+    for _ in range(repeticiones):
+        start = time.perf_counter()
+        rows_out = funcion()
+        tiempos.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        funcion()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    seconds = min(tiempos)
+    return {
+        'seconds':    round(seconds, 4),
+        'rows_in':    int(rows),
+        'rows_out':   int(rows_out),
+        'msgs_per_s': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_mb':    round(peak / 1024 ** 2, 1),
+    }
+
+def measure_functions(r, funciones=FUNCIONES):
+    """process_chunk sobre la hora con más mensajes, sin y con las observaciones de estela, add_position y adding_runways sobre el día decodificado
+    (ICAO a ICAO, como en filtrado) y process_flight sobre los primeros MAX_VUELOS vuelos de enEspera."""
+    import decodificacion
+    import filtrado
+    import despeguesPrevios
+    resultados = {}
+
+    if "process_chunk" in funciones or "process_chunk_estela" in funciones:
+        horas = sorted(glob.glob(os.path.join(r["raw"], "*")), key=lambda h: -sum(os.path.getsize(f) for f in glob.glob(os.path.join(h, "*.csv"))))
+        chunk = pd.concat([decodificacion.read_raw_csv(f) for f in sorted(glob.glob(os.path.join(horas[0], "*.csv")))], ignore_index=True)
+        if "process_chunk" in funciones:
+            resultados["process_chunk"] = measure(lambda: len(decodificacion.process_chunk(chunk.copy())), len(chunk))
+        # coste de REGISTRO_ESTELA en la decodificación: lo mismo alimentando el registro
+        if "process_chunk_estela" in funciones:
+            resultados["process_chunk_estela"] = measure(lambda: len(decodificacion.process_chunk(chunk.copy(), obs_estela=[])), len(chunk))
+
+    if "add_position" in funciones or "adding_runways" in funciones:
+        day = pd.read_parquet(r["decodificado"])
+        icaos = [df_icao for _, df_icao in day.sort_values("ts", kind='stable').groupby("icao", observed=True)]
+        if "add_position" in funciones:
+            resultados["add_position"] = measure(lambda: sum(len(filtrado.add_position(df_icao)) for df_icao in icaos), len(day))
+        posiciones = [p for p in (filtrado.add_position(df_icao) for df_icao in icaos) if not p.empty]
+        posiciones = [p[p['lat'].between(filtrado.BBOX['lat_min'], filtrado.BBOX['lat_max']) &
+                        p['lon'].between(filtrado.BBOX['lon_min'], filtrado.BBOX['lon_max'])] for p in posiciones]
+        posiciones = [p for p in posiciones if len(p)]
+        if "adding_runways" in funciones:
+            resultados["adding_runways"] = measure(
+                lambda: sum(filtrado.adding_runways(p, "../json/puntosespera/runways.geojson")["runway"].notna().sum() for p in posiciones),
+                sum(len(p) for p in posiciones))
+
+    if "process_flight" in funciones and os.path.exists(r["enEspera"]):
+        semana = pd.read_parquet(r["enEspera"]).sort_values("ts")
+        vuelos = [df for _, df in semana.groupby(["icao", "flight_id", "day"], observed=True)][:MAX_VUELOS]
+        with rutas_globales(r):
+            resultados["process_flight"] = measure(lambda: sum(len(despeguesPrevios.process_flight(v.copy())) for v in vuelos),
+                                                   sum(len(v) for v in vuelos), repeticiones=1)
+    return resultados
+
+# ------------------------------------------------------------------ alternativas sobre un día decodificado
+
+def pares_cpr(day):
+    """Pares par/impar de todos los ICAOs del día (mismo emparejamiento que filtrado.add_position)."""
+    import filtrado
+    day_pos = day[day['tc'].apply(filtrado.is_position_msg)].sort_values('ts')
+    msg_col = 'msg_hex' if 'msg_hex' in day_pos.columns else 'msg'
+    even_msgs = day_pos[day_pos['oe_flag']==0].rename(columns={'ts': 'ts_even'})
+    odd_msgs  = day_pos[day_pos['oe_flag']==1].rename(columns={'ts': 'ts_odd'})
+    return pd.merge_asof(even_msgs, odd_msgs, by='icao',
+        left_on='ts_even', right_on='ts_odd', tolerance=pd.Timedelta(seconds=filtrado.CPR_TOLERANCE),
+        direction='backward', suffixes=('_even','_odd')
+    ).loc[:, [f"{msg_col}_even", f"{msg_col}_odd", "ts_even", "ts_odd"]]
+
+def benchmark_cpr(path_dia):
+    """Tiempo de decodificar todas las posiciones de un día con pyModeS fila a fila (filtrado.decode_cpr) y con arrays."""
+    import adsbVectorizado as adsb_np
+    import filtrado
+    pairs = pares_cpr(pd.read_parquet(path_dia))
+    msg_col = 'msg_hex' if 'msg_hex_even' in pairs.columns else 'msg'
+    print(f"⏱️ {len(pairs)} pares par/impar en {path_dia}")
+
+    start = time.perf_counter()
+    filtrado.decode_cpr_pairs(pairs, msg_col)
+    t_np = time.perf_counter() - start
+
+    if msg_col == 'msg':
+        pairs = pairs.assign(msg_hex_even=adsb_np.get_msg_hex(pairs.rename(columns={'msg_even': 'msg'})),
+                             msg_hex_odd=adsb_np.get_msg_hex(pairs.rename(columns={'msg_odd': 'msg'})))
+    start = time.perf_counter()
+    pairs.apply(filtrado.decode_cpr, axis=1)
+    t_pms = time.perf_counter() - start
+
+    print(f"   pyModeS (apply): {t_pms:.2f}s   vectorizado: {t_np:.3f}s   x{t_pms / max(t_np, 1e-9):.0f}")
+    return t_pms, t_np
+
+def benchmark_cpr_local(path_dia):
+    """Tiempo de add_position por ICAO con CPR_MODE "global" y "local" y diferencia entre sus posiciones."""
+    import numpy as np
+    import filtrado
+    day = pd.read_parquet(path_dia).sort_values("ts", kind='stable')
+    icaos = [(icao, df_icao) for icao, df_icao in day.groupby("icao", observed=True)]
+    anterior = filtrado.CPR_MODE
+    tiempos, salidas = {}, {}
+    try:
+        for modo in ("global", "local"):
+            filtrado.CPR_MODE = modo
+            start = time.perf_counter()
+            salidas[modo] = [filtrado.add_position(df_icao) for _, df_icao in icaos]
+            tiempos[modo] = time.perf_counter() - start
+    finally:
+        filtrado.CPR_MODE = anterior
+
+    # se comparan las filas de mensajes de posición con posición en los dos modos
+    n_global = n_local = 0
+    dist = []
+    for g, l in zip(salidas["global"], salidas["local"]):
+        if g.empty or l.empty:
+            continue
+        tc = l['tc'].astype(np.float64).to_numpy()
+        pos = (tc >= 5) & (tc <= 18)
+        lat_g, lon_g = g['lat'].to_numpy()[pos], g['lon'].to_numpy()[pos]
+        lat_l, lon_l = l['lat'].to_numpy()[pos], l['lon'].to_numpy()[pos]
+        n_global += np.isfinite(lat_g).sum()
+        n_local += np.isfinite(lat_l).sum()
+        ambos = np.isfinite(lat_g) & np.isfinite(lat_l)
+        dist.append(filtrado.haversine_vectorized(lat_g[ambos], lon_g[ambos], lat_l[ambos], lon_l[ambos]))
+    dist = np.concatenate(dist) if dist else np.array([])
+    t_g, t_l = tiempos["global"], tiempos["local"]
+    print(f"⏱️ {len(icaos)} ICAOs en {path_dia}")
+    print(f"   global: {t_g:.2f}s ({n_global} posiciones)   local: {t_l:.2f}s ({n_local} posiciones)   x{t_g / max(t_l, 1e-9):.1f}")
+    if len(dist):
+        print(f"   distancia entre modos en los mensajes con posición en ambos: mediana {np.median(dist):.1f} m, p99 {np.percentile(dist, 99):.1f} m")
+    return t_g, t_l, dist
+
+# ------------------------------------------------------------------ referencia
+
+def compare(resultados, baseline, tolerancia_tiempo=TOLERANCIA_TIEMPO, tolerancia_memoria=TOLERANCIA_MEMORIA):
+    """Regresiones de resultados frente a baseline (ambos {clave: medidas}); las claves nuevas no cuentan."""
+    regresiones = []
+    for clave, medida in resultados.items():
+        ref = baseline.get(clave)
+        if ref is None:
+            continue
+        if medida['rows_out'] != ref['rows_out']:
+            regresiones.append(f"{clave}: {medida['rows_out']} filas de salida, la referencia tiene {ref['rows_out']}")
+        if medida['seconds'] > ref['seconds'] * (1 + tolerancia_tiempo):
+            regresiones.append(f"{clave}: {medida['seconds']:.3f}s frente a {ref['seconds']:.3f}s "
+                               f"(x{medida['seconds'] / max(ref['seconds'], 1e-9):.2f})")
+        for campo in ('peak_mb', 'peak_mb_workers'):
+            if medida.get(campo) and ref.get(campo) and medida[campo] > ref[campo] * (1 + tolerancia_memoria):
+                regresiones.append(f"{clave}: {campo} {medida[campo]:.1f} MB frente a {ref[campo]:.1f} MB")
+    return regresiones
+
+def load_baseline(path=BASELINE):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(resultados, path=BASELINE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=1, ensure_ascii=False)
+
+# ------------------------------------------------------------------ suite
+
+def report(resultados):
+    tabla = pd.DataFrame(resultados).T
+    columnas = [c for c in ['rows_in', 'rows_out', 'seconds', 'msgs_per_s', 'peak_mb', 'peak_mb_workers'] if c in tabla.columns]
+    print("\n📊 BENCHMARK:")
+    print(tabla[columnas].to_string())
+
+def run_benchmark(escalas=None, etapas=ETAPAS, funciones=FUNCIONES, guardar=False, baseline_path=BASELINE, dir_trabajo=None):
+    """Genera cada escala, mide etapas y funciones y las compara con la referencia (guardar=True la reescribe).
+
+    Devuelve {'escala/medida': medidas}; lanza RuntimeError con la lista de regresiones si las hay.
+    """
+    escalas = escalas or list(ESCALAS)
+    base = dir_trabajo or tempfile.mkdtemp(prefix="benchmark_")
+    resultados = {}
+    try:
+        for escala in escalas:
+            r = rutas(os.path.join(base, escala))
+            if not os.path.exists(r["raw"]):
+                sintetico.generate_day(r["raw"], dia=DIA, **ESCALAS[escala])
+            for etapa in etapas:
+                print(f"\n⏱️ {escala}: {etapa}")
+                resultados[f"{escala}/{etapa}"] = measure_stage(etapa, r)
+            for nombre, medida in measure_functions(r, funciones).items():
+                resultados[f"{escala}/{nombre}"] = medida
+    finally:
+        if dir_trabajo is None:
+            shutil.rmtree(base, ignore_errors=True)
+
+    report(resultados)
+    if guardar:
+        save_baseline({**(load_baseline(baseline_path) or {}), **resultados}, baseline_path)
+        print(f"💾 Referencia guardada: {baseline_path}")
+        return resultados
+    baseline = load_baseline(baseline_path)
+    if baseline is None:
+        print(f"⚠️ Sin referencia en {baseline_path}: ejecutar con guardar=True para crearla")
+        return resultados
+    regresiones = compare(resultados, baseline)
+    if regresiones:
+        print("❌ Regresiones frente a la referencia:", *regresiones, sep="\n   ")
+        raise RuntimeError(f"{len(regresiones)} regresiones de rendimiento")
+    print("✅ Sin regresiones frente a la referencia")
+    return resultados
+
+def main():
+    # python benchmark.py [guardar] [escala ...]
+    args = sys.argv[1:]
+    guardar = "guardar" in args
+    escalas = [a for a in args if a in ESCALAS] or None
+    try:
+        run_benchmark(escalas, guardar=guardar)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,463 @@
 import os
-import base64
 import numpy as np
 import pandas as pd
-import pyModeS as pms
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+import shutil
+import tarfile
+import threading
+import time
 import multiprocessing as mp
+from functools import partial
+from collections import OrderedDict
+import adsbVectorizado as adsb_np
+import esquema
+import estela
+import telemetria
 
-def decode_base64_to_hex(b64_msg):
-    return base64.b64decode(b64_msg).hex().upper()
+# Guardar el mensaje como binario de 14 bytes ('msg') en lugar de hexadecimal ('msg_hex')
+BINARY_MSG = False
 
-def get_altitude(msg_hex):
-    try:
-        return pms.adsb.altitude(msg_hex)
-    except:
-        return np.nan
-    
-def get_velocity(msg_hex):
-    try:
-        velocity = pms.adsb.velocity(msg_hex)
-        return { "speed": velocity[0], "angle": velocity[1], "vertical_rate": velocity[2] }
-    except:
-        return { "speed": np.nan, "angle": np.nan, "vertical_rate": np.nan }
-
-def process_chunk(chunk):
-    chunk['msg_hex'] = chunk['message'].apply(decode_base64_to_hex)
-    valid_msg_mask = (chunk['msg_hex'].apply(pms.crc, encode=False) == 0) & (chunk['msg_hex'].apply(pms.typecode) != -1)
-    
-    processed_chunk = chunk[valid_msg_mask].copy()
+# Escritura en streaming del parquet del día con memoria acotada por MAX_IN_FLIGHT chunks
+STREAMING = False
+MAX_IN_FLIGHT = 64
+
+# Caché LRU de mensajes decodificados que cada worker mantiene entre lotes (0: desactivada)
+DECODE_CACHE_SIZE = 0
+
+# Tamaño objetivo (bytes de CSV) de cada lote de archivos que procesa un worker
+BATCH_BYTES = 16 * 1024 * 1024
+
+# Parquet del día ordenado por (icao, ts) en row groups de ROW_GROUP_ROWS filas: con las estadísticas
+# min/max de cada row group, filtrado lee sólo los ICAOs y tipos de mensaje que necesita
+SORT_BY_ICAO   = True
+ROW_GROUP_ROWS = 128 * 1024
+# En streaming la ordenación es externa: cubos en disco por los ICAO_PREFIX primeros dígitos hexadecimales del ICAO
+ICAO_PREFIX    = 3
+
+# Guardar los conteos ICAO -> estela del día (estela.guardar_dia) con las respuestas BDS 4,5 que el filtro de CRC descarta
+REGISTRO_ESTELA = True
+
+# Días comprimidos: se leen los CSV directamente del archivo sin extraerlo
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz")
+
+RAW_CSV_PARSE   = pv.ParseOptions(delimiter=";")
+RAW_CSV_CONVERT = pv.ConvertOptions(include_columns=["ts_kafka", "message"],
+                                    column_types={"ts_kafka": pa.int64(), "message": pa.string()})
+
+class DecodeCache:
+    """Memoriza decode_messages por mensaje en bruto, con expulsión LRU (max_size = 0: sin memoria)."""
+    FIELDS = ('crc', 'df', 'tc', 'oe_flag', 'icao', 'icao_valido', 'altitude', 'speed', 'angle', 'vertical_rate')
+    DTYPES = (np.uint32, np.uint8, np.int16, np.uint8, np.uint32, bool, np.float64, np.float64, np.float64, np.float64)
+
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.rows = 0
+        self.unique = 0
+        self.hits = 0
+
+    def decode(self, raw, longitud):
+        if self.max_size <= 0 or len(raw) == 0:
+            return adsb_np.decode_messages(raw, longitud)
+
+        keys = np.concatenate([raw, longitud[:, None]], axis=1).view('S15').ravel().tolist()
+        cached = [self.entries.get(key) for key in keys]
+        miss = np.array([values is None for values in cached], dtype=bool)
+        hit_idx = np.flatnonzero(~miss)
+        self.hits += len(hit_idx)
+
+        decoded = {field: np.empty(len(raw), dtype=dtype) for field, dtype in zip(self.FIELDS, self.DTYPES)}
+        if len(hit_idx):
+            values = np.array([cached[i] for i in hit_idx], dtype=np.float64)
+            for j, field in enumerate(self.FIELDS):
+                decoded[field][hit_idx] = values[:, j]
+            for i in hit_idx:
+                self.entries.move_to_end(keys[i])
+
+        if miss.any():
+            nuevos = adsb_np.decode_messages(raw[miss], longitud[miss])
+            for field in self.FIELDS:
+                decoded[field][miss] = nuevos[field]
+            filas = zip(*(nuevos[field].astype(np.float64) for field in self.FIELDS))
+            for key, values in zip((k for k, m in zip(keys, miss) if m), filas):
+                self.entries[key] = values
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return decoded
 
-    processed_chunk['tc'] = processed_chunk['msg_hex'].apply(pms.typecode)
-    processed_chunk['oe_flag'] = processed_chunk['msg_hex'].apply(pms.adsb.oe_flag)
-    processed_chunk['icao'] = processed_chunk['msg_hex'].apply(pms.icao)
-    processed_chunk['altitude'] = processed_chunk['msg_hex'].apply(get_altitude)
-    velocity_results = processed_chunk['msg_hex'].apply(get_velocity)
-    processed_chunk['speed'] = velocity_results.apply(lambda x: x['speed'])
-    processed_chunk['angle'] = velocity_results.apply(lambda x: x['angle'])
-    processed_chunk['vertical_rate'] = velocity_results.apply(lambda x: x['vertical_rate'])
+_worker_cache = None
 
-    processed_chunk = processed_chunk.rename(columns={'ts_kafka': 'ts'})[['ts', 'msg_hex', 'tc', 'oe_flag', 'icao', 'altitude', 'speed', 'angle', 'vertical_rate']]
+def worker_cache(cache_size):
+    global _worker_cache
+    if _worker_cache is None or _worker_cache.max_size != cache_size:
+        _worker_cache = DecodeCache(cache_size)
+    return _worker_cache
+
+def process_chunk(chunk, binary_msg=False, cache=None, obs_estela=None):
+    if cache is None:
+        cache = DecodeCache()
+
+    # cada mensaje distinto del chunk (p. ej. el mismo recibido por varias antenas) se decodifica una vez
+    codes, uniques = pd.factorize(chunk['message'])
+    raw, longitud = adsb_np.decode_base64_array(np.asarray(uniques, dtype=object))
+    decoded = cache.decode(raw, longitud)
+    cache.rows += len(chunk)
+    cache.unique += len(uniques)
+    if obs_estela is not None:
+        obs_estela.append(estela.observaciones(raw, longitud, decoded))
+
+    valid_unique = (longitud > 0) & (decoded['crc'] == 0)
+    valid_msg_mask = (codes >= 0) & np.append(valid_unique, False)[codes]
+    idx = codes[valid_msg_mask]
+
+    # tipos del registro desde el primer chunk: ts en ms, tc uint8 e icao uint32 (nulos enmascarados), float32
+    tc = decoded['tc'][idx]
+    tc = pd.arrays.IntegerArray(np.maximum(tc, 0).astype(np.uint8), tc == -1)
+    icao = esquema.icao_array(decoded['icao'][idx], decoded['icao_valido'][idx])
+    if binary_msg:
+        msg_col, msg = 'msg', adsb_np.to_binary_array(raw[idx])
+    else:
+        msg_col, msg = 'msg_hex', adsb_np.to_hex_array(raw, longitud)[idx]
+
+    processed_chunk = pd.DataFrame({
+        'ts':            chunk['ts_kafka'].to_numpy(dtype=np.int64)[valid_msg_mask].astype('datetime64[ms]'),
+        msg_col:         msg,
+        'tc':            tc,
+        'oe_flag':       decoded['oe_flag'][idx].astype(bool),
+        'icao':          icao,
+        'altitude':      decoded['altitude'][idx].astype(np.float32),
+        'speed':         decoded['speed'][idx].astype(np.float32),
+        'angle':         decoded['angle'][idx].astype(np.float32),
+        'vertical_rate': decoded['vertical_rate'][idx].astype(np.float32),
+    }, index=chunk.index[valid_msg_mask])
 
     return processed_chunk
 
 def change_types(df):
-    df = df.copy()
-    df['ts']        = pd.to_datetime(df['ts'], unit='ms')
-    print(df["ts"].iloc[0])
-    
-    df['msg_hex']   = df["msg_hex"].astype("string")
-    
-    df['tc']        = df['tc'].astype('category')
-    df['icao']      = df['icao'].astype('category')
-    
-    df['oe_flag']   = df['oe_flag'].astype('boolean')
+    # los workers ya entregan los tipos del registro; sólo msg_hex pasa a string de pandas
+    df = esquema.aplicar(df)
+    if 'msg_hex' in df.columns:
+        df['msg_hex']   = df["msg_hex"].astype("string")
+    return df
 
-    df['altitude']      = pd.to_numeric(df['altitude'], downcast='unsigned')
-    df['speed']         = pd.to_numeric(df['speed'],    downcast='unsigned')
-    df['angle']         = pd.to_numeric(df['angle'],    downcast='unsigned')
-    df['vertical_rate'] = pd.to_numeric(df['vertical_rate'], downcast='integer')
+def stream_schema(binary_msg=False):
+    return esquema.schema(binary_msg)
 
-    return df
+def to_arrow_table(df, schema):
+    if df.empty:
+        return schema.empty_table()
+    df = df.sort_values('ts', kind='stable')
+    msg_col = schema.names[1]
+    columns = {col: pa.array(df[col], type=schema.field(col).type, from_pandas=True) for col in esquema.MENSAJES}
+    columns[msg_col] = pa.array(df[msg_col].to_numpy(dtype=object), type=schema.field(msg_col).type)
+    return pa.Table.from_pydict(columns, schema=schema)
 
-def process_file_as_chunk(csv_path):
-    try:
-        df = pd.read_csv(csv_path, usecols=["ts_kafka", "message"], sep=";")
-    except:
-        return pd.DataFrame()
-    return process_chunk(df)
+def sort_by_icao(df):
+    """Ordena el día por (icao, ts) de forma estable (orden numérico del ICAO = orden de su texto hexadecimal)."""
+    return df.sort_values(['icao', 'ts'], kind='stable', ignore_index=True)
 
-def process_chunks_parallel(file_path):
-    print("\nInicio del procesamiento paralelo...")
-    
-    csv_paths = []
+def sort_table_by_icao(table):
+    """Igual que sort_by_icao para una tabla Arrow."""
+    return table.take(pc.sort_indices(table, sort_keys=[('icao', 'ascending'), ('ts', 'ascending')]))
+
+class IcaoBuckets:
+    """Ordenación externa por (icao, ts) del streaming.
+
+    Cada lote se reparte en ficheros por prefijo del ICAO; al cerrar se ordenan los cubos de uno
+    en uno y en orden de prefijo, así la memoria es la de un cubo y no la del día.
+    """
+    def __init__(self, out_dir, schema, prefix=ICAO_PREFIX):
+        self.dir = out_dir + ".cubos"
+        os.makedirs(self.dir, exist_ok=True)
+        self.schema = schema
+        self.prefix = prefix
+        self.writers = {}
+
+    def write(self, table):
+        table = sort_table_by_icao(table)
+        # los ICAO nulos quedan al final de la tabla ordenada y en el último cubo (16 ** prefix, detrás de todos)
+        nulo = 16 ** self.prefix
+        prefijos = pc.shift_right(table['icao'], 4 * (6 - self.prefix)).fill_null(nulo)
+        prefijos = prefijos.to_numpy(zero_copy_only=False)
+        cortes = np.flatnonzero(prefijos[1:] != prefijos[:-1]) + 1
+        for start, stop in zip(np.r_[0, cortes], np.r_[cortes, len(prefijos)]):
+            prefijo = int(prefijos[start])
+            if prefijo not in self.writers:
+                self.writers[prefijo] = pq.ParquetWriter(self.path(prefijo), self.schema, compression="snappy")
+            self.writers[prefijo].write_table(table.slice(start, stop - start))
+
+    def path(self, prefijo):
+        nombre = "~" if prefijo == 16 ** self.prefix else f"{prefijo:0{self.prefix}X}"
+        return os.path.join(self.dir, f"{nombre}.parquet")
+
+    def merge(self, writer, row_group_rows=ROW_GROUP_ROWS):
+        for cubo in self.writers.values():
+            cubo.close()
+        for prefijo in sorted(self.writers):
+            path = self.path(prefijo)
+            table = pq.read_table(path).cast(self.schema)
+            writer.write_table(sort_table_by_icao(table), row_group_size=row_group_rows)
+            os.remove(path)
+        self.writers.clear()
+        self.close()
+
+    def close(self):
+        for cubo in self.writers.values():
+            cubo.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def read_raw_csv(source):
+    if isinstance(source, bytes):
+        source = pa.BufferReader(source)
+    table = pv.read_csv(source, parse_options=RAW_CSV_PARSE, convert_options=RAW_CSV_CONVERT)
+    return table.to_pandas()
+
+def source_size(source):
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+def batch_sources(sources, batch_bytes=BATCH_BYTES):
+    batch, batch_size = [], 0
+    for source in sources:
+        batch.append(source)
+        batch_size += source_size(source)
+        if batch_size >= batch_bytes:
+            yield batch
+            batch, batch_size = [], 0
+    if batch:
+        yield batch
+
+def process_batch(batch, binary_msg=False, cache_size=DECODE_CACHE_SIZE, registro_estela=REGISTRO_ESTELA):
+    start = time.perf_counter()
+    tiempos = {}
+    cache = worker_cache(cache_size) if cache_size > 0 else DecodeCache()
+    unique_before, hits_before = cache.unique, cache.hits
+    frames = []
+    obs_estela = [] if registro_estela else None
+    with telemetria.medir(tiempos, 'read_raw_csv'):
+        for source in batch:
+            try:
+                frames.append(read_raw_csv(source))
+            except:
+                pass
+        raw = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    with telemetria.medir(tiempos, 'process_chunk'):
+        decoded = process_chunk(raw, binary_msg, cache, obs_estela) if not raw.empty else pd.DataFrame()
+    with telemetria.medir(tiempos, 'to_arrow_table'):
+        table = to_arrow_table(decoded, stream_schema(binary_msg))
+
+    stats = telemetria.task_stats(start, len(raw), table.num_rows, tiempos,
+        files=len(batch),
+        bytes=sum(source_size(source) for source in batch),
+        unique=cache.unique - unique_before,
+        cache_hits=cache.hits - hits_before,
+    )
+    # observaciones de estela del lote, sumadas por (icao, categoría)
+    obs = pd.concat(obs_estela).groupby(['icao', 'wake_vortex'], as_index=False)['mensajes'].sum() if obs_estela else None
+    return table, stats, obs
+
+def report_batch_stats(stats):
+    if not stats:
+        return
+    stats = pd.DataFrame(stats)
+    mb_s  = stats['bytes'] / 1e6 / stats['seconds']
+    msg_s = stats['rows_in'] / stats['seconds']
+    print(f"📊 {len(stats)} lotes ({stats['files'].sum()} archivos, {stats['bytes'].sum() / 1e6:.1f} MB, {stats['rows_in'].sum()} mensajes)")
+    print(f"   Por lote: {stats['bytes'].mean() / 1e6:.1f} MB, {stats['seconds'].mean():.2f}s de media, {stats['seconds'].max():.2f}s el más lento")
+    print(f"   Rendimiento por lote: {mb_s.median():.1f} MB/s, {msg_s.median():.0f} mensajes/s (mediana)")
+    rows, unique = stats['rows_in'].sum(), stats['unique'].sum()
+    if rows:
+        print(f"   Caché de decodificación: {1 - unique / rows:.1%} mensajes duplicados en el lote, "
+              f"{stats['cache_hits'].sum() / max(unique, 1):.1%} de los distintos ya decodificados por el worker")
+
+def is_archive(file_path):
+    return str(file_path).endswith(ARCHIVE_SUFFIXES)
+
+def iter_archive_members(tar_path):
+    # lectura secuencial ("r|*"): cada CSV se entrega como bytes sin extraerlo a disco
+    with tarfile.open(tar_path, "r|*") as tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith(".csv"):
+                yield tar.extractfile(member).read()
+
+def day_sources(file_path):
     file_path = Path(file_path)
+    if is_archive(file_path):
+        if not file_path.exists():
+            raise FileNotFoundError(file_path)
+        return iter_archive_members(file_path), None
+
+    csv_paths = []
     for hour_dir in sorted(file_path.iterdir()):
         if hour_dir.is_dir():
             csv_paths.extend(hour_dir.glob("*.csv"))
+    return csv_paths, len(csv_paths)
+
+def find_day_source(path_dia):
+    if os.path.exists(path_dia):
+        return path_dia
+    for suffix in ARCHIVE_SUFFIXES:
+        if os.path.exists(path_dia + suffix):
+            return path_dia + suffix
+    return None
+
+def bounded(iterable, semaphore, stop):
+    for item in iterable:
+        semaphore.acquire()
+        if stop.is_set():
+            return
+        yield item
+
+def process_chunks_parallel(file_path, binary_msg=False, max_in_flight=MAX_IN_FLIGHT, batch_bytes=BATCH_BYTES, cache_size=DECODE_CACHE_SIZE, processes=None, metrics=None, obs_estela=None):
+    print("\nInicio del procesamiento paralelo...")
+    
+    sources, total = day_sources(file_path)
+    file_path = Path(file_path)
     
-    num_cores = os.cpu_count()
-    print(f"\n📂 {file_path.name}: procesando {len(csv_paths)} archivos en paralelo con {num_cores} núcleos…")
+    num_cores = processes or os.cpu_count()
+    print(f"\n📂 {file_path.name}: procesando {total if total is not None else 'todos los'} archivos en lotes de ~{batch_bytes / 1e6:.0f} MB con {num_cores} núcleos…")
 
     all_results = []
+    batch_stats = []
     processed_count = 0
+    in_flight, stop = threading.Semaphore(max_in_flight), threading.Event()
 
     with mp.Pool(processes=num_cores) as pool:
-        results_iterator = pool.imap_unordered(process_file_as_chunk, csv_paths)
-        print(f"Procesados ", flush=True, end=" - ")
-        for result in results_iterator:
-            all_results.append(result)
-            processed_count += 1
-            if processed_count % 1000 == 0 or processed_count == len(csv_paths):
+        try:
+            batches = bounded(batch_sources(sources, batch_bytes), in_flight, stop)
+            results_iterator = pool.imap_unordered(partial(process_batch, binary_msg=binary_msg, cache_size=cache_size,
+                                                           registro_estela=obs_estela is not None), batches)
+            print(f"Procesados ", flush=True, end=" - ")
+            for table, stats, obs in results_iterator:
+                if obs_estela is not None:
+                    obs_estela.append(obs)
+                all_results.append(table)
+                batch_stats.append(stats)
+                in_flight.release()
+                processed_count += stats['files']
                 print(processed_count, end=" - ", flush=True)
+        finally:
+            # desbloquea el hilo que alimenta al pool si se sale antes de tiempo
+            stop.set()
+            in_flight.release()
     print("\nTodos los chunks.")
+    report_batch_stats(batch_stats)
+    if metrics is not None:
+        metrics.add_tasks(batch_stats)
 
     print("Concatenando resultados...")
 
-    results = change_types(pd.concat(all_results, ignore_index=True))
+    tables = all_results if all_results else [stream_schema(binary_msg).empty_table()]
+    with telemetria.medir(metrics.tiempos if metrics is not None else None, 'concat_change_types'):
+        results = change_types(esquema.to_pandas(pa.concat_tables(tables)))
 
     print("Decodificacion paralela del día completado.")
     
     return results
 
-def process_data(raw_dir, out_dir):
+def process_chunks_streaming(file_path, out_dir, binary_msg=False, max_in_flight=MAX_IN_FLIGHT, batch_bytes=BATCH_BYTES, cache_size=DECODE_CACHE_SIZE, processes=None, metrics=None, sort_by_icao=SORT_BY_ICAO, obs_estela=None):
+    print("\nInicio del procesamiento paralelo en streaming...")
+
+    sources, total = day_sources(file_path)
+    file_path = Path(file_path)
+
+    num_cores = processes or os.cpu_count()
+    print(f"\n📂 {file_path.name}: procesando {total if total is not None else 'todos los'} archivos en lotes de ~{batch_bytes / 1e6:.0f} MB con {num_cores} núcleos (máx. {max_in_flight} lotes en vuelo)…")
+
+    # cada lote ocupa el semáforo desde que se envía al pool hasta que se escribe en disco
+    in_flight, stop = threading.Semaphore(max_in_flight), threading.Event()
+    row_group_batches = max(1, max_in_flight // 2)
+    schema = stream_schema(binary_msg)
+
+    buffer = []
+    batch_stats = []
+    processed_count = 0
+    total_rows = 0
+
+    def flush(writer):
+        nonlocal total_rows
+        tables = [table for table in buffer if table.num_rows > 0]
+        if tables:
+            table = pa.concat_tables(tables)
+            if cubos is not None:
+                cubos.write(table)
+            else:
+                table = table.sort_by('ts')
+                writer.write_table(table, row_group_size=len(table))
+            total_rows += len(table)
+        for _ in range(len(buffer)):
+            in_flight.release()
+        buffer.clear()
+
+    cubos = IcaoBuckets(out_dir, schema) if sort_by_icao else None
+    with pq.ParquetWriter(out_dir, schema, compression="snappy") as writer, mp.Pool(processes=num_cores) as pool:
+        try:
+            batches = bounded(batch_sources(sources, batch_bytes), in_flight, stop)
+            results_iterator = pool.imap_unordered(partial(process_batch, binary_msg=binary_msg, cache_size=cache_size,
+                                                           registro_estela=obs_estela is not None), batches)
+            print(f"Procesados ", flush=True, end=" - ")
+            for table, stats, obs in results_iterator:
+                if obs_estela is not None:
+                    obs_estela.append(obs)
+                buffer.append(table)
+                batch_stats.append(stats)
+                if len(buffer) >= row_group_batches:
+                    flush(writer)
+                processed_count += stats['files']
+                print(processed_count, end=" - ", flush=True)
+            flush(writer)
+            if cubos is not None:
+                print("\nOrdenando por icao…")
+                with telemetria.medir(metrics.tiempos if metrics is not None else None, 'sort_by_icao'):
+                    cubos.merge(writer)
+        finally:
+            # desbloquea el hilo que alimenta al pool si se sale antes de tiempo
+            stop.set()
+            in_flight.release()
+            if cubos is not None:
+                cubos.close()
+
+    report_batch_stats(batch_stats)
+    if metrics is not None:
+        metrics.add_tasks(batch_stats)
+        metrics.rows_out = total_rows
+    print(f"\nDecodificacion en streaming del día completada: {total_rows} mensajes.")
+
+def process_data(raw_dir, out_dir, binary_msg=False, streaming=False, processes=None):
     print(f"\n🚀 Procesando {raw_dir}")
+    metrics = telemetria.Telemetria("decodificacion", raw_dir)
+    # observaciones de estela del día: solo se guardan si el día se escribe entero
+    obs_estela = [] if REGISTRO_ESTELA else None
     try:
-        result = process_chunks_parallel(raw_dir)
-        result.to_parquet(out_dir, engine="pyarrow", compression="snappy", index=False)
+        if streaming:
+            with metrics.medir('process_chunks_streaming'):
+                process_chunks_streaming(raw_dir, out_dir, binary_msg, processes=processes, metrics=metrics, obs_estela=obs_estela)
+        else:
+            with metrics.medir('process_chunks_parallel'):
+                result = process_chunks_parallel(raw_dir, binary_msg, processes=processes, metrics=metrics, obs_estela=obs_estela)
+            if SORT_BY_ICAO:
+                with metrics.medir('sort_by_icao'):
+                    result = sort_by_icao(result)
+            with metrics.medir('write_parquet'):
+                adsb_np.write_parquet(result, out_dir, engine="pyarrow", compression="snappy", index=False, row_group_size=ROW_GROUP_ROWS)
+            metrics.rows_out = len(result)
+        metrics.rows_in = sum(stats['rows_in'] for stats in metrics.tareas)
+        if obs_estela is not None:
+            with metrics.medir('registro_estela'):
+                parte = estela.guardar_dia(raw_dir, obs_estela)
+            print(f"🌀 Estela del día: {parte}")
         print(f"💾 Guardado: {out_dir}")
+        metrics.write(out_dir)
+        return True
     except FileNotFoundError:
         print(f"❌ Archivo no encontrado: {raw_dir}")
     except Exception as e:
         print(f"⚠️ Error procesando {raw_dir}: {e}")
+    return False
 
 def main():
     path_base = "D:/"
@@ -122,11 +470,13 @@ def main():
             if os.path.exists(path_mes):
                 for (init, end) in [["1", "8"], ["8", "15"], ["15", "22"], ["22", "29"], ["29", "32"]]:
                     for day in range(int(init), int(end)):
-                        path_dia = os.path.join(path_mes, f"{day:02d}")
-                        if os.path.exists(path_dia):
+                        path_dia = find_day_source(os.path.join(path_mes, f"{day:02d}"))
+                        if path_dia is not None:
                             os.makedirs(os.path.join(out_dir_base, a, m), exist_ok=True)
                             out_dir = os.path.join(out_dir_base, a, m, f"{day}.parquet")
-                            process_data(path_dia, out_dir)
+                            process_data(path_dia, out_dir, BINARY_MSG, STREAMING)
+    if REGISTRO_ESTELA:
+        print(f"🌀 Registro de estela: {estela.consolidar()} ICAOs en {estela.REGISTRO}")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,256 @@
 import os
 import json
+import numpy as np
 import pandas as pd
-import pyModeS as pms
+import pyarrow as pa
+import pyarrow.parquet as pq
 import multiprocessing as mp
-from datetime import timedelta
+from collections import OrderedDict
+from functools import partial
 from math import radians, cos, sin, asin, sqrt
+import adsbVectorizado as adsb_np
+import estela
+import telemetria
+import tablaCompartida
+import ventanas
+import time
+import shutil
+import tempfile
 import warnings
 
 warnings.filterwarnings("ignore")
 
-def get_num_despegues_previos(row, despegues, minutes):
-    despegues = despegues[despegues["hora_despegue"] > (row["ts"] - timedelta(minutes=minutes))]
-    despegues = despegues[despegues["hora_despegue"] < row["ts"]]
-    diff = despegues["hora_despegue"].diff()
-    return len(despegues), diff.mean()
+# Despegues filtrados de cada día (salida de filtrado) que process_flight consulta
+DESPEGUES = "D:/data/filtrado/despegues"
+# Días de despegues indexados en memoria a la vez (LRU); una semana de enEspera toca 7
+MAX_DIAS_INDICE = 8
+# Despegues previos que se consideran para cada vuelo (minutos antes de su hora de despegue)
+MINUTOS_PREVIOS = 90
+# Vuelos de la semana repartidos en un pool por (día, pista): las variables sólo usan despegues del mismo día
+# y pista. Con processes = 1 (o PARALELO = False) se usa el bucle en serie de process_data
+PARALELO = True
 
-def get_wake_vortex(msg_hex):
-    try:
-        return pms.bds.bds45.wv45(msg_hex)
-    except:
-        return None
+# Ventanas (minutos) de despegues previos en la misma pista: columnas despegues_previos_<nombre> y media_diff_<nombre>
+VENTANAS = { '1h': 60, '45m': 45, '30m': 30, '20m': 20, '10m': 10, '5m': 5 }
+# Tráfico alrededor de cada mensaje (DiaDespegues.trafico): de ts - ANTES a ts + DESPUES, en segundos
+TRAFICO_ANTES, TRAFICO_DESPUES = 5, 2
+RUNWAY_CENTERS = "../json/runway_takeoffs_centers.json"
+
+# Columnas de TraficoPista.info, en orden, y sus valores sin tráfico
+COLUMNAS_TRAFICO = [
+    "holding_ocupado", "num_holding_aircrafts",       "icaos_holdings",      "distancias_holdings",   "tiempo_holding", "despegue_holdings",
+    "pista_ocupada",   "num_en_pista_aircrafts",      "icaos_en_pista",      "distancia_en_pista",
+    "en_camino_antes", "num_yendo_a_pista_aircrafts", "icaos_yendo_a_pista", "distancia_yendo_a_pista"]
+SIN_TRAFICO = (False, 0, None, None, None, None,
+               False, 0, None, None,
+               False, 0, None, None)
+
+_runway_centers = None
+
+def runway_centers():
+    """runway_takeoffs_centers.json, leído una vez por proceso."""
+    global _runway_centers
+    if _runway_centers is None:
+        with open(RUNWAY_CENTERS, 'r') as f:
+            _runway_centers = json.load(f)
+    return _runway_centers
+
+class TraficoPista:
+    """Tráfico en tierra de una pista (filas de DiaDespegues, por hora_despegue) indexado además por ts.
+
+    Guarda por fila ts, icao, si está en punto de espera o en pista, hora de despegue, llegada al punto de
+    espera y la distancia de su despegue al centro de la pista (calculada una vez). Las ventanas
+    [ts - TRAFICO_ANTES, ts + TRAFICO_DESPUES] de todas las filas de un vuelo salen de un searchsorted sobre
+    ts ordenado y se tratan juntas como pares (fila del vuelo, posición): de cada icao cuenta su primera fila
+    en el orden de los despegues previos.
+    """
+    def __init__(self, filas, rw):
+        center = runway_centers()[rw]
+        self.ts = filas["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        self.orden = np.argsort(self.ts, kind="stable")
+        self.ts_orden = self.ts[self.orden]
+        self.icao = filas["icao"].tolist()
+        self.codigos, self.icaos = pd.factorize(filas["icao"])
+        self.en_espera = filas["holding_point_id"].notna().to_numpy()
+        self.en_pista = filas["esta_en_pista"].to_numpy(dtype=bool)
+        self.horas = filas["hora_despegue"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        self.hora = filas["hora_despegue"].tolist()
+        self.llegada = filas["llegada_punto_espera"].tolist()
+        self.distancia = [haversine(lon, lat, center['lon_despegue'], center['lat_despegue'])
+                          for lon, lat in zip(filas["lon_despegue"].tolist(), filas["lat_despegue"].tolist())]
+
+    def ventanas(self, tramo, flight):
+        """Pares (fila del vuelo, posición) de otros icao de filas[tramo] en la ventana de ts de cada fila,
+        ordenados por fila y posición, y el código de icao de cada par."""
+        ts = flight["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        lo = np.searchsorted(self.ts_orden, ts - TRAFICO_ANTES * 10**9, side='left')
+        hi = np.searchsorted(self.ts_orden, ts + TRAFICO_DESPUES * 10**9, side='right')
+        n = hi - lo
+        fila = np.repeat(np.arange(len(ts)), n)
+        pos = self.orden[np.repeat(lo - np.cumsum(n) + n, n) + np.arange(n.sum())]
+        codigo = self.codigos[pos]
+        propio = self.icaos.get_indexer(pd.Index(flight["icao"]))
+        dentro = (pos >= tramo.start) & (pos < tramo.stop) & (codigo != propio[fila])
+        fila, pos, codigo = fila[dentro], pos[dentro], codigo[dentro]
+        orden = np.lexsort((pos, fila))
+        return fila[orden], pos[orden], codigo[orden]
+
+    def info(self, tramo, flight):
+        """COLUMNAS_TRAFICO de cada fila del vuelo: otros aviones de filas[tramo] en su ventana de ts.
+
+        En punto de espera (holding_point_id), en pista (esta_en_pista) y, del resto, los que despegan antes
+        que el vuelo, por hora_despegue; un avión por icao en cada grupo.
+        """
+        n = len(flight)
+        fila, pos, codigo = self.ventanas(tramo, flight)
+        # clave (fila, icao) para quedarse con la primera posición de cada icao en cada fila
+        clave = fila.astype(np.int64) * (len(self.icaos) + 1) + codigo
+        holdings = self._primeras(clave, self.en_espera[pos])
+        on_runway = self._primeras(clave, self.en_pista[pos])
+        fuera = np.isin(clave, clave[holdings | on_runway])
+        despegue = flight["hora_despegue"].to_numpy(dtype="datetime64[ns]")
+        antes = ~np.isnat(despegue)[fila] & (self.horas[pos] < despegue.astype(np.int64)[fila])
+        en_route = self._primeras(clave, ~fuera & antes)
+
+        current_ts = flight["ts"].tolist()
+        columnas = []
+        for grupo in (holdings, on_runway, en_route):
+            cuenta = np.bincount(fila[grupo], minlength=n)
+            posiciones = self._por_fila(fila[grupo], pos[grupo], n)
+            columnas += [(cuenta > 0).tolist(), cuenta.tolist(),
+                         [self._lista(self.icao, ps) for ps in posiciones],
+                         [self._lista(self.distancia, ps) for ps in posiciones]]
+            if grupo is holdings:
+                columnas += [[[t - self.llegada[p] for p in ps] or None for t, ps in zip(current_ts, posiciones)],
+                             [self._lista(self.hora, ps) for ps in posiciones]]
+        return pd.DataFrame(dict(zip(COLUMNAS_TRAFICO, columnas)), index=flight.index, columns=COLUMNAS_TRAFICO)
+
+    @staticmethod
+    def _primeras(clave, mascara):
+        """Primer par de cada clave (fila, icao) entre los de la máscara (drop_duplicates("icao") por fila)."""
+        primeras = np.zeros(len(clave), dtype=bool)
+        _, indices = np.unique(clave[mascara], return_index=True)
+        primeras[np.flatnonzero(mascara)[indices]] = True
+        return primeras
+
+    @staticmethod
+    def _por_fila(fila, pos, n):
+        limites = np.searchsorted(fila, np.arange(n + 1))
+        return [pos[a:b].tolist() for a, b in zip(limites[:-1].tolist(), limites[1:].tolist())]
+
+    @staticmethod
+    def _lista(valores, posiciones):
+        return [valores[p] for p in posiciones] or None
+
+class DiaDespegues:
+    """Despegues de un día partidos por pista y ordenados (estable) por hora_despegue.
+
+    Cada consulta por intervalo son dos searchsorted y un iloc sobre las filas ya ordenadas, sin filtrar ni
+    reordenar el día entero; los empates de hora_despegue (los mensajes de un mismo despegue) quedan en el
+    orden del fichero.
+    """
+    def __init__(self, df, path):
+        self.df = df
+        self.path = path
+        if df["hora_despegue"].isnull().any():
+            print(f"WARNING: 'hora_despegue_onground' contains null values in file: {path}", flush=True)
+        self.pistas = {}
+        for rw, filas in df[df["hora_despegue"].notna()].groupby("runway", sort=False, observed=True):
+            filas = filas.sort_values("hora_despegue", kind="stable")
+            # una fila por despegue (la primera de cada hora), como drop_duplicates(subset=["hora_despegue"])
+            primeras = filas.drop_duplicates(subset=["hora_despegue"])
+            self.pistas[rw] = (filas, self._horas(filas), primeras, self._horas(primeras))
+        self._trafico = {}
+
+    @staticmethod
+    def _horas(filas):
+        return filas["hora_despegue"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+    @staticmethod
+    def _tramo(horas, hora, minutos):
+        fin = pd.Timestamp(hora).as_unit("ns").value
+        inicio = fin - minutos * 60 * 10**9
+        return slice(int(np.searchsorted(horas, inicio, side='right')), int(np.searchsorted(horas, fin, side='left')))
+
+    def previos(self, rw, hora, minutos=MINUTOS_PREVIOS):
+        """(filtered_previos, list_despegues_previos): despegues de la pista rw con hora - minutos < hora_despegue < hora."""
+        if rw not in self.pistas or pd.isna(hora):
+            vacio = self.df.iloc[:0]
+            return vacio, vacio
+        filas, horas, primeras, horas_primeras = self.pistas[rw]
+        return filas.iloc[self._tramo(horas, hora, minutos)], primeras.iloc[self._tramo(horas_primeras, hora, minutos)]
+
+    def trafico(self, flight, rw, hora, minutos=MINUTOS_PREVIOS):
+        """COLUMNAS_TRAFICO del vuelo contra los despegues previos de la pista (TraficoPista)."""
+        if rw not in self.pistas or pd.isna(hora):
+            return pd.DataFrame([SIN_TRAFICO] * len(flight), index=flight.index, columns=COLUMNAS_TRAFICO)
+        filas, horas, _, _ = self.pistas[rw]
+        if rw not in self._trafico:
+            self._trafico[rw] = TraficoPista(filas, rw)
+        return self._trafico[rw].info(self._tramo(horas, hora, minutos), flight)
+
+class IndiceDespegues:
+    """Días de despegues leídos una sola vez y consultados por pista e intervalo, con expulsión LRU.
+
+    Cada entrada guarda el tamaño y la fecha del parquet: si filtrado lo reescribe se vuelve a leer.
+    hits/misses cuentan consultas a día ya cargado / día leído de disco (o inexistente).
+    """
+    def __init__(self, base=DESPEGUES, max_dias=MAX_DIAS_INDICE):
+        self.base = base
+        self.max_dias = max_dias
+        self.dias = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-def get_info_last_takeoff(row, despegues):
+    def path(self, año, mes, dia):
+        return os.path.join(self.base, str(año), str(mes), f"{dia}.parquet")
+
+    def dia(self, año, mes, dia):
+        """DiaDespegues del día, o None si no hay parquet de despegues."""
+        path = self.path(año, mes, dia)
+        stat = (os.stat(path).st_size, os.stat(path).st_mtime_ns) if os.path.exists(path) else None
+        cached = self.dias.get(path)
+        if cached is not None and cached[0] == stat:
+            self.hits += 1
+            self.dias.move_to_end(path)
+            return cached[1]
+        self.misses += 1
+        entrada = DiaDespegues(pd.read_parquet(path), path) if stat is not None else None
+        self.dias[path] = (stat, entrada)
+        self.dias.move_to_end(path)
+        while len(self.dias) > self.max_dias:
+            self.dias.popitem(last=False)
+            self.evictions += 1
+        return entrada
+
+    def stats(self):
+        consultas = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'dias': len(self.dias),
+                'hit_rate': round(self.hits / consultas, 3) if consultas else None}
+
+_indice = None
+
+def indice_despegues():
+    """Índice del proceso, rehecho si cambia DESPEGUES o MAX_DIAS_INDICE (p. ej. desde benchmark)."""
+    global _indice
+    if _indice is None or _indice.base != DESPEGUES or _indice.max_dias != MAX_DIAS_INDICE:
+        _indice = IndiceDespegues(DESPEGUES, MAX_DIAS_INDICE)
+    return _indice
+
+def add_despegues_previos(flight, despegues):
+    """Columnas de VENTANAS para todas las filas y ventanas de una vez (ventanas.contar_despegues).
+
+    Por fila y ventana, número de despegues con ts - minutos < hora_despegue < ts y media de las diferencias
+    entre ellos; media_diff es siempre timedelta64[ns] (NaT sin dos despegues).
+    """
+    n, media = ventanas.contar_despegues(despegues["hora_despegue"].to_numpy(), flight["ts"].to_numpy(), VENTANAS.values())
+    for k, nombre in enumerate(VENTANAS):
+        flight[f"despegues_previos_{nombre}"] = n[k]
+        flight[f"media_diff_{nombre}"] = media[k]
+    return flight
+
+def get_info_last_takeoff(row, despegues, registro):
     despegues = despegues[despegues["hora_despegue"] < row["ts"]]
     if despegues.empty:
         return pd.Series([None, None, None])
@@ -29,7 +258,7 @@ def get_info_last_takeoff(row, despegues):
     last_takeoff = despegues.iloc[-1]
     icao = last_takeoff["icao"]
     tiempo_desde_ultimo_despegue = (row["ts"] - last_takeoff["hora_despegue"]).total_seconds()
-    tipo_ultimo_avion = get_wake_vortex(last_takeoff["msg_hex"])
+    tipo_ultimo_avion = registro.get(icao)
     return tiempo_desde_ultimo_despegue, tipo_ultimo_avion, icao
 
 def haversine(lon1, lat1, lon2, lat2):
@@ -41,155 +270,171 @@ def haversine(lon1, lat1, lon2, lat2):
     r = 6371
     return c * r * 1000
 
-def get_other_aircraft_info(row, df_global, runway_target):
-    runway_centers = {}
-    with open('../json/runway_takeoffs_centers.json', 'r') as f:
-        runway_centers = json.load(f)
-    center_coords = runway_centers[runway_target]
-    
-    current_ts = row['ts']
-    current_icao = row['icao']
-
-    nearby_traffic = df_global[
-        (df_global['ts'] >= current_ts - timedelta(seconds=5)) &
-        (df_global['ts'] <= current_ts + timedelta(seconds=2)) &
-        (df_global['icao'] != current_icao)
-    ].copy()
-
-    holding_ocupado = False
-    num_holding_aircrafts = 0
-    tiempo_holding = None
-    despegue_holdings = None
-    icaos_holdings = None
-    distancias_holdings = None
-
-    pista_ocupada = False
-    num_en_pista_aircrafts = 0
-    icaos_en_pista = None
-    distancia_en_pista = None
-
-    en_camino_antes = False
-    num_yendo_a_pista_aircrafts = 0
-    icaos_yendo_a_pista = None
-    distancia_yendo_a_pista = None
-
-    # 2. Revisar Punto de Espera (Holding Point)
-    holdings = nearby_traffic[
-        (nearby_traffic['holding_point_id'].notna()) & 
-        (nearby_traffic['runway'] == runway_target)
-    ].drop_duplicates("icao")
-    if not holdings.empty:
-        holding_ocupado = True
-
-        num_holding_aircrafts = len(holdings)
-        tiempo_holding = [(current_ts - aircraft[1]["llegada_punto_espera"]) for aircraft in holdings.iterrows()]
-        despegue_holdings = [aircraft[1]["hora_despegue"] for aircraft in holdings.iterrows()]
-        icaos_holdings = [aircraft[1]["icao"] for aircraft in holdings.iterrows()]
-        distancias_holdings = [haversine(aircraft[1]['lon_despegue'], aircraft[1]['lat_despegue'], center_coords['lon_despegue'], center_coords['lat_despegue']) for aircraft in holdings.iterrows()]
-
-    # 3. Revisar Pista Ocupada
-    on_runway = nearby_traffic[
-        (nearby_traffic['esta_en_pista']) &
-        (nearby_traffic['runway'] == runway_target)
-    ].drop_duplicates("icao")
-    if not on_runway.empty:
-        pista_ocupada = True
-        num_en_pista_aircrafts = len(on_runway)
-        icaos_en_pista = [aircraft[1]["icao"] for aircraft in on_runway.iterrows()]
-        distancia_en_pista = [haversine(aircraft[1]['lon_despegue'], aircraft[1]['lat_despegue'], center_coords['lon_despegue'], center_coords['lat_despegue']) for aircraft in on_runway.iterrows()]
-
-    # 4. Revisar Avión en Camino (Antes que el actual)
-    current_takeoff_time = row['hora_despegue']
-
-    en_route = nearby_traffic[
-        (nearby_traffic['runway'] == runway_target) &
-        (~nearby_traffic['icao'].isin(holdings['icao'])) &
-        (~nearby_traffic['icao'].isin(on_runway['icao'])) &
-        (nearby_traffic['hora_despegue'] < current_takeoff_time)
-    ].drop_duplicates("icao")
-    en_route = en_route.sort_values('hora_despegue')
-
-    if not en_route.empty:
-        en_camino_antes = True
-        num_yendo_a_pista_aircrafts = len(en_route)
-        icaos_yendo_a_pista = [aircraft[1]["icao"] for aircraft in en_route.iterrows()]
-        distancia_yendo_a_pista = [haversine(aircraft[1]['lon_despegue'], aircraft[1]['lat_despegue'], center_coords['lon_despegue'], center_coords['lat_despegue']) for aircraft in en_route.iterrows()]
-
-    return pd.Series([holding_ocupado, num_holding_aircrafts,       icaos_holdings,      distancias_holdings,    tiempo_holding, despegue_holdings,
-                      pista_ocupada,   num_en_pista_aircrafts,      icaos_en_pista,      distancia_en_pista,
-                      en_camino_antes, num_yendo_a_pista_aircrafts, icaos_yendo_a_pista, distancia_yendo_a_pista])
-
-def process_flight(flight):
+def process_flight(flight, indice=None):
+    if indice is None:
+        indice = indice_despegues()
     hora_despegue_programada = flight["hora_despegue"].iloc[0]
     rw = flight["runway"].iloc[0]    
     año = flight.iloc[0]["ts"].year
     mes = flight.iloc[0]["month"]
     dia = flight.iloc[0]["day"]
-    if os.path.exists(f"D:/data//filtrado/despegues/{año}/{mes}/{dia}.parquet"):
-        despegues_dia = pd.read_parquet(f"D:/data/filtrado/despegues/{año}/{mes}/{dia}.parquet")
-        if despegues_dia["hora_despegue"].isnull().any():
-                print(f"WARNING: 'hora_despegue_onground' contains null values in file: D:/data//filtrado/despegues/{año}/{mes}/{dia}.parquet", flush=True)
-            
-
-        filtered_previos = despegues_dia[
-            (despegues_dia["hora_despegue"] < hora_despegue_programada) &
-            (despegues_dia["hora_despegue"] > hora_despegue_programada - timedelta(minutes=90)) &
-            (despegues_dia["runway"] == rw)
-        ].sort_values("hora_despegue")
-
-        list_despegues_previos = filtered_previos.drop_duplicates(subset=["hora_despegue"])   
-
-        flight[["despegues_previos_1h", "media_diff_1h"]]   = flight.apply(lambda x: get_num_despegues_previos(x, list_despegues_previos, 60), axis=1, result_type='expand')
-        flight[["despegues_previos_45m", "media_diff_45m"]] = flight.apply(lambda x: get_num_despegues_previos(x, list_despegues_previos, 45), axis=1, result_type='expand')
-        flight[["despegues_previos_30m", "media_diff_30m"]] = flight.apply(lambda x: get_num_despegues_previos(x, list_despegues_previos, 30), axis=1, result_type='expand')
-        flight[["despegues_previos_20m", "media_diff_20m"]] = flight.apply(lambda x: get_num_despegues_previos(x, list_despegues_previos, 20), axis=1, result_type='expand')
-        flight[["despegues_previos_10m", "media_diff_10m"]] = flight.apply(lambda x: get_num_despegues_previos(x, list_despegues_previos, 10), axis=1, result_type='expand')
-        flight[["despegues_previos_5m", "media_diff_5m"]]   = flight.apply(lambda x: get_num_despegues_previos(x, list_despegues_previos,  5), axis=1, result_type='expand')
-
-        flight[["tiempo_desde_ultimo_despegue", "tipo_avion_ultimo_despegue", "icao_ultimo_despegue"]] = flight.apply(lambda x: get_info_last_takeoff(x, list_despegues_previos), axis=1, result_type='expand')
-        wake_vortex_na_idx = flight[flight["tipo_avion_ultimo_despegue"].isna()].index
-        for idx in wake_vortex_na_idx:
-            icao_last = flight.at[idx, "icao_ultimo_despegue"]
-            if pd.isna(icao_last):
-                continue
-            msg_list = despegues_dia.loc[despegues_dia["icao"] == icao_last, "msg_hex"].tolist()
-            wake_value = None
-            for msg in msg_list:
-                try:
-                    w = pms.bds.bds45.wv45(msg)
-                except Exception:
-                    w = None
-                if w is not None:
-                    wake_value = w
-                    break
-            if wake_value is not None:
-                flight.at[idx, "tipo_avion_ultimo_despegue"] = wake_value
-            flight.loc[wake_vortex_na_idx]
-        
-        flight[[
-            "holding_ocupado", "num_holding_aircrafts",       "icaos_holdings",      "distancias_holdings",   "tiempo_holding", "despegue_holdings",
-            "pista_ocupada",   "num_en_pista_aircrafts",      "icaos_en_pista",      "distancia_en_pista",
-            "en_camino_antes", "num_yendo_a_pista_aircrafts", "icaos_yendo_a_pista", "distancia_yendo_a_pista"]] = flight.apply(lambda x: get_other_aircraft_info(x, filtered_previos, rw), axis=1, result_type='expand')
+    despegues_dia = indice.dia(año, mes, dia)
+    if despegues_dia is not None:
+        filtered_previos, list_despegues_previos = despegues_dia.previos(rw, hora_despegue_programada)
+
+        flight = add_despegues_previos(flight, list_despegues_previos)
+
+        # estela del último despegue por icao en el registro (BDS 4,5 de decodificacion), sin decodificar mensajes
+        registro = estela.registro()
+        flight[["tiempo_desde_ultimo_despegue", "tipo_avion_ultimo_despegue", "icao_ultimo_despegue"]] = flight.apply(lambda x: get_info_last_takeoff(x, list_despegues_previos, registro), axis=1, result_type='expand')
+
+        flight[COLUMNAS_TRAFICO] = despegues_dia.trafico(flight, rw, hora_despegue_programada)
         return flight
     else:
-        print(f"no existe", f"D:/data/filtrado/despegues/{año}/{mes}/{dia}.parquet")
+        print(f"no existe", indice.path(año, mes, dia))
         return pd.DataFrame()
 
-def process_data(df):
+def process_data(df, metrics=None):
+    indice = indice_despegues()
     n_flights = df.groupby(["icao", "flight_id", "day"], observed=True).ngroups
     dfs = []
     i = 0
     print("Procesando ", n_flights, " vuelos", end="  -->  ", flush=True)
-    for _, df_flight in df.groupby(["icao", "flight_id", "day"], observed=True):
+    for (icao, flight_id, day), df_flight in df.groupby(["icao", "flight_id", "day"], observed=True):
             i+=1
             if i % 20 == 0 or i == n_flights:
                 print(i, end=" - ", flush=True)
-            aux = process_flight(df_flight)
+            start = time.perf_counter()
+            hits_before = indice.hits
+            aux = process_flight(df_flight, indice)
             dfs.append(aux)
+            if metrics is not None:
+                metrics.add_tasks([telemetria.task_stats(start, len(df_flight), len(aux), icao=icao, flight_id=flight_id, day=day,
+                                                         indice_hit=indice.hits > hits_before)])
     print()
+    print("🗂️ Índice de despegues:", indice.stats(), flush=True)
     return pd.concat(dfs, ignore_index=True)
     
 
+FLIGHT_KEYS = ["icao", "flight_id", "day"]
+
+def schedule_shards(df):
+    """Reparte los vuelos de df en tareas por (día, pista del primer mensaje), de mayor a menor.
+
+    Cada tarea lleva sus filas y el ordinal de cada vuelo en el groupby de process_data, con el que
+    merge_shards recupera el orden de la salida en serie.
+    """
+    ordinal = df.groupby(FLIGHT_KEYS, observed=True).ngroup().to_numpy()
+    validos = ordinal >= 0
+    df, ordinal = df[validos], ordinal[validos]
+    ordinales, primera = np.unique(ordinal, return_index=True)
+    claves = pd.DataFrame({"ordinal": ordinales, "day": df["day"].to_numpy()[primera],
+                           "runway": df["runway"].astype(object).to_numpy()[primera]})
+    # pista nula como clave propia (groupby las descartaría)
+    claves["runway"] = claves["runway"].where(claves["runway"].notna(), None).astype(str)
+    shard = claves.groupby(["day", "runway"], sort=True, observed=True).ngroup().to_numpy()
+    shard_fila = shard[np.searchsorted(ordinales, ordinal)]
+    tasks = [(df[shard_fila == k], ordinales[shard == k]) for k in range(shard.max() + 1)] if len(shard) else []
+    tasks.sort(key=lambda task: len(task[0]), reverse=True)
+    return tasks
+
+def init_worker(despegues, max_dias, registro_estela):
+    """Initializer del pool: rutas y tamaño del índice del padre (con spawn el módulo se reimporta)."""
+    global DESPEGUES, MAX_DIAS_INDICE
+    DESPEGUES, MAX_DIAS_INDICE = despegues, max_dias
+    estela.REGISTRO = registro_estela
+
+def process_shard(task, parts_dir):
+    """Worker: vuelos de un (día, pista) con el índice de despegues del proceso; el resultado va a una parte Arrow."""
+    df_shard, ordinales = task
+    indice = indice_despegues()
+    antes = indice.stats()
+    dfs, filas, stats = [], [], []
+    for ordinal, ((icao, flight_id, day), df_flight) in zip(ordinales, df_shard.groupby(FLIGHT_KEYS, observed=True)):
+        start = time.perf_counter()
+        hits_before = indice.hits
+        aux = process_flight(df_flight, indice)
+        dfs.append(aux)
+        filas.append((int(ordinal), len(aux)))
+        stats.append(telemetria.task_stats(start, len(df_flight), len(aux), icao=icao, flight_id=flight_id, day=day,
+                                           indice_hit=indice.hits > hits_before))
+    path = tablaCompartida.write_part(pd.concat(dfs, ignore_index=True), parts_dir, f"{int(ordinales[0]):06d}")
+    return path, filas, stats, {k: indice.stats()[k] - antes[k] for k in ('hits', 'misses', 'evictions')}
+
+def merge_shards(results):
+    """Une las partes en el orden de la salida en serie (ordinal del vuelo) como una sola tabla Arrow.
+
+    Las partes son Arrow IPC (tablaCompartida.write_part), que conservan los tipos de from_pandas tal cual
+    (parquet devolvería string en vez de large_string y listas con hijo 'element'). Los tipos de cada columna
+    se unifican entre partes (una parte con todo nulo es null) y los metadatos pandas se toman de la parte
+    más grande, con el RangeIndex de la tabla entera, como los escribe to_parquet en serie.
+    """
+    partes = []
+    for path, filas, _, _ in results:
+        if path is not None:
+            with pa.OSFile(path, 'rb') as source:
+                partes.append((pa.ipc.open_file(source).read_all(), filas))
+    if not partes:
+        return None
+    table = pa.concat_tables([t for t, _ in partes], promote_options="permissive")
+    ordinal = np.concatenate([np.repeat([o for o, _ in filas], [n for _, n in filas]) for _, filas in partes])
+    table = table.take(pa.array(np.argsort(ordinal, kind="stable")))
+    metadata = json.loads(max(partes, key=lambda parte: parte[0].num_rows)[0].schema.metadata[b'pandas'])
+    # índice y nombres de columna como los de to_parquet sobre el DataFrame entero (write_part no guarda índice)
+    indice = json.loads(pa.Schema.from_pandas(pd.DataFrame(index=pd.RangeIndex(table.num_rows), columns=pd.Index(table.column_names))).metadata[b'pandas'])
+    metadata['index_columns'], metadata['column_indexes'] = indice['index_columns'], indice['column_indexes']
+    for col in metadata['columns']:
+        if col['name'] == 'msg':
+            # como adsb_np.write_parquet: pandas no reconstruye fixed_size_binary al leer
+            col['numpy_type'] = 'object'
+    return table.replace_schema_metadata({b'pandas': json.dumps(metadata).encode()})
+
+def process_data_parallel(df, processes, metrics=None):
+    tasks = schedule_shards(df)
+    print(f"Procesando {df.groupby(FLIGHT_KEYS, observed=True).ngroups} vuelos en {len(tasks)} tareas (día, pista) "
+          f"con {processes} núcleos", end="  -->  ", flush=True)
+    parts_dir = tempfile.mkdtemp(prefix="despeguesPrevios_partes_")
+    results = []
+    try:
+        with mp.Pool(processes=processes, initializer=init_worker, initargs=(DESPEGUES, MAX_DIAS_INDICE, estela.REGISTRO)) as pool:
+            for result in pool.imap_unordered(partial(process_shard, parts_dir=parts_dir), tasks):
+                results.append(result)
+                print(len(results), end=" - ", flush=True)
+        print()
+        if metrics is not None:
+            metrics.add_tasks([stat for result in results for stat in result[2]])
+        indices = pd.DataFrame([result[3] for result in results])
+        print("🗂️ Índice de despegues (workers):", indices.sum().to_dict(), flush=True)
+        return merge_shards(results)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+def process_week(path_semana, out_dir, processes=None):
+    metrics = telemetria.Telemetria("despeguesPrevios", path_semana)
+    with metrics.medir('read_parquet'):
+        df = pd.read_parquet(path_semana)
+        df = df.sort_values("ts")
+    metrics.rows_in = len(df)
+    num_cores = processes or os.cpu_count()
+    if PARALELO and num_cores > 1:
+        with metrics.medir('process_data_parallel'):
+            result = process_data_parallel(df, num_cores, metrics)
+        with metrics.medir('write_parquet'):
+            if result is None:
+                adsb_np.write_parquet(pd.DataFrame(), out_dir)
+            else:
+                pq.write_table(result, out_dir, compression='snappy')
+        metrics.rows_out = 0 if result is None else result.num_rows
+        metrics.write(out_dir)
+        return True
+    with metrics.medir('process_data'):
+        result = process_data(df, metrics)
+    with metrics.medir('write_parquet'):
+        adsb_np.write_parquet(result, out_dir)
+    metrics.rows_out = len(result)
+    metrics.write(out_dir)
+    return True
+
 def main():
     path_base = "D:/data/enEspera"
     out_dir_base = "D:/data/processed"
@@ -203,10 +448,7 @@ def main():
                     path_semana = os.path.join(path_mes, f"{init}_{end}.parquet")
                     out_dir = os.path.join(out_dir_base, a, m, f"{init}_{end}.parquet")
                     if os.path.exists(path_semana):
-                        df = pd.read_parquet(path_semana)
-                        df = df.sort_values("ts")
-                        result = process_data(df)
-                        result.to_parquet(out_dir)
+                        process_week(path_semana, out_dir)
                     else:
                         print(path_semana, " no existe")
             else:
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import adsbVectorizado as adsb_np
+
+# Registro único de tipos de columna para todas las etapas. Cada worker lo aplica a lo que produce antes de
+# que cruce un límite de proceso (pickle, memoria compartida, partes Arrow) o se escriba a disco, de modo que
+# el padre nunca ve los tipos anchos (ts en ns, icao en texto, float64)
+#
+#   columna: (tipo Arrow en disco y entre procesos, tipo pandas dentro de cada etapa)
+#
+# icao es el entero de 24 bits de la dirección (icao_to_hex da el texto); tc e icao admiten nulos (mensajes
+# sin typecode y direcciones no válidas), de ahí los enteros nullable de pandas. lat/lon siguen en float64:
+# en float32 la posición pierde ~0.5 m a 40° de latitud, del orden del buffer de los puntos de espera
+COLUMNAS = {
+    'ts':                   (pa.timestamp('ms'), 'datetime64[ms]'),
+    'tc':                   (pa.uint8(),         'UInt8'),
+    'oe_flag':              (pa.bool_(),         'bool'),
+    'icao':                 (pa.uint32(),        'UInt32'),
+    'altitude':             (pa.float32(),       'float32'),
+    'speed':                (pa.float32(),       'float32'),
+    'angle':                (pa.float32(),       'float32'),
+    'vertical_rate':        (pa.float32(),       'float32'),
+    # columnas que añade filtrado
+    'flight_id':            (pa.uint8(),         'uint8'),
+    'esta_en_pista':        (pa.bool_(),         'bool'),
+    'momento_despegue':     (pa.bool_(),         'bool'),
+    'para_en_espera':       (pa.bool_(),         'bool'),
+    'hora_despegue':        (pa.timestamp('ms'), 'datetime64[ms]'),
+    'hora_despegue_mala':   (pa.timestamp('ms'), 'datetime64[ms]'),
+    'llegada_punto_espera': (pa.timestamp('ms'), 'datetime64[ms]'),
+}
+
+# Columnas del parquet de decodificacion, en orden (la del mensaje va en segunda posición)
+MENSAJES = ['ts', 'tc', 'oe_flag', 'icao', 'altitude', 'speed', 'angle', 'vertical_rate']
+
+def schema(binary_msg=False):
+    """Esquema Arrow del día decodificado: 'msg' fixed_size_binary(14) o 'msg_hex' texto."""
+    msg_field = pa.field('msg', adsb_np.MSG_TYPE) if binary_msg else pa.field('msg_hex', pa.string())
+    campos = [pa.field(col, COLUMNAS[col][0]) for col in MENSAJES]
+    return pa.schema(campos[:1] + [msg_field] + campos[1:])
+
+def icao_array(icao, valido=None):
+    """Columna icao (UInt32) desde enteros de 24 bits, con nulo donde valido es False."""
+    icao = np.asarray(icao).astype(np.uint32)
+    mask = np.zeros(len(icao), dtype=bool) if valido is None else ~np.asarray(valido, dtype=bool)
+    return pd.arrays.IntegerArray(icao, mask)
+
+def icao_from_hex(icao):
+    """Columna icao (UInt32) desde texto hexadecimal (parquets anteriores al registro, pyModeS)."""
+    codes, uniques = pd.factorize(pd.Series(icao).astype(object))
+    # el código -1 (nulo) toma el último valor, un 0 que queda enmascarado
+    valores = np.array([int(u, 16) for u in uniques] + [0], dtype=np.uint32)
+    return icao_array(valores[codes], codes >= 0)
+
+def aplicar(df):
+    """Pasa las columnas del registro presentes en df a su tipo pandas; no copia las que ya lo tienen."""
+    for col, (_, dtype) in COLUMNAS.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if col == 'icao' and not pd.api.types.is_numeric_dtype(df[col].dtype):
+            df[col] = icao_from_hex(df[col].to_numpy(dtype=object))
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def to_pandas(table):
+    """Tabla Arrow (del registro) a DataFrame con los tipos pandas del registro, sin pasar por float64."""
+    mapper = {adsb_np.MSG_TYPE: pd.ArrowDtype(adsb_np.MSG_TYPE),
+              pa.uint8(): pd.UInt8Dtype(), pa.uint32(): pd.UInt32Dtype()}
+    return aplicar(table.to_pandas(types_mapper=mapper.get))
@@ -0,0 +1,115 @@
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+import adsbVectorizado as adsb_np
+
+# Registro persistente ICAO -> categoría de estela (wv45 de BDS 4,5: 0 NIL, 1 ligera, 2 media, 3 severa).
+# Las respuestas Comm-B (DF20/21) que llevan BDS 4,5 no pasan el filtro de CRC de decodificacion (su resto
+# es la dirección), así que el registro se alimenta allí, antes de descartarlas. La categoría de un avión no
+# cambia: se guarda cuántos mensajes distintos dieron cada categoría y se usa la más vista.
+# Cada día decodificado deja sus conteos en su propia parte (PARTES); REGISTRO es la suma de todas las partes
+# (consolidar). Redecodificar un día reemplaza su parte, así que no cuenta dos veces
+REGISTRO = "D:/data/estela/registro.parquet"
+PARTES   = "D:/data/estela/dias"
+
+COLUMNAS = {'icao': 'uint32', 'wake_vortex': 'uint8', 'mensajes': 'int64'}
+
+def observaciones(raw, longitud, decoded):
+    """(icao, wake_vortex, mensajes) de los mensajes DF20/21 que parecen BDS 4,5 (pms is45) con wv45 válido.
+
+    raw, longitud y decoded son los de adsb_np.decode_messages (mensajes distintos de un chunk).
+    """
+    comm_b = np.flatnonzero(np.isin(decoded['df'], (20, 21)) & (longitud == 14))
+    es_bds45, wv = adsb_np.bds45_array(raw[comm_b])
+    sel = es_bds45 & (wv >= 0)
+    if not sel.any():
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in COLUMNAS.items()})
+    obs = pd.DataFrame({'icao': decoded['icao'][comm_b[sel]].astype(np.uint32), 'wake_vortex': wv[sel].astype(np.uint8)})
+    return obs.groupby(['icao', 'wake_vortex']).size().rename('mensajes').reset_index().astype(COLUMNAS)
+
+class RegistroEstela:
+    """Conteos (icao, categoría) de REGISTRO y diccionario icao -> categoría en memoria para consultas O(1)."""
+    def __init__(self, path=REGISTRO):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conteos = {}
+        self.categorias = {}
+        self.stat = None
+        if path is not None and os.path.exists(path):
+            self.stat = os.stat(path).st_mtime_ns
+            self.add(pd.read_parquet(path))
+
+    def add(self, obs):
+        """Suma observaciones (DataFrame icao, wake_vortex, mensajes) en memoria y recalcula la categoría de esos ICAO.
+
+        No toca el disco: los días decodificados entran con guardar_dia + consolidar.
+        """
+        if obs is None or obs.empty:
+            return
+        with self.lock:
+            tocados = set()
+            for icao, wv, n in zip(obs['icao'].tolist(), obs['wake_vortex'].tolist(), obs['mensajes'].tolist()):
+                self.conteos[icao, wv] = self.conteos.get((icao, wv), 0) + n
+                tocados.add(icao)
+            for icao in tocados:
+                # la más vista; a igualdad, la más severa
+                self.categorias[icao] = max(range(4), key=lambda wv: (self.conteos.get((icao, wv), 0), wv))
+
+    def get(self, icao, default=None):
+        if icao is None or pd.isna(icao):
+            return default
+        # icao en texto hexadecimal: parquets anteriores al registro de esquema
+        return self.categorias.get(int(icao, 16) if isinstance(icao, str) else int(icao), default)
+
+    def lookup(self, icaos):
+        """Categoría (int) de cada ICAO de la columna, None si no está en el registro."""
+        return pd.Series([self.get(icao) for icao in pd.Series(icaos).tolist()], dtype=object)
+
+    def __len__(self):
+        return len(self.categorias)
+
+_registro = None
+
+def registro():
+    """Registro del proceso (compartido por los hilos del pipeline), releído si otro proceso reescribe REGISTRO."""
+    global _registro
+    stat = os.stat(REGISTRO).st_mtime_ns if os.path.exists(REGISTRO) else None
+    if _registro is None or _registro.path != REGISTRO or (stat is not None and stat != _registro.stat):
+        _registro = RegistroEstela(REGISTRO)
+    return _registro
+
+def sumar(obs):
+    """Suma una lista de observaciones por (icao, categoría), ordenada para que el parquet sea reproducible."""
+    obs = [o for o in obs if o is not None and not o.empty]
+    if not obs:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in COLUMNAS.items()})
+    suma = pd.concat(obs).groupby(['icao', 'wake_vortex'], as_index=False, sort=True)['mensajes'].sum()
+    return suma.astype(COLUMNAS)
+
+def escribir(df, path):
+    """Escritura atómica: un lector nunca ve un parquet a medias."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def parte(raw_dir, partes=None):
+    """Parte del día de origen raw_dir (carpeta o archivo comprimido del mismo día comparten parte)."""
+    nombre = re.sub(r'\.(tar\.gz|tgz|tar)$', '', os.path.normpath(str(raw_dir)))
+    return os.path.join(partes or PARTES, re.sub(r'[^0-9A-Za-z]+', '_', nombre).strip('_') + ".parquet")
+
+def guardar_dia(raw_dir, obs, partes=None):
+    """Reemplaza los conteos del día raw_dir por obs (lista de observaciones). Devuelve la ruta de la parte."""
+    path = parte(raw_dir, partes)
+    escribir(sumar(obs), path)
+    return path
+
+def consolidar(partes=None, path=None):
+    """Reescribe REGISTRO como la suma de todas las partes. Devuelve el número de ICAO con categoría."""
+    partes, path = partes or PARTES, path or REGISTRO
+    nombres = sorted(f for f in os.listdir(partes) if f.endswith(".parquet")) if os.path.isdir(partes) else []
+    suma = sumar([pd.read_parquet(os.path.join(partes, f)) for f in nombres])
+    escribir(suma, path)
+    return suma['icao'].nunique()
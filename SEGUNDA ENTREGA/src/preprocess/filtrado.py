@@ -1,20 +1,71 @@
 import os
 import math
-import json
 import numpy as np
 import pandas as pd
 import pyModeS as pms
-import geopandas as gpd
 import multiprocessing as mp
-from shapely.geometry import Point
+import pyarrow as pa
+import pyarrow.parquet as pq
+from functools import partial
+import adsbVectorizado as adsb_np
+import aeropuerto
+import esquema
+import telemetria
+import tablaCompartida
+import time
+import shutil
+from collections import defaultdict
+import tempfile
 import warnings
 
 warnings.filterwarnings("ignore")
 
 LAT, LON = 40.5100278, -3.5300000
+BBOX = { 'lon_min': -3.70, 'lon_max': -3.40, 'lat_min': 40.35, 'lat_max': 40.65}
+
+CPR_TOLERANCE  = 10      # segundos máximos entre mensajes par/impar emparejados
+FLIGHT_GAP     = 300     # segundos sin pisar pista que separan dos vuelos
+HOLDING_BUFFER = 0.0002  # ~20 metros alrededor de cada punto de espera
+MIN_MESSAGES   = 500     # ICAOs con menos mensajes en el día se descartan
+
+# Resolución en metros de la rejilla de zonas precalculada (None: test exacto contra los polígonos)
+ZONE_GRID = aeropuerto.GRID_RESOLUTION
+
+# Día ordenado por ICAO en memoria compartida: los workers reciben (inicio, fin) en vez de un sub-DataFrame
+# y escriben sus resultados como partes Arrow (False: reparto por pickle de cada grupo)
+SHARED_DAY = True
+
+# Planificación por tamaño: los ICAOs se reparten de mayor a menor y los de más de SPLIT_ROWS filas se parten
+# en huecos de más de SPLIT_GAP segundos. separate_flights corta vuelos a FLIGHT_GAP, pero extiende flight_id
+# hasta 20 minutos hacia atrás: sólo un hueco mayor separa tramos que se pueden procesar por separado
+SPLIT_ROWS   = 100_000
+SPLIT_GAP    = 20 * 60
+CONTEXT_ROWS = 256      # filas vecinas que se decodifican para interpolar los bordes de cada tramo
+
+# Lectura podada del día (el parquet de decodificacion va ordenado por icao/ts con estadísticas por row group):
+# sólo ICAOs con algún mensaje de posición en superficie o por debajo de PRUNE_ALTITUDE pies cerca del
+# aeropuerto (filtro CPR grueso, sin decodificar) y sólo sus filas a menos de PRUNE_WINDOW segundos de uno de
+# esos mensajes; separate_flights mira hasta 20 minutos atrás, de ahí los 30. Despegues y aterrizajes salen
+# iguales que sin poda; sólo se pierden los raros de sobrevuelos por encima de PRUNE_ALTITUDE (None: ninguno).
+# TIPOS_NECESARIOS filtra además por tc, pero las filas sin tc (DF11) y las de otros tipos también son filas de
+# los vuelos (flight_id, ffill de altitud, hora_despegue): con una lista el resultado deja de ser el mismo
+PRUNE_DAY        = True
+PRUNE_ALTITUDE   = 10000
+PRUNE_WINDOW     = 30 * 60
+PRUNE_MARGIN     = 0.05                # grados alrededor de BBOX en el filtro CPR grueso
+TIPOS_NECESARIOS = None                # None: todos los mensajes de los ICAOs y ventanas elegidos
+
+# Decodificación de posiciones: "global" empareja par/impar (dos merge_asof por ICAO); "local" decodifica cada
+# mensaje por separado frente a (LAT, LON) y sólo lo acepta si coincide con un mensaje de paridad contraria a
+# menos de CPR_TOLERANCE segundos: un mensaje fuera del alcance de la referencia (180 NM en vuelo, 45 NM en
+# superficie) se desplaza una zona distinta en par (360/60) que en impar (360/59) y no coincide
+CPR_MODE = "global"
+
+# Copias del mismo mensaje recibidas por varias antenas se colapsan en una por ventana de DEDUP_WINDOW segundos (None: desactivado)
+DEDUP_WINDOW = None
 
 def is_position_msg(tc):
-    return (5 <= tc <= 8) or (9 <= tc <= 18)
+    return not pd.isna(tc) and ((5 <= tc <= 8) or (9 <= tc <= 18))
 
 def decode_cpr(row):
     me = row['msg_hex_even']
@@ -32,25 +83,88 @@ def decode_cpr(row):
 
     return pd.Series(out)
 
+def decode_cpr_pairs(pairs, msg_col='msg_hex'):
+    """decode_cpr para todos los pares a la vez sobre arrays (adsbVectorizado.position_pairs)."""
+    lat = np.full(len(pairs), np.nan)
+    lon = np.full(len(pairs), np.nan)
+    validos = (pairs[f'{msg_col}_even'].notna() & pairs[f'{msg_col}_odd'].notna() &
+               pairs['ts_even'].notna() & pairs['ts_odd'].notna()).to_numpy()
+    if validos.any():
+        sel = pairs[validos]
+        lat[validos], lon[validos] = adsb_np.position_pairs(
+            adsb_np.to_raw_array(sel[f'{msg_col}_even']), adsb_np.to_raw_array(sel[f'{msg_col}_odd']),
+            sel['ts_even'].to_numpy('datetime64[ns]').astype(np.int64),
+            sel['ts_odd'].to_numpy('datetime64[ns]').astype(np.int64),
+            LAT, LON)
+    return lat, lon
+
+def pair_position_msgs(flight_pos, msg_col='msg_hex'):
+    even_msgs = flight_pos[flight_pos['oe_flag']==0].rename(columns={'ts': 'ts_even'})
+    odd_msgs  = flight_pos[flight_pos['oe_flag']==1].rename(columns={'ts': 'ts_odd'})
+
+    return pd.merge_asof(even_msgs, odd_msgs,
+        left_on='ts_even', right_on='ts_odd', tolerance=pd.Timedelta(seconds=CPR_TOLERANCE),
+        direction='backward', suffixes=('_even','_odd')
+    ).loc[:, [f"{msg_col}_even", f"{msg_col}_odd", "ts_even", "ts_odd"]]
+
+def local_positions(raw, t, lat_ref=LAT, lon_ref=LON, tolerance=CPR_TOLERANCE):
+    """lat/lon de cada mensaje de posición decodificado solo frente a la referencia (NaN si no se valida).
+
+    raw son los mensajes de posición de un ICAO en orden de ts y t sus ts en nanosegundos. Un mensaje vale si
+    el mensaje de paridad contraria anterior o el siguiente está a menos de tolerance segundos y a menos de
+    media diferencia entre zonas par e impar (d/59 - d/60) en latitud y en longitud.
+    """
+    lat, lon = adsb_np.position_with_ref(raw, lat_ref, lon_ref)
+    tc, oe, _, _ = adsb_np.cpr_fields(raw)
+    margen = np.where((tc >= 5) & (tc <= 8), 90, 360) / (2 * 59 * 60)
+    n = len(raw)
+    fila = np.arange(n)
+    t = np.asarray(t, dtype=np.int64)
+    valido = np.zeros(n, dtype=bool)
+    for paridad in (0, 1):
+        # último anterior y primero siguiente de la paridad contraria a 'paridad'
+        otra = oe == 1 - paridad
+        anterior = np.maximum.accumulate(np.where(otra, fila, -1))
+        siguiente = np.minimum.accumulate(np.where(otra, fila, n)[::-1])[::-1]
+        propios = oe == paridad
+        for vecino in (anterior, siguiente):
+            existe = propios & (vecino >= 0) & (vecino < n)
+            k = np.clip(vecino, 0, n - 1)
+            with np.errstate(invalid='ignore'):
+                coincide = ((np.abs(t[k] - t) <= tolerance * 1e9) &
+                            (np.abs(lat[k] - lat) <= margen) & (np.abs(lon[k] - lon) <= margen))
+            valido |= existe & coincide
+    return np.where(valido, lat, np.nan), np.where(valido, lon, np.nan)
+
+def add_position_local(flight):
+    """add_position con CPR_MODE = "local": posición en las filas de mensajes de posición, sin emparejar."""
+    tc = flight['tc'].astype(np.float64).to_numpy()
+    es_pos = (tc >= 5) & (tc <= 18)
+    if not es_pos.any():
+        return pd.DataFrame()
+    msg_col = 'msg_hex' if 'msg_hex' in flight.columns else 'msg'
+    lat = np.full(len(flight), np.nan)
+    lon = np.full(len(flight), np.nan)
+    lat[es_pos], lon[es_pos] = local_positions(adsb_np.to_raw_array(flight.loc[es_pos, msg_col]),
+                                               flight['ts'].to_numpy('datetime64[ns]')[es_pos].astype(np.int64))
+    return flight.reset_index(drop=True).assign(lat=lat, lon=lon)
+
 def add_position(flight):
+    if CPR_MODE == "local":
+        return add_position_local(flight)
     flight_pos = flight[flight['tc'].apply(is_position_msg)]
     if len(flight_pos) == 0:
         return pd.DataFrame()
-    
-    even_msgs = flight_pos[flight_pos['oe_flag']==0].rename(columns={'ts': 'ts_even'})
-    odd_msgs  = flight_pos[flight_pos['oe_flag']==1].rename(columns={'ts': 'ts_odd'})
+    msg_col = 'msg_hex' if 'msg_hex' in flight_pos.columns else 'msg'
 
-    pairs = pd.merge_asof(even_msgs, odd_msgs,
-        left_on='ts_even', right_on='ts_odd', tolerance=pd.Timedelta('10s'),
-        direction='backward', suffixes=('_even','_odd')
-    ).loc[:, ["msg_hex_even", "msg_hex_odd", "ts_even", "ts_odd"]]
+    pairs = pair_position_msgs(flight_pos, msg_col)
 
     if pairs.empty:
         return pd.DataFrame()
     
-    decoded = pairs.apply(decode_cpr, axis=1)
+    pairs['lat'], pairs['lon'] = decode_cpr_pairs(pairs, msg_col)
 
-    pairs = pd.concat([pairs, decoded], axis=1).loc[:, ["ts_even", "lat", "lon"]]
+    pairs = pairs.loc[:, ["ts_even", "lat", "lon"]]
 
     result = pd.merge_asof(
         flight, pairs.sort_values('ts_even'),
@@ -63,27 +177,22 @@ def add_position(flight):
     
     return result
 
-def adding_runways(df, geojson_path):
-    runways_gdf = gpd.read_file(geojson_path)
-    runways_gdf = runways_gdf.set_crs(epsg=4326, allow_override=True)
-    runways_utm = runways_gdf.to_crs(epsg=32630)
-
-    points_gdf = gpd.GeoDataFrame( df.copy(), geometry=gpd.points_from_xy(df.lon, df.lat), crs="EPSG:4326" )
-    points_utm = points_gdf.to_crs(epsg=32630)
+def zone_index(runways_path=aeropuerto.RUNWAYS_GEOJSON, holdings_path=aeropuerto.HOLDINGS_GEOJSON, buffer_radius=HOLDING_BUFFER):
+    """Rejilla de zonas (mmap, compartida entre workers) o el índice de polígonos si ZONE_GRID es None."""
+    if ZONE_GRID is None:
+        return aeropuerto.get_aeropuerto(runways_path, holdings_path, buffer_radius)
+    return aeropuerto.get_zonas(ZONE_GRID, runways_path, holdings_path, buffer_radius)
 
-    joined = gpd.sjoin(points_utm, runways_utm[['RWY', 'geometry']], how='left', predicate='within')
-    if not joined.index.is_unique:
-        joined = joined[~joined.index.duplicated(keep='first')]
-    
-    runway_series = joined['RWY'].where(joined['RWY'].notna(), None)
-    runway_series.index = df.index
+def adding_runways(df, geojson_path):
+    # índice de pistas ya proyectado, construido una vez por worker
+    index = zone_index(runways_path=geojson_path)
     df = df.copy()
-    df['runway'] = runway_series
+    df['runway'] = index.runway_of(df['lat'].to_numpy(), df['lon'].to_numpy())
     return df
 
 def separate_flights(df_icao):
     aux = df_icao[df_icao["runway"].notna()].copy()
-    aux["flight_id"] = (aux["ts"].diff().gt(pd.Timedelta(seconds=300)).cumsum()) + 1
+    aux["flight_id"] = (aux["ts"].diff().gt(pd.Timedelta(seconds=FLIGHT_GAP)).cumsum()) + 1
     result = pd.merge_asof(df_icao, aux[["ts", "flight_id"]],
                             on="ts", direction='backward', tolerance=pd.Timedelta(seconds=120))
     full_bfill = result["flight_id"].bfill()
@@ -94,41 +203,61 @@ def separate_flights(df_icao):
     result = result.dropna(subset=["flight_id"])
     return result
 
+def flight_groups(fid):
+    """Inicio de cada vuelo y número de vuelo de cada fila, con las filas ya ordenadas por flight_id."""
+    starts = np.flatnonzero(np.r_[True, fid[1:] != fid[:-1]]) if len(fid) else np.array([], dtype=np.int64)
+    return starts, np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(fid)]))
+
+def dominant_runway(grupo, runway, n_grupos):
+    """Pista más frecuente de cada vuelo; en empate la que aparece antes, como value_counts().idxmax()."""
+    codes, pistas = pd.factorize(runway)
+    validas = codes >= 0
+    n_pistas = max(len(pistas), 1)
+    claves, primera, n = np.unique(grupo[validas].astype(np.int64) * n_pistas + codes[validas], return_index=True, return_counts=True)
+    orden = np.lexsort((primera, -n, claves // n_pistas))
+    vuelo = claves[orden] // n_pistas
+    elegidas = claves[orden][np.r_[True, vuelo[1:] != vuelo[:-1]]]
+    out = np.full(n_grupos, None, dtype=object)
+    out[elegidas // n_pistas] = np.asarray(pistas, dtype=object)[elegidas % n_pistas]
+    return out
+
 def filter_takeoffs(flights):
-    dfs_takeoffs = []
-    dfs_landings = []
-    dfs_raros = []
-    for _, flight in flights.groupby("flight_id"):
-        flight["altitude"] = flight["altitude"].ffill()        
-        rw = flight["runway"].dropna().value_counts().idxmax()
-        flight["esta_en_pista"] = flight["runway"].notna()
-        flight["runway"] = flight["runway"].fillna(rw)
-        desnivel = flight["altitude"].diff().sum()
-        min_speed = flight["speed"].min()
-        todo_nans_speed = flight["speed"].isna().sum() == len(flight)
-        if desnivel > 1500 and (min_speed < 110 or todo_nans_speed):
-            dfs_takeoffs.append(flight)
-        elif desnivel < -500 and (min_speed < 100 or todo_nans_speed):
-            dfs_landings.append(flight)
+    """Clasifica todos los vuelos a la vez en despegues, aterrizajes y raros con reducciones por vuelo.
+
+    Mismo resultado que recorrer flights.groupby("flight_id") vuelo a vuelo: filas agrupadas por vuelo en orden
+    de flight_id, altitud con ffill dentro del vuelo y huecos de pista con la pista dominante.
+    """
+    if flights.empty:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    flights = flights.sort_values("flight_id", kind='stable')
+    starts, grupo = flight_groups(flights["flight_id"].to_numpy())
+    flights["altitude"] = flights["altitude"].groupby(grupo).ffill().to_numpy()
+    pista = dominant_runway(grupo, flights["runway"].to_numpy(dtype=object), len(starts))
+    flights["esta_en_pista"] = flights["runway"].notna()
+    flights["runway"] = flights["runway"].fillna(pd.Series(pista[grupo], index=flights.index))
+
+    # desnivel = altitude.diff().sum() de cada vuelo (la primera fila de cada vuelo no tiene diferencia)
+    altitude = flights["altitude"].to_numpy(dtype=np.float64, na_value=np.nan)
+    diffs = np.r_[np.nan, np.diff(altitude)]
+    diffs[starts] = np.nan
+    desnivel = np.add.reduceat(np.nan_to_num(diffs), starts)
+    speed = flights["speed"].to_numpy(dtype=np.float64, na_value=np.nan)
+    min_speed = np.fmin.reduceat(speed, starts)
+    todo_nans_speed = np.logical_and.reduceat(np.isnan(speed), starts)
+    with np.errstate(invalid='ignore'):
+        despegue = (desnivel > 1500) & ((min_speed < 110) | todo_nans_speed)
+        aterrizaje = ~despegue & (desnivel < -500) & ((min_speed < 100) | todo_nans_speed)
+
+    resultado = []
+    for mascara in (despegue, aterrizaje, ~despegue & ~aterrizaje):
+        df = flights[mascara[grupo]].copy()
+        if len(df):
+            df["runway"] = df["runway"].astype("category")
+            df["flight_id"] = df["flight_id"].astype("uint8")
         else:
-            dfs_raros.append(flight)
-    takeoffs = pd.DataFrame()
-    landings = pd.DataFrame()
-    raros = pd.DataFrame()
-    if dfs_takeoffs:
-        takeoffs = pd.concat(dfs_takeoffs)
-        takeoffs["runway"] = takeoffs["runway"].astype("category")
-        takeoffs["flight_id"] = takeoffs["flight_id"].astype("uint8")
-    if dfs_landings:
-        landings = pd.concat(dfs_landings)
-        landings["runway"] = landings["runway"].astype("category")
-        landings["flight_id"] = landings["flight_id"].astype("uint8")
-    if dfs_raros:
-        raros = pd.concat(dfs_raros)
-        raros["runway"] = raros["runway"].astype("category")
-        raros["flight_id"] = raros["flight_id"].astype("uint8")
-    
-    return takeoffs, landings, raros
+            df = pd.DataFrame()
+        resultado.append(df)
+    return tuple(resultado)
 
 def haversine(lat1, lon1, lat2, lon2, R=6371):
     φ1, λ1 = math.radians(lat1), math.radians(lon1)
@@ -152,93 +281,108 @@ def haversine_vectorized(lat1, lon1, lat2, lon2, R=6371):
     c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
     return (R * c) * 1000
 
-def adding_holding_points(df, holding_points_geojson_path, buffer_radius=0.0002):
-    holding_points = gpd.read_file(holding_points_geojson_path)
-
-    if 'id' not in holding_points.columns:
-        holding_points = holding_points.reset_index().rename(columns={'index': 'id'})
-
-    holding_buffers = holding_points.copy()
-    holding_buffers['buffered'] = holding_buffers.geometry.buffer(buffer_radius)
-    holding_buffers.set_geometry('buffered', inplace=True)
-    try:
-        geom = [Point(xy) for xy in zip(df['lon'], df['lat'])]
-    except:
-        print(df.columns)
-        print(df)
-    aircraft_gdf = gpd.GeoDataFrame(df, geometry=geom, crs="EPSG:4326")
-
-    joined = gpd.sjoin(
-        aircraft_gdf,
-        holding_buffers[['id', 'buffered']],
-        how='left',
-        predicate='within'
-    )
-    joined = joined.rename(columns={'id': 'holding_point_id'}).drop(columns=['index_right'])
-
-    result_df = joined.drop(columns=['geometry']).reset_index(drop=True)
+def adding_holding_points(df, holding_points_geojson_path, buffer_radius=HOLDING_BUFFER):
+    index = zone_index(holdings_path=holding_points_geojson_path, buffer_radius=buffer_radius)
+    result_df = df.copy()
+    result_df['holding_point_id'] = index.holding_of(df['lat'].to_numpy(), df['lon'].to_numpy())
     return result_df.reset_index(drop=True)
 
 def extend_takeoffs(takeoffs, icao):
-    dfs = []
-    for flight_id, flight in takeoffs.groupby("flight_id"):
-        idx_llegada_holding_point = flight["holding_point_id"].first_valid_index()
-        flight = flight.loc[idx_llegada_holding_point: ]
-
-        idx_comienzo_despegue = flight[flight["altitude"] > 1000].first_valid_index()
-        flight = flight.loc[:idx_comienzo_despegue]
-        flight["momento_despegue"] = True if idx_comienzo_despegue is not None else False
-        if idx_comienzo_despegue is None or not flight.iloc[-1]["esta_en_pista"]:
-            flight["pos_recalculada"] = True
-            with open('../json/runway_takeoffs_centers.json', 'r', encoding='utf-8') as f:
-                runway_grids = json.load(f)
-            rw = flight.iloc[0]["runway"]
-            lat_despegue = runway_grids[rw]["lat_despegue_onground"]
-            lon_despegue = runway_grids[rw]["lon_despegue_onground"]
-            flight["lat_despegue"] = lat_despegue
-            flight["lon_despegue"] = lon_despegue
-            dists = np.sqrt((flight["lat"].to_numpy() - lat_despegue) ** 2 + (flight["lon"].to_numpy() - lon_despegue) ** 2)
-            idx_nearest = np.argmin(dists)
-            closest_point = flight.iloc[idx_nearest]
-            flight["hora_despegue"] = closest_point["ts"]
-
-            flight["hora_despegue_mala"] = flight.iloc[-1]["ts"]
-            flight["lat_despegue_mala"] = flight.iloc[-1]["lat"]
-            flight["lon_despegue_mala"] = flight.iloc[-1]["lon"]
-
-        else:
-            flight["hora_despegue"] = flight.iloc[-1]["ts"]
-            lat_despegue = flight.iloc[-1]["lat"]
-            lon_despegue = flight.iloc[-1]["lon"]
-            flight["lat_despegue"] = lat_despegue
-            flight["lon_despegue"] = lon_despegue
-
-        if idx_llegada_holding_point is not None:
-            flight["llegada_punto_espera"] = flight.iloc[0]["ts"]
-            flight["lat_espera"] = flight.iloc[0]["lat"]
-            flight["lon_espera"] = flight.iloc[0]["lon"]
-            aux = flight[flight["holding_point_id"].notna()]
-            aux = aux[aux["speed"] == 0]
-            flight["para_en_espera"] = (len(aux)>0)
-            flight["tiempo_en_espera"] = (flight["ts"] - flight["llegada_punto_espera"]).dt.total_seconds()
-        else:
-            flight["tiempo_en_espera"] = 0
-        
-        flight["tiempo_hasta_despegue"] = (flight["hora_despegue"] - flight["ts"]).dt.total_seconds()
-        flight["distancia"] = flight.apply(
-            lambda row: haversine_vectorized(row["lat"], row["lon"], lat_despegue, lon_despegue), axis=1
-        )
-        dfs.append(flight)
-    return pd.concat(dfs)
-
-def process_icao(df_icao, icao):
-    if len(df_icao) < 500:
+    """Recorta cada despegue desde la llegada al punto de espera hasta el despegue y añade horas, tiempos y distancias.
+
+    Todos los vuelos a la vez en lugar de vuelo a vuelo: con las filas ordenadas por flight_id, los índices de
+    llegada y de despegue de cada vuelo son mínimos por grupo (np.minimum.reduceat).
+    """
+    df = takeoffs.sort_values("flight_id", kind='stable')
+    n = len(df)
+    fila = np.arange(n)
+    starts, grupo = flight_groups(df["flight_id"].to_numpy())
+    ends = np.r_[starts[1:], n]
+
+    # llegada al punto de espera (o inicio del vuelo) y primera fila por encima de 1000 pies desde ahí
+    primera_hp = np.minimum.reduceat(np.where(df["holding_point_id"].notna().to_numpy(), fila, n), starts)
+    con_hp = primera_hp < n
+    a = np.where(con_hp, primera_hp, starts)
+    alto = (df["altitude"].to_numpy(dtype=np.float64, na_value=np.nan) > 1000) & (fila >= a[grupo])
+    primera_alta = np.minimum.reduceat(np.where(alto, fila, n), starts)
+    despega = primera_alta < n
+    b = np.where(despega, primera_alta, ends - 1)
+    df = df[(fila >= a[grupo]) & (fila <= b[grupo])].copy()
+
+    # a partir de aquí cada vuelo son las filas [ks, ks + largo) del DataFrame recortado
+    largo = b - a + 1
+    ks = np.r_[0, np.cumsum(largo)[:-1]]
+    ultima = ks + largo - 1
+    grupo = np.repeat(np.arange(len(ks)), largo)
+    fila = np.arange(len(df))
+    ts = df["ts"].to_numpy()
+    lat = df["lat"].to_numpy(dtype=np.float64, na_value=np.nan)
+    lon = df["lon"].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    recalculada = ~despega | ~df["esta_en_pista"].to_numpy(dtype=bool)[ultima]
+    # despegue sin fila en pista: centro de despegue de la pista y hora de la posición más cercana
+    centros = pd.DataFrame(aeropuerto.get_aeropuerto().centers).T
+    rw = pd.Series(df["runway"].to_numpy(dtype=object)[ks][recalculada])
+    faltan = ~rw.isin(centros.index)
+    if faltan.any():
+        raise KeyError(rw[faltan].iloc[0])
+    lat_despegue, lon_despegue = lat[ultima].copy(), lon[ultima].copy()
+    lat_despegue[recalculada] = centros.loc[rw, "lat_despegue_onground"].to_numpy(dtype=np.float64)
+    lon_despegue[recalculada] = centros.loc[rw, "lon_despegue_onground"].to_numpy(dtype=np.float64)
+    dists = np.sqrt((lat - lat_despegue[grupo]) ** 2 + (lon - lon_despegue[grupo]) ** 2)
+    # np.argmin por vuelo: un NaN gana a cualquier distancia y en empate la primera fila
+    clave = np.where(np.isnan(dists), -np.inf, dists)
+    minimo = np.minimum.reduceat(clave, ks)
+    cercana = np.minimum.reduceat(np.where(clave == minimo[grupo], fila, len(df)), ks)
+    hora_despegue = np.where(recalculada, ts[cercana], ts[ultima])
+
+    espera = df["holding_point_id"].notna().to_numpy() & (df["speed"].to_numpy(dtype=np.float64, na_value=np.nan) == 0)
+    columnas = {
+        "momento_despegue":      despega[grupo],
+        "pos_recalculada":       np.ones(len(df), dtype=bool),
+        "lat_despegue":          lat_despegue[grupo],
+        "lon_despegue":          lon_despegue[grupo],
+        "hora_despegue":         hora_despegue[grupo],
+        "hora_despegue_mala":    ts[ultima][grupo],
+        "lat_despegue_mala":     lat[ultima][grupo],
+        "lon_despegue_mala":     lon[ultima][grupo],
+        "llegada_punto_espera":  ts[ks][grupo],
+        "lat_espera":            lat[ks][grupo],
+        "lon_espera":            lon[ks][grupo],
+        "para_en_espera":        np.logical_or.reduceat(espera, ks)[grupo],
+        "tiempo_en_espera":      (ts - ts[ks][grupo]) / np.timedelta64(1, 's'),
+        "sin_espera":            np.zeros(len(df), dtype=np.int64),
+        "tiempo_hasta_despegue": (hora_despegue[grupo] - ts) / np.timedelta64(1, 's'),
+        "distancia":             haversine_vectorized(lat, lon, lat_despegue[grupo], lon_despegue[grupo]),
+    }
+
+    # las columnas dependen del caso de cada vuelo: se montan por caso y se concatenan en el orden en que
+    # aparece cada caso, que da las mismas columnas y tipos que concatenar los vuelos uno a uno
+    caso = recalculada * 2 + con_hp
+    _, primeros = np.unique(caso, return_index=True)
+    bloques = []
+    for c in caso[np.sort(primeros)]:
+        filas = (caso == c)[grupo]
+        nombres = ["momento_despegue"]
+        nombres += (["pos_recalculada", "lat_despegue", "lon_despegue", "hora_despegue", "hora_despegue_mala",
+                     "lat_despegue_mala", "lon_despegue_mala"] if c // 2 else ["hora_despegue", "lat_despegue", "lon_despegue"])
+        nombres += ["llegada_punto_espera", "lat_espera", "lon_espera", "para_en_espera", "tiempo_en_espera"] if c % 2 else ["sin_espera"]
+        nombres += ["tiempo_hasta_despegue", "distancia"]
+        nuevas = pd.DataFrame({"tiempo_en_espera" if nombre == "sin_espera" else nombre: columnas[nombre][filas] for nombre in nombres},
+                              index=df.index[filas])
+        bloques.append(pd.concat([df[filas], nuevas], axis=1))
+    return pd.concat(bloques).loc[df.index]
+
+def process_icao(df_icao, icao, tiempos=None, checks=True):
+    # checks=False: read_day ya ha aplicado estos filtros sobre el día sin podar
+    if checks and len(df_icao) < MIN_MESSAGES:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     
-    if all(df_icao["altitude"] < 100):
+    if checks and all(df_icao["altitude"] < 100):
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     
-    df_icao_pos = add_position(df_icao)
+    with telemetria.medir(tiempos, 'add_position'):
+        df_icao_pos = add_position(df_icao)
     if df_icao_pos.empty:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     
@@ -246,7 +390,11 @@ def process_icao(df_icao, icao):
     df_icao_pos[['lat', 'lon']] = df_icao_pos[['lat', 'lon']].interpolate(method='time', limit_direction='both')
     df_icao_pos = df_icao_pos.reset_index()
 
-    bbox = { 'lon_min': -3.70, 'lon_max': -3.40, 'lat_min': 40.35, 'lat_max': 40.65}
+    return classify_positions(df_icao_pos, icao, tiempos)
+
+def classify_positions(df_icao_pos, icao, tiempos=None):
+    """Resto de process_icao una vez las posiciones están decodificadas e interpoladas."""
+    bbox = BBOX
     df_filtered = df_icao_pos[
         (df_icao_pos['lon'] >= bbox['lon_min']) & (df_icao_pos['lon'] <= bbox['lon_max']) &
         (df_icao_pos['lat'] >= bbox['lat_min']) & (df_icao_pos['lat'] <= bbox['lat_max'])
@@ -255,70 +403,336 @@ def process_icao(df_icao, icao):
     if len(df_filtered) == 0:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     
-    df_icao_runways = adding_runways(df_filtered, "../json/puntosespera/runways.geojson")
+    with telemetria.medir(tiempos, 'adding_runways'):
+        df_icao_runways = adding_runways(df_filtered, "../json/puntosespera/runways.geojson")
     if df_icao_runways["runway"].isna().sum() == len(df_icao_runways):
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
-    flights = separate_flights(df_icao_runways)
+    with telemetria.medir(tiempos, 'separate_flights'):
+        flights = separate_flights(df_icao_runways)
         
-    takeoffs, landings, raros =  filter_takeoffs(flights)
+    with telemetria.medir(tiempos, 'filter_takeoffs'):
+        takeoffs, landings, raros =  filter_takeoffs(flights)
     
     if len(takeoffs) != 0:
-        takeoffs_holdings = adding_holding_points(takeoffs, holding_points_geojson_path="../json/puntosespera/holding_points.geojson", buffer_radius=0.0002)  # ~20 metros)
-        takeoffs_extended = extend_takeoffs(takeoffs_holdings, icao)
+        with telemetria.medir(tiempos, 'adding_holding_points'):
+            takeoffs_holdings = adding_holding_points(takeoffs, holding_points_geojson_path="../json/puntosespera/holding_points.geojson", buffer_radius=HOLDING_BUFFER)
+        with telemetria.medir(tiempos, 'extend_takeoffs'):
+            takeoffs_extended = extend_takeoffs(takeoffs_holdings, icao)
         return takeoffs_extended, landings, raros
 
     return takeoffs, landings, raros
 
-def process_icao_parallel(icao_data_tuple):
+def process_icao_parallel(icao_data_tuple, checks=True):
     icao, df_icao = icao_data_tuple
+    start = time.perf_counter()
+    tiempos = {}
     try:
-        takeoffs, landings, raros = process_icao(df_icao, icao)
-        return takeoffs, landings, raros
+        takeoffs, landings, raros = process_icao(df_icao, icao, tiempos, checks)
     except Exception as e:
         print(f"Error al procesar ICAO {icao}: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        takeoffs, landings, raros = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    # tipos del registro antes de volver al padre por pickle
+    takeoffs, landings, raros = (esquema.aplicar(df) for df in (takeoffs, landings, raros))
+    stats = telemetria.task_stats(start, len(df_icao), len(takeoffs) + len(landings) + len(raros), tiempos, icao=icao)
+    return takeoffs, landings, raros, stats
     
-def process_day_parallel(day):
+def nearest_position(lo, hi, boundary, side):
+    """Última (side=-1) o primera (side=1) posición decodificada del ICAO [lo, hi) antes o después de la fila boundary.
+
+    Decodifica ventanas crecientes de la tabla compartida. boundary es siempre un hueco > SPLIT_GAP, así que
+    las filas junto a él se decodifican igual que con el ICAO completo; en el otro extremo de la ventana se
+    descartan CPR_TOLERANCE + 1 segundos, donde a add_position le pueden faltar parejas.
+    """
+    margen = pd.Timedelta(seconds=CPR_TOLERANCE + 1)
+    w = CONTEXT_ROWS
+    while True:
+        a, b = (max(lo, boundary - w), boundary) if side < 0 else (boundary, min(hi, boundary + w))
+        if a == b:
+            return None
+        ventana = tablaCompartida.rows(a, b)
+        pos = add_position(ventana)
+        if not pos.empty:
+            validas = pos[pos['lat'].notna()]
+            if side < 0:
+                if a > lo:
+                    validas = validas[validas['ts'] >= ventana['ts'].iloc[0] + margen]
+                if len(validas):
+                    return validas[['ts', 'lat', 'lon']].iloc[[-1]]
+            else:
+                if b < hi:
+                    validas = validas[validas['ts'] <= ventana['ts'].iloc[-1] - margen]
+                if len(validas):
+                    return validas[['ts', 'lat', 'lon']].iloc[[0]]
+        if (side < 0 and a == lo) or (side > 0 and b == hi):
+            return None
+        w *= 4
+
+def process_icao_segment(icao, start, stop, lo, hi, tiempos=None):
+    """process_icao de las filas [start, stop) de un ICAO [lo, hi) partido por split_icao.
+
+    Los filtros de ICAO completo (MIN_MESSAGES, altitud) ya los ha pasado el ICAO entero. Ni el emparejamiento
+    CPR ni separate_flights cruzan un hueco > SPLIT_GAP; la interpolación sí, así que se hace con la posición
+    más cercana de cada lado como contexto y el resultado es el mismo que con el ICAO completo.
+    """
+    df = tablaCompartida.rows(start, stop)
+    with telemetria.medir(tiempos, 'add_position'):
+        df_pos = add_position(df)
+        if df_pos.empty:
+            df_pos = df.assign(lat=np.nan, lon=np.nan)
+        contexto = []
+        if start > lo and pd.isna(df_pos['lat'].iloc[0]):
+            contexto.append(nearest_position(lo, hi, start, -1))
+        n_antes = sum(c is not None for c in contexto)
+        if stop < hi and pd.isna(df_pos['lat'].iloc[-1]):
+            contexto.append(nearest_position(lo, hi, stop, 1))
+        contexto = [c for c in contexto if c is not None]
+
+    coords = pd.concat(contexto[:n_antes] + [df_pos[['ts', 'lat', 'lon']]] + contexto[n_antes:], ignore_index=True)
+    coords = coords.set_index('ts').interpolate(method='time', limit_direction='both')
+    df_pos[['lat', 'lon']] = coords.iloc[n_antes:n_antes + len(df_pos)].to_numpy()
+
+    return classify_positions(df_pos, icao, tiempos)
+
+def split_icao(ts, start, stop, split_rows=SPLIT_ROWS, split_gap=SPLIT_GAP):
+    """Cortes de un ICAO grande [start, stop) en huecos de más de split_gap segundos.
+
+    Los tramos se agrupan de forma que cada subtarea tenga al menos split_rows // 4 filas.
+    """
+    t = ts[start:stop]
+    huecos = start + np.flatnonzero(np.diff(t) > np.timedelta64(split_gap, 's')) + 1
+    cortes = [start]
+    for hueco in huecos:
+        if hueco - cortes[-1] >= split_rows // 4 and stop - hueco >= split_rows // 4:
+            cortes.append(hueco)
+    cortes.append(stop)
+    return list(zip(cortes[:-1], cortes[1:]))
+
+def schedule_icaos(day, rangos, parts_dir, split_rows=SPLIT_ROWS):
+    """Tareas (icao, inicio, fin, dir de partes, inicio del ICAO, fin del ICAO) de mayor a menor.
+
+    Los ICAOs con más de split_rows filas (aviones con varias rotaciones en el día) se parten en subtareas
+    independientes para que no terminen los últimos con el resto del pool parado.
+    """
+    ts = day['ts'].to_numpy()
+    bajos = day['altitude'].to_numpy() < 100
+    tasks = []
+    for icao, lo, hi in rangos:
+        # con todas las altitudes < 100 process_icao lo descarta enseguida: no se parte
+        if hi - lo > split_rows and not bajos[lo:hi].all():
+            tasks.extend((icao, start, stop, parts_dir, lo, hi) for start, stop in split_icao(ts, lo, hi, split_rows))
+        else:
+            tasks.append((icao, lo, hi, parts_dir, lo, hi))
+    tasks.sort(key=lambda task: task[2] - task[1], reverse=True)
+    partidos = sum(1 for task in tasks if (task[1], task[2]) != (task[4], task[5]))
+    if partidos:
+        print(f"{partidos} subtareas de ICAOs con más de {split_rows} filas")
+    return tasks
+
+def process_icao_shared(task, checks=True):
+    """Worker con el día en memoria compartida: lee sus filas por rango y deja los resultados en partes Arrow."""
+    icao, start, stop, parts_dir, lo, hi = task
+    if (start, stop) == (lo, hi):
+        takeoffs, landings, raros, stats = process_icao_parallel((icao, tablaCompartida.rows(start, stop)), checks)
+    else:
+        t0 = time.perf_counter()
+        tiempos = {}
+        try:
+            takeoffs, landings, raros = process_icao_segment(icao, start, stop, lo, hi, tiempos)
+        except Exception as e:
+            print(f"Error al procesar ICAO {icao} (filas {start}-{stop}): {e}")
+            takeoffs, landings, raros = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        takeoffs, landings, raros = (esquema.aplicar(df) for df in (takeoffs, landings, raros))
+        stats = telemetria.task_stats(t0, stop - start, len(takeoffs) + len(landings) + len(raros), tiempos,
+                                      icao=icao, segmento=f"{start}-{stop}")
+    # vuelos del tramo, para renumerar flight_id al unir los tramos de un mismo ICAO
+    stats['inicio'] = start
+    stats['flights'] = int(max([df['flight_id'].astype(np.int64).max() for df in (takeoffs, landings, raros) if not df.empty], default=0))
+    partes = [tablaCompartida.write_part(df, parts_dir, f"{nombre}_{start:012d}")
+              for nombre, df in (("despegues", takeoffs), ("aterrizajes", landings), ("raros", raros))]
+    return partes[0], partes[1], partes[2], stats
+
+def stitch_parts(all_results, kind):
+    """Lee las partes de un tipo (0 despegues, 1 aterrizajes, 2 raros) en orden de fila.
+
+    A flight_id se le suman los vuelos de los tramos anteriores del mismo ICAO, de forma que un ICAO
+    partido por split_icao queda numerado igual que si se hubiese procesado entero.
+    """
+    vuelos = defaultdict(int)
+    dfs = []
+    for result in sorted(all_results, key=lambda result: result[3]['inicio']):
+        path, stats = result[kind], result[3]
+        offset = vuelos[stats['icao']]
+        vuelos[stats['icao']] += stats['flights']
+        if path is None:
+            continue
+        df = tablaCompartida.read_parts([path])
+        if offset:
+            # mismo desbordamiento que el astype("uint8") de filter_takeoffs con el ICAO completo
+            df['flight_id'] = ((df['flight_id'].astype(np.int64) + offset) % 256).astype('uint8')
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+
+def dedup_messages(day, window_s):
+    """Una copia de cada mensaje por ventana de window_s segundos contada desde su primera aparición.
+
+    Las ventanas son fijas: un mensaje que se repite más a menudo que window_s (un avión parado que repite su
+    posición en superficie) conserva una copia por ventana en lugar de encadenarse con su copia anterior.
+    """
+    msg_col = 'msg_hex' if 'msg_hex' in day.columns else 'msg'
+    codes, _ = pd.factorize(day[msg_col])
+    ts = day['ts']
+    desde_primera = ts - ts.groupby(codes).transform('min')
+    ventana = (desde_primera // pd.Timedelta(seconds=window_s)).to_numpy()
+    keep = ~pd.DataFrame({'code': codes, 'ventana': ventana}).duplicated().to_numpy()
+    return day[keep]
+
+def icao_filter(icaos, hex_icao):
+    return adsb_np.icao_to_hex(icaos).tolist() if hex_icao else icaos
+
+def read_day(path, metrics=None):
+    """Lee el día decodificado con la poda de PRUNE_DAY, antes de cualquier decodificación CPR.
+
+    Devuelve (día, checks): checks=False cuando los filtros de ICAO completo de process_icao (MIN_MESSAGES,
+    altitud) ya se han aplicado aquí sobre el día entero y no deben repetirse sobre las filas podadas.
+    """
+    if not PRUNE_DAY:
+        day = esquema.aplicar(pd.read_parquet(path))
+        if metrics is not None:
+            metrics.rows_in = len(day)
+        return day, True
+
+    msg_col = 'msg_hex' if 'msg_hex' in pq.read_schema(path).names else 'msg'
+
+    # los filtros de icao van con el tipo del fichero: uint32 o, en parquets anteriores a esquema, texto
+    hex_icao = not pa.types.is_integer(pq.read_schema(path).field('icao').type)
+
+    # 1. filtros de ICAO completo, sólo con las columnas icao y altitude
+    ligero = esquema.aplicar(pd.read_parquet(path, columns=['icao', 'altitude']))
+    total = len(ligero)
+    if metrics is not None:
+        metrics.rows_in = total
+    n = ligero.groupby('icao', observed=True).size()
+    todo_bajo = (ligero['altitude'] < 100).groupby(ligero['icao'], observed=True).all()
+    validos = n.index[(n >= MIN_MESSAGES) & ~todo_bajo.reindex(n.index)].tolist()
+    n_icaos = len(n)
+    del ligero
+
+    # 2. mensajes de posición en superficie o bajos cuyo CPR puede caer cerca del aeropuerto
+    marcas = pd.DataFrame(columns=['icao', 'ts'])
+    if validos:
+        pos = pd.read_parquet(path, columns=['icao', 'ts', 'tc', 'altitude', msg_col],
+                              filters=[('icao', 'in', icao_filter(validos, hex_icao)), ('tc', 'in', list(range(5, 19)))])
+        pos = esquema.aplicar(pos)
+        tc = pos['tc'].astype(np.int64).to_numpy()
+        candidatos = np.ones(len(pos), dtype=bool)
+        if PRUNE_ALTITUDE is not None:
+            candidatos = ((tc >= 5) & (tc <= 8)) | (pos['altitude'].to_numpy(dtype=np.float64, na_value=np.nan) <= PRUNE_ALTITUDE)
+        cerca = np.zeros(len(pos), dtype=bool)
+        if candidatos.any():
+            cerca[candidatos] = adsb_np.cpr_near(adsb_np.to_raw_array(pos.loc[candidatos, msg_col]),
+                                                 BBOX['lat_min'] - PRUNE_MARGIN, BBOX['lat_max'] + PRUNE_MARGIN,
+                                                 BBOX['lon_min'] - PRUNE_MARGIN, BBOX['lon_max'] + PRUNE_MARGIN)
+        marcas = pd.DataFrame({'icao': pos['icao'].to_numpy(dtype=np.int64)[cerca], 'ts': pos['ts'].to_numpy()[cerca]})
+        del pos
+    icaos = marcas['icao'].unique().tolist()
+
+    # 3. sólo los ICAOs y tipos necesarios (row groups descartados por sus estadísticas) y las filas cercanas
+    if not icaos:
+        day = esquema.aplicar(pq.read_schema(path).empty_table().to_pandas())
+    else:
+        filtros = [('icao', 'in', icao_filter(icaos, hex_icao))]
+        if TIPOS_NECESARIOS is not None:
+            filtros.append(('tc', 'in', TIPOS_NECESARIOS))
+        day = esquema.aplicar(pd.read_parquet(path, filters=filtros))
+    if PRUNE_WINDOW is not None and len(day):
+        filas = pd.DataFrame({'ts': day['ts'].to_numpy(), 'icao': day['icao'].to_numpy(dtype=np.int64),
+                              'fila': np.arange(len(day))}).sort_values('ts', kind='stable')
+        marcas = marcas.rename(columns={'ts': 'ts_marca'}).sort_values('ts_marca', kind='stable')
+        cruce = pd.merge_asof(filas, marcas, left_on='ts', right_on='ts_marca', by='icao',
+                              direction='nearest', tolerance=pd.Timedelta(seconds=PRUNE_WINDOW))
+        day = day.iloc[np.sort(cruce.loc[cruce['ts_marca'].notna(), 'fila'].to_numpy())].reset_index(drop=True)
+
+    print(f"✂️ Poda: {len(day)} de {total} mensajes, {len(icaos)} de {n_icaos} ICAOs")
+    return day, False
+
+def process_day_parallel(day, dedup_window=DEDUP_WINDOW, processes=None, metrics=None, checks=True):
     print("\nInicio del procesamiento paralelo...")
     
-    day.sort_values("ts", inplace=True)
+    # estable: el orden de los mensajes con el mismo ts no depende de la poda ni del orden del parquet
+    day.sort_values("ts", inplace=True, kind='stable')
 
-    print("Agrupando datos por ICAO...")
-    icao_groups = [(icao, df_icao) for icao, df_icao in day.groupby("icao", observed=True)]
-    print(f"Encontrados {len(icao_groups)} ICAOs para procesar.")
+    if dedup_window is not None:
+        total = len(day)
+        day = dedup_messages(day, dedup_window)
+        print(f"Eliminados {total - len(day)} mensajes duplicados (ventana de {dedup_window}s).")
+
+    # la rejilla de zonas se construye (si falta) antes del pool; los workers sólo la abren con mmap
+    zone_index()
 
-    num_cores = os.cpu_count()
+    print("Agrupando datos por ICAO...")
+    if SHARED_DAY:
+        day, rangos = tablaCompartida.row_ranges(day, "icao")
+        tabla = tablaCompartida.TablaCompartida(day)
+        parts_dir = tempfile.mkdtemp(prefix="filtrado_partes_")
+        tasks = schedule_icaos(day, rangos, parts_dir, SPLIT_ROWS)
+        n_icaos = len(rangos)
+        del day
+        worker = partial(process_icao_shared, checks=checks)
+        pool_kwargs = {'initializer': tablaCompartida.attach, 'initargs': (tabla.name,)}
+        print(f"Día en memoria compartida: {tabla.nbytes / 1024 ** 2:.1f} MB")
+    else:
+        tasks = [(icao, df_icao) for icao, df_icao in day.groupby("icao", observed=True)]
+        tasks.sort(key=lambda task: len(task[1]), reverse=True)
+        n_icaos = len(tasks)
+        worker = partial(process_icao_parallel, checks=checks)
+        pool_kwargs = {}
+    print(f"Encontrados {n_icaos} ICAOs para procesar.")
+
+    num_cores = processes or os.cpu_count()
     print(f"Usando {num_cores} núcleos para el procesamiento paralelo.")
 
     all_results = []
     processed_count = 0
-    total_icaos = len(icao_groups)
-
-    with mp.Pool(processes=num_cores) as pool:
-        results_iterator = pool.imap_unordered(process_icao_parallel, icao_groups)
-        print(f"Procesados {processed_count}/{total_icaos} ICAOs...", flush=True)
-        for result_tuple in results_iterator:
-            all_results.append(result_tuple)
-            processed_count += 1
-            if processed_count % 50 == 0 or processed_count == total_icaos:
-                 print(f"{processed_count}", end=" - ", flush=True)
-    print("\nTodos los ICAOs procesados.")
-
-    dfs_takeoffs, dfs_landings, dfs_raros = [], [], []
-    for takeoffs, landings, raros in all_results:
-         if takeoffs is not None and not takeoffs.empty:
-            dfs_takeoffs.append(takeoffs)
-         if landings is not None and not landings.empty:
-            dfs_landings.append(landings)
-         if raros is not None and not raros.empty:
-            dfs_raros.append(raros)
-
-    print("Concatenando resultados...")
-
-    final_takeoffs = pd.concat(dfs_takeoffs, ignore_index=True) if dfs_takeoffs else pd.DataFrame()
-    final_landings = pd.concat(dfs_landings, ignore_index=True) if dfs_landings else pd.DataFrame()
-    final_raros = pd.concat(dfs_raros, ignore_index=True) if dfs_raros else pd.DataFrame()
+    total_icaos = len(tasks)
+
+    try:
+        with mp.Pool(processes=num_cores, **pool_kwargs) as pool:
+            results_iterator = pool.imap_unordered(worker, tasks)
+            print(f"Procesados {processed_count}/{total_icaos} ICAOs...", flush=True)
+            for result_tuple in results_iterator:
+                all_results.append(result_tuple)
+                processed_count += 1
+                if processed_count % 50 == 0 or processed_count == total_icaos:
+                     print(f"{processed_count}", end=" - ", flush=True)
+        print("\nTodos los ICAOs procesados.")
+
+        if metrics is not None:
+            metrics.add_tasks([result_tuple[3] for result_tuple in all_results])
+
+        print("Concatenando resultados...")
+
+        if SHARED_DAY:
+            # en orden de fila: ICAO a ICAO y, dentro de cada uno, tramo a tramo
+            final_takeoffs = stitch_parts(all_results, 0)
+            final_landings = stitch_parts(all_results, 1)
+            final_raros = stitch_parts(all_results, 2)
+        else:
+            dfs_takeoffs, dfs_landings, dfs_raros = [], [], []
+            for takeoffs, landings, raros, _ in all_results:
+                 if takeoffs is not None and not takeoffs.empty:
+                    dfs_takeoffs.append(takeoffs)
+                 if landings is not None and not landings.empty:
+                    dfs_landings.append(landings)
+                 if raros is not None and not raros.empty:
+                    dfs_raros.append(raros)
+            final_takeoffs = pd.concat(dfs_takeoffs, ignore_index=True) if dfs_takeoffs else pd.DataFrame()
+            final_landings = pd.concat(dfs_landings, ignore_index=True) if dfs_landings else pd.DataFrame()
+            final_raros = pd.concat(dfs_raros, ignore_index=True) if dfs_raros else pd.DataFrame()
+    finally:
+        if SHARED_DAY:
+            tabla.close()
+            shutil.rmtree(parts_dir, ignore_errors=True)
 
     if not final_takeoffs.empty:
         final_takeoffs = final_takeoffs.drop(["tc", "oe_flag"], axis=1, errors='ignore')
@@ -331,20 +745,28 @@ def process_day_parallel(day):
     print("Procesamiento paralelo del día completado.")
     return final_takeoffs, final_landings, final_raros
 
-def process_data(input_dir, out_dir_despegues, out_dir_aterrizajes, out_dir_raros):
+def process_data(input_dir, out_dir_despegues, out_dir_aterrizajes, out_dir_raros, processes=None):
     print(f"\n🚀 Procesando {input_dir}")
+    metrics = telemetria.Telemetria("filtrado", input_dir)
     try:
-        df = pd.read_parquet(input_dir)
-        result = process_day_parallel(df)
-        result[0].to_parquet(out_dir_despegues, engine="pyarrow", compression="snappy", index=False)
-        result[1].to_parquet(out_dir_aterrizajes, engine="pyarrow", compression="snappy", index=False)
-        result[2].to_parquet(out_dir_raros, engine="pyarrow", compression="snappy", index=False)
+        with metrics.medir('read_parquet'):
+            df, checks = read_day(input_dir, metrics)
+        with metrics.medir('process_day_parallel'):
+            result = process_day_parallel(df, processes=processes, metrics=metrics, checks=checks)
+        with metrics.medir('write_parquet'):
+            adsb_np.write_parquet(result[0], out_dir_despegues, engine="pyarrow", compression="snappy", index=False)
+            adsb_np.write_parquet(result[1], out_dir_aterrizajes, engine="pyarrow", compression="snappy", index=False)
+            adsb_np.write_parquet(result[2], out_dir_raros, engine="pyarrow", compression="snappy", index=False)
+        metrics.rows_out = sum(len(r) for r in result)
         print(f"💾 Guardado: {out_dir_despegues}")
+        metrics.write(out_dir_despegues)
+        return True
 
     except FileNotFoundError:
         print(f"❌ Archivo no encontrado: {input_dir}")
     except Exception as e:
         print(f"⚠️ Error procesando {input_dir}: {e}")
+    return False
 
 def main():
     path_base = "D:/data/decodificado"
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Ficheros de código (y datos estáticos) de los que depende cada etapa
+CODE_FILES = {
+    "decodificacion":   ["decodificacion.py", "adsbVectorizado.py", "esquema.py", "estela.py"],
+    "estela":           ["estela.py"],
+    "filtrado":         ["filtrado.py", "adsbVectorizado.py", "aeropuerto.py", "tablaCompartida.py", "esquema.py",
+                         "../json/puntosespera/runways.geojson",
+                         "../json/puntosespera/holding_points.geojson", "../json/runway_takeoffs_centers.json"],
+    "puntosEspera":     ["puntosEspera.py", "adsbVectorizado.py", "esquema.py", "estela.py"],
+    "despeguesPrevios": ["despeguesPrevios.py", "adsbVectorizado.py", "ventanas.py", "estela.py", "../json/runway_takeoffs_centers.json"],
+}
+
+# Constantes de cada módulo que cambian el resultado (no las que sólo afectan al rendimiento)
+PARAMS = {
+    "decodificacion":   ["BINARY_MSG", "SORT_BY_ICAO"],
+    "estela":           [],
+    "filtrado":         ["LAT", "LON", "BBOX", "CPR_TOLERANCE", "FLIGHT_GAP", "HOLDING_BUFFER", "MIN_MESSAGES", "DEDUP_WINDOW",
+                         "PRUNE_DAY", "PRUNE_ALTITUDE", "PRUNE_WINDOW", "PRUNE_MARGIN", "TIPOS_NECESARIOS", "CPR_MODE"],
+    "puntosEspera":     [],
+    "despeguesPrevios": ["MINUTOS_PREVIOS", "VENTANAS"],
+}
+
+HASH_BLOCK = 1024 * 1024
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def sha256_json(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+def stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def code_version(stage):
+    h = hashlib.sha256()
+    for name in CODE_FILES[stage]:
+        path = os.path.join(HERE, name)
+        h.update(name.encode())
+        h.update(sha256_file(path).encode() if os.path.exists(path) else b'-')
+    return h.hexdigest()
+
+def stage_params(stage):
+    module = __import__(stage)
+    return {name: getattr(module, name, None) for name in PARAMS[stage]}
+
+class Manifest:
+    """Registro JSON de cada salida: huellas de sus entradas, versión del código, parámetros y estado."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"outputs": {}, "files": {}}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def fingerprint(self, path):
+        """Hash del contenido del fichero, recalculado sólo si cambian tamaño o fecha de modificación."""
+        if not os.path.exists(path):
+            return None
+        if os.path.isdir(path):
+            # días en bruto: miles de CSV por hora, se identifican por nombre, tamaño y fecha
+            listing = []
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    listing.append([os.path.relpath(full, path)] + stat_key(full))
+            return sha256_json(sorted(listing))
+        key = stat_key(path)
+        with self.lock:
+            cached = self.data["files"].get(path)
+        if cached is not None and cached["stat"] == key:
+            return cached["sha256"]
+        digest = sha256_file(path)
+        with self.lock:
+            self.data["files"][path] = {"stat": key, "sha256": digest}
+        return digest
+
+    def signature(self, task):
+        return {
+            "inputs": {path: self.fingerprint(path) for path in task.inputs},
+            "code":   code_version(task.stage),
+            "params": stage_params(task.stage),
+        }
+
+    def up_to_date(self, task):
+        signature = self.signature(task)
+        key = sha256_json(signature)
+        with self.lock:
+            entries = [self.data["outputs"].get(out) for out in task.outputs]
+        for out, entry in zip(task.outputs, entries):
+            if entry is None or entry.get("status") != "ok" or entry.get("key") != key:
+                return False
+            if not os.path.exists(out) or stat_key(out) != entry.get("stat"):
+                return False
+        return True
+
+    def record(self, task, ok, seconds, error=None):
+        signature = self.signature(task)
+        key = sha256_json(signature)
+        with self.lock:
+            for out in task.outputs:
+                entry = {
+                    "task": task.name,
+                    "stage": task.stage,
+                    "status": "ok" if ok else "fallida",
+                    "key": key,
+                    "inputs": signature["inputs"],
+                    "code": signature["code"],
+                    "params": signature["params"],
+                    "seconds": round(seconds, 3),
+                    "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+                }
+                if ok:
+                    entry["stat"] = stat_key(out)
+                if error is not None:
+                    entry["error"] = str(error)
+                self.data["outputs"][out] = entry
+            self.save()
+        if ok:
+            for out in task.outputs:
+                self.fingerprint(out)
+            with self.lock:
+                self.save()
+
+    def failed(self):
+        """Tareas cuya última ejecución falló, para reintentarlas con pipeline.run_pipeline(solo=...)."""
+        with self.lock:
+            return sorted({entry["task"] for entry in self.data["outputs"].values() if entry.get("status") == "fallida"})
@@ -0,0 +1,278 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from manifest import Manifest
+
+AÑOS    = ["2024", "2025"]
+MESES   = ["1", "11", "12"]
+SEMANAS = [["1", "8"], ["8", "15"], ["15", "22"], ["22", "29"], ["29", "32"]]
+ETAPAS  = ["decodificacion", "estela", "filtrado", "puntosEspera", "despeguesPrevios"]
+
+RAW_BASE        = "D:/"
+DECODIFICADO    = "D:/data/decodificado"
+DESPEGUES       = "D:/data/filtrado/despegues"
+ATERRIZAJES     = "D:/data/filtrado/aterrizajes"
+RAROS           = "D:/data/filtrado/raros"
+EN_ESPERA       = "D:/data/enEspera"
+PROCESSED       = "D:/data/processed"
+MANIFEST        = "D:/data/manifest.json"
+# registro ICAO -> estela (estela.REGISTRO): suma de las partes por día que deja decodificacion (estela.PARTES).
+# Lo escribe una única tarea "estela" que depende de todas las decodificaciones del DAG, y puntosEspera y
+# despeguesPrevios dependen de ella: leen siempre el registro de todo el periodo, sin importar el orden de los hilos
+ESTELA          = "D:/data/estela/registro.parquet"
+ESTELA_DIAS     = "D:/data/estela/dias"
+
+# Núcleos compartidos por todas las etapas; las etapas con pool propio reciben CPUS_POR_POOL de ellos,
+# de forma que la decodificación del día N+1 puede solaparse con el filtrado del día N
+CPU_BUDGET    = os.cpu_count()
+CPUS_POR_POOL = max(1, CPU_BUDGET // 2)
+
+class Task:
+    def __init__(self, name, stage, run, inputs, outputs, cpus=1, order=0):
+        self.name = name
+        self.stage = stage
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cpus = cpus
+        self.order = order
+        self.deps = set()
+        self.status = "pendiente"
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f"Task({self.name}, {self.status})"
+
+# ---------------------------------------------------------------- tareas por etapa
+
+def decodificacion_task(a, m, day, order):
+    import decodificacion
+    path_dia = decodificacion.find_day_source(os.path.join(RAW_BASE, a, f"{int(m):02d}", f"{day:02d}"))
+    if path_dia is None:
+        return None
+    import estela
+    out = os.path.join(DECODIFICADO, a, m, f"{day}.parquet")
+    outs = [out, estela.parte(path_dia, ESTELA_DIAS)] if decodificacion.REGISTRO_ESTELA else [out]
+    def run(processes):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        return decodificacion.process_data(path_dia, out, decodificacion.BINARY_MSG, decodificacion.STREAMING, processes=processes)
+    return Task(f"decodificacion {a}/{m}/{day}", "decodificacion", run, [path_dia], outs, CPUS_POR_POOL, order)
+
+def estela_task(partes, order):
+    # las partes ya en disco (días fuera de este DAG) también suman; el registro se escribe con el mismo contenido
+    # si ninguna parte cambia, así que el manifiesto no invalida puntosEspera ni despeguesPrevios por redecodificar
+    en_disco = [os.path.join(ESTELA_DIAS, f) for f in os.listdir(ESTELA_DIAS) if f.endswith(".parquet")] if os.path.isdir(ESTELA_DIAS) else []
+    def run(processes):
+        import estela
+        n = estela.consolidar(ESTELA_DIAS, ESTELA)
+        print(f"🌀 Registro de estela: {n} ICAOs en {ESTELA}")
+        return True
+    return Task("estela", "estela", run, sorted(set(partes) | set(en_disco)), [ESTELA], 1, order)
+
+def filtrado_task(a, m, day, order):
+    src = os.path.join(DECODIFICADO, a, m, f"{day}.parquet")
+    outs = [os.path.join(base, a, m, f"{day}.parquet") for base in (DESPEGUES, ATERRIZAJES, RAROS)]
+    def run(processes):
+        import filtrado
+        for out in outs:
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+        return filtrado.process_data(src, *outs, processes=processes)
+    return Task(f"filtrado {a}/{m}/{day}", "filtrado", run, [src], outs, CPUS_POR_POOL, order)
+
+def puntos_espera_task(a, m, init, end, order):
+    srcs = [os.path.join(DESPEGUES, a, m, f"{day}.parquet") for day in range(int(init), int(end))]
+    out_dir = os.path.join(EN_ESPERA, a, m)
+    def run(processes):
+        import puntosEspera
+        os.makedirs(out_dir, exist_ok=True)
+        return puntosEspera.process_data(os.path.join(DESPEGUES, a, m), out_dir, int(init), int(end))
+    return Task(f"puntosEspera {a}/{m}/{init}_{end}", "puntosEspera", run, srcs + [ESTELA],
+                [os.path.join(out_dir, f"{init}_{end}.parquet")], 1, order)
+
+def despegues_previos_task(a, m, init, end, order):
+    src = os.path.join(EN_ESPERA, a, m, f"{init}_{end}.parquet")
+    out = os.path.join(PROCESSED, a, m, f"{init}_{end}.parquet")
+    # process_flight consulta los despegues filtrados de cada día de la semana
+    dias = [os.path.join(DESPEGUES, a, m, f"{day}.parquet") for day in range(int(init), int(end))]
+    def run(processes):
+        import despeguesPrevios
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        return despeguesPrevios.process_week(src, out, processes=processes)
+    return Task(f"despeguesPrevios {a}/{m}/{init}_{end}", "despeguesPrevios", run, [src] + dias + [ESTELA], [out], CPUS_POR_POOL, order)
+
+def build_dag(etapas=ETAPAS, años=AÑOS, meses=MESES, semanas=SEMANAS):
+    """Crea las tareas de las etapas pedidas y enlaza cada una con las que producen sus entradas."""
+    tasks = []
+    order = 0
+    for a in años:
+        for m in meses:
+            for (init, end) in semanas:
+                for day in range(int(init), int(end)):
+                    # el orden prioriza terminar los días antiguos antes de empezar los nuevos
+                    order += 1
+                    if "decodificacion" in etapas:
+                        task = decodificacion_task(a, m, day, order)
+                        if task is not None:
+                            tasks.append(task)
+                    if "filtrado" in etapas:
+                        tasks.append(filtrado_task(a, m, day, order))
+                if "puntosEspera" in etapas:
+                    tasks.append(puntos_espera_task(a, m, init, end, order))
+                if "despeguesPrevios" in etapas:
+                    tasks.append(despegues_previos_task(a, m, init, end, order))
+    if "estela" in etapas:
+        partes = [path for task in tasks if task.stage == "decodificacion" for path in task.outputs[1:]]
+        tasks.append(estela_task(partes, order + 1))
+
+    producers = {out: task for task in tasks for out in task.outputs}
+    for task in tasks:
+        task.deps = {producers[path] for path in task.inputs if path in producers}
+
+    # sin productor ni fichero en disco la tarea no tiene nada que procesar
+    vivas = set()
+    for task in tasks:
+        if task.deps or any(os.path.exists(path) for path in task.inputs):
+            vivas.add(task)
+    cambio = True
+    while cambio:
+        cambio = False
+        for task in list(vivas):
+            if task.deps and not (task.deps & vivas) and not any(os.path.exists(path) for path in task.inputs):
+                vivas.discard(task)
+                cambio = True
+    tasks = [task for task in tasks if task in vivas]
+    for task in tasks:
+        task.deps &= vivas
+    return tasks
+
+# ---------------------------------------------------------------- planificador
+
+HECHAS = ("ok", "al día")
+
+def run_dag(tasks, cpu_budget=CPU_BUDGET, manifest=None):
+    """Ejecuta las tareas en hilos en cuanto sus dependencias terminan, sin superar cpu_budget núcleos.
+    Con manifest, las tareas cuyas salidas ya corresponden a sus entradas, código y parámetros se saltan; la
+    comprobación la hace el hilo de cada tarea, así que una tarea al día también ocupa sus núcleos mientras tanto."""
+    lock = threading.Condition()
+    libres = cpu_budget
+    pendientes = sorted(tasks, key=lambda task: (task.order, ETAPAS.index(task.stage)))
+    en_marcha = set()
+
+    def worker(task, cpus):
+        nonlocal libres
+        # la primera comprobación de un fichero lo hashea entero: fuera del lock del planificador
+        if manifest is not None:
+            try:
+                al_dia = manifest.up_to_date(task)
+            except Exception as e:
+                print(f"⚠️ No se pudo consultar el manifiesto para {task.name}: {e}")
+                al_dia = False
+            if al_dia:
+                with lock:
+                    task.status = "al día"
+                    libres += cpus
+                    en_marcha.discard(task)
+                    lock.notify_all()
+                return
+        start = time.time()
+        error = None
+        try:
+            ok = task.run(cpus)
+            if ok is False:
+                error = "process_data devolvió False (ver el log de la etapa)"
+            elif not all(os.path.exists(path) for path in task.outputs):
+                ok, error = False, "faltan salidas"
+        except Exception as e:
+            print(f"⚠️ Error en {task.name}: {e}")
+            ok, error = False, e
+        ok = error is None
+        if manifest is not None:
+            try:
+                manifest.record(task, ok, time.time() - start, error)
+            except Exception as e:
+                print(f"⚠️ No se pudo actualizar el manifiesto para {task.name}: {e}")
+        with lock:
+            task.seconds = time.time() - start
+            task.status = "ok" if ok else "fallida"
+            libres += cpus
+            print(f"{'✅' if ok else '❌'} {task.name} ({task.seconds:.1f}s)", flush=True)
+            en_marcha.discard(task)
+            lock.notify_all()
+
+    start_total = time.time()
+    with lock:
+        while pendientes or en_marcha:
+            lanzada = False
+            for task in list(pendientes):
+                if any(dep.status in ("fallida", "omitida") for dep in task.deps):
+                    task.status = "omitida"
+                    pendientes.remove(task)
+                    lanzada = True
+                    continue
+                if any(dep.status not in HECHAS for dep in task.deps):
+                    continue
+                cpus = min(task.cpus, cpu_budget)
+                if cpus > libres:
+                    continue
+                libres -= cpus
+                task.status = "en marcha"
+                pendientes.remove(task)
+                en_marcha.add(task)
+                print(f"▶️ {task.name} ({cpus} núcleos, {libres} libres)", flush=True)
+                threading.Thread(target=worker, args=(task, cpus), daemon=True).start()
+                lanzada = True
+            if not lanzada:
+                lock.wait()
+
+    report(tasks, time.time() - start_total)
+    return tasks
+
+def report(tasks, total):
+    por_etapa = defaultdict(float)
+    estados = defaultdict(int)
+    for task in tasks:
+        por_etapa[task.stage] += task.seconds
+        estados[task.status] += 1
+    print("\n📊 RESUMEN DEL PIPELINE:")
+    for etapa in ETAPAS:
+        if etapa in por_etapa:
+            print(f"   {etapa:<17} {por_etapa[etapa]:>10.2f}s acumulados")
+    print(f"   Tareas: {dict(estados)}")
+    print(f"   Tiempo real total: {total:.2f}s")
+    fallidas = [task.name for task in tasks if task.status in ("fallida", "omitida")]
+    if fallidas:
+        print("❌ Tareas fallidas u omitidas:", *fallidas, sep="\n   ")
+
+def run_pipeline(etapas=ETAPAS, cpu_budget=CPU_BUDGET, solo=None, forzar=False, manifest_path=MANIFEST):
+    """solo: nombres de tarea a ejecutar (p. ej. reintentar_fallidas); forzar: ignora el manifiesto."""
+    tasks = build_dag(etapas)
+    if solo is not None:
+        solo = set(solo)
+        tasks = [task for task in tasks if task.name in solo]
+        for task in tasks:
+            task.deps &= set(tasks)
+    manifest = Manifest(manifest_path)
+    print(f"🗂️ {len(tasks)} tareas de {', '.join(etapas)} con {cpu_budget} núcleos")
+    if forzar:
+        # se vuelve a calcular todo, pero el manifiesto se sigue actualizando
+        return run_dag(tasks, cpu_budget, ForzarManifest(manifest))
+    return run_dag(tasks, cpu_budget, manifest)
+
+class ForzarManifest:
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def up_to_date(self, task):
+        return False
+
+    def record(self, *args):
+        return self.manifest.record(*args)
+
+def reintentar_fallidas(manifest_path=MANIFEST, cpu_budget=CPU_BUDGET):
+    fallidas = Manifest(manifest_path).failed()
+    print(f"🔁 Reintentando {len(fallidas)} tareas fallidas")
+    return run_pipeline(ETAPAS, cpu_budget, solo=fallidas, manifest_path=manifest_path)
+
+if __name__ == "__main__":
+    run_pipeline()
@@ -1,13 +1,18 @@
 import os
 import pandas as pd
 import pyModeS as pms
+import adsbVectorizado as adsb_np
+import esquema
+import estela
+import telemetria
 import warnings
 
 warnings.filterwarnings("ignore")
 
 def get_info_extra(msg_hex):
-    info_extra = { 'wind_speed': None, 'wind_dir': None, 'wake_vortex': None, 'temp': None, 'wind_shear': None }
-    functions = { 'wake_vortex': pms.bds.bds45.wv45, 'temp': pms.bds.bds45.temp45, 'wind_shear': pms.bds.bds45.ws45 }
+    # wake_vortex no depende del mensaje sino del avión: sale de estela.registro() por icao
+    info_extra = { 'wind_speed': None, 'wind_dir': None, 'temp': None, 'wind_shear': None }
+    functions = { 'temp': pms.bds.bds45.temp45, 'wind_shear': pms.bds.bds45.ws45 }
     try:
         wind_speed, wind_dir = pms.bds.bds44.wind44(msg_hex)
         info_extra.update({'wind_speed': wind_speed, 'wind_dir': wind_dir})
@@ -22,15 +27,14 @@ def get_info_extra(msg_hex):
     return info_extra
 
 def transform_df(df):
-    df['ts'] = pd.to_datetime(df['ts'])
+    # ts, icao, flight_id y banderas con los tipos del registro de esquema
+    df = esquema.aplicar(df)
     
     df['month']       = df['ts'].dt.month.astype("category")
     df['day_of_week'] = df['ts'].dt.dayofweek.astype('category')
     df['day']         = df['ts'].dt.day.astype("uint8")
     df['hour']         = (df['ts'].dt.hour + (df['ts'].dt.minute / 60)).astype("float16")
     
-    df['icao']             = df['icao'].astype('category')
-    df['flight_id']        = df['flight_id'].astype('uint8')
     df['holding_point_id'] = df['holding_point_id'].astype('category')
     df['runway']           = df['runway'].astype('category')
     df['wake_vortex']      = df['wake_vortex'].astype('category')
@@ -46,25 +50,38 @@ def process_day(day):
     filtered_day = day[day["holding_point_id"].notna() & (day["speed"] == 0)].copy()
     if filtered_day.empty:
         return pd.DataFrame()
-    info_extra_results = filtered_day["msg_hex"].apply(get_info_extra)
-    for col in ['wind_speed', 'wind_dir', 'wake_vortex', 'temp', 'wind_shear']:
+    info_extra_results = adsb_np.get_msg_hex(filtered_day).apply(get_info_extra)
+    for col in ['wind_speed', 'wind_dir', 'temp', 'wind_shear']:
         filtered_day[col] = info_extra_results.apply(lambda x: x[col])
+    icao = esquema.aplicar(filtered_day[['icao']].copy())['icao']
+    filtered_day.insert(filtered_day.columns.get_loc('wind_dir') + 1, 'wake_vortex', estela.registro().lookup(icao).to_numpy())
     return filtered_day
 
 def process_data(raw_dir, out_dir, init, end):
+    metrics = telemetria.Telemetria("puntosEspera", f"{raw_dir} {init}_{end}")
     dfs = []
     for day in range(init, end):
         file_path = os.path.join(raw_dir, str(f"{day}.parquet"))
         if os.path.exists(file_path):
             print(f"\n🚀 Procesando {file_path}")
-            df = pd.read_parquet(file_path)
-            dfs.append(process_day(df))
+            with metrics.medir('read_parquet'):
+                df = pd.read_parquet(file_path)
+            metrics.rows_in += len(df)
+            with metrics.medir('process_day'):
+                dfs.append(process_day(df))
     if dfs:
-        result = pd.concat(dfs)
-        result = transform_df(result)
-        result.to_parquet(os.path.join(out_dir, f"{init}_{end}.parquet"))
+        with metrics.medir('transform_df'):
+            result = pd.concat(dfs)
+            result = transform_df(result)
+        out_path = os.path.join(out_dir, f"{init}_{end}.parquet")
+        with metrics.medir('write_parquet'):
+            adsb_np.write_parquet(result, out_path)
+        metrics.rows_out = len(result)
+        metrics.write(out_path)
+        return True
     else:
         print("vacio")
+        return False
 
 def main():
     path_base = "D:/data/filtrado/despegues"
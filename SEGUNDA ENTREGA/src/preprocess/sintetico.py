@@ -0,0 +1,257 @@
+import os
+import base64
+import numpy as np
+import pandas as pd
+import shapely
+import adsbVectorizado as adsb_np
+import aeropuerto
+
+# Día sintético tipo Barajas en el mismo formato que los CSV en bruto (carpetas por hora con ts_kafka;message),
+# para medir las etapas sin los datos de D:/. Aviones con rotaciones aterrizaje (aproximación, rodaje de
+# salida) y despegue (rodaje hasta un punto de espera de holding_points.geojson, espera parado, entrada a pista
+# y ascenso) sobre las pistas de runways.geojson, más sobrevuelos en crucero y ruido disperso
+SALIDA = "D:/data/sintetico"
+DIA    = pd.Timestamp("2024-12-01")
+
+ICAO_ROTACIONES = 0x340000
+ICAO_SOBREVUELO = 0x4A0000
+ICAO_RUIDO      = 0x500000
+
+# ------------------------------------------------------------------ codificación
+
+def cpr_encode(lat, lon, odd, surface):
+    """Codificación CPR de 17 bits (en vuelo o en superficie), inversa de adsb_np.position_with_ref."""
+    span = 90.0 if surface else 360.0
+    dlat = span / (60 - odd)
+    yz = np.floor(2**17 * np.mod(lat, dlat) / dlat + 0.5)
+    rlat = dlat * (yz / 2**17 + np.floor(lat / dlat))
+    nl = adsb_np.cpr_nl(rlat)
+    dlon = span / np.maximum(nl - odd, 1)
+    xz = np.floor(2**17 * np.mod(lon, dlon) / dlon + 0.5)
+    return yz.astype(np.int64) & 0x1FFFF, xz.astype(np.int64) & 0x1FFFF
+
+def movement_code(kts):
+    """Campo movement de superficie (TC 5-8) para velocidades en nudos."""
+    kts = np.asarray(kts, dtype=np.float64)
+    i = np.clip(np.searchsorted(adsb_np._KTS_LB, kts, side='right') - 1, 0, 5)
+    mov = adsb_np._MOV_LB[i] + np.floor((kts - adsb_np._KTS_LB[i]) / adsb_np._KTS_PASO[i])
+    return np.where(kts < 0.125, 1, np.minimum(mov, 123)).astype(np.int64)
+
+def with_crc(raw, longitud):
+    """Escribe la paridad en los 3 últimos bytes de cada mensaje (CRC 0 al decodificar)."""
+    r = adsb_np.crc_array(raw, longitud)
+    fin = longitud.astype(np.int64)
+    filas = np.arange(len(raw))
+    for k, shift in enumerate((16, 8, 0)):
+        raw[filas, fin - 3 + k] = (r >> shift) & 0xFF
+    return raw
+
+def df17(icao, me):
+    """Mensajes DF17 de 14 bytes con el campo ME de 56 bits de cada fila."""
+    n = len(me)
+    raw = np.zeros((n, 14), dtype=np.uint8)
+    raw[:, 0] = 0x8D
+    raw[:, 1], raw[:, 2], raw[:, 3] = (icao >> 16) & 0xFF, (icao >> 8) & 0xFF, icao & 0xFF
+    for k in range(7):
+        raw[:, 4 + k] = (me >> np.uint64(8 * (6 - k))) & np.uint64(0xFF)
+    return with_crc(raw, np.full(n, 14, dtype=np.uint8))
+
+def df11(icao, n):
+    """Respuestas all-call DF11 de 7 bytes (sin typecode: tc nulo en el día decodificado)."""
+    raw = np.zeros((n, 14), dtype=np.uint8)
+    raw[:, 0] = 0x5D
+    raw[:, 1], raw[:, 2], raw[:, 3] = (icao >> 16) & 0xFF, (icao >> 8) & 0xFF, icao & 0xFF
+    return with_crc(raw, np.full(n, 7, dtype=np.uint8))
+
+def messages(icao, t, lat, lon, alt, kts, trk, vr, ground, df11_cada=5):
+    """Por muestra: un mensaje de posición (par/impar alternos), uno de velocidad en vuelo y un DF11 cada df11_cada."""
+    n = len(t)
+    U = np.uint64
+    odd = np.arange(n) % 2
+    yz, xz = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+    for surface in (True, False):
+        for o in (0, 1):
+            m = (ground == surface) & (odd == o)
+            yz[m], xz[m] = cpr_encode(lat[m], lon[m], o, surface)
+
+    me = np.zeros(n, dtype=U)
+    g, a = ground, ~ground
+    # superficie TC 7: movement, track válido y track en 7 bits
+    me[g] = (U(7) << U(51)) | (movement_code(kts[g]).astype(U) << U(44)) | (U(1) << U(43)) | \
+            ((np.round(trk[g] / 360 * 128).astype(np.int64) % 128).astype(U) << U(36)) | \
+            (odd[g].astype(U) << U(34)) | (yz[g].astype(U) << U(17)) | xz[g].astype(U)
+    # en vuelo TC 11: altitud barométrica con Q=1 (pasos de 25 ft)
+    N = np.round((np.maximum(alt[a], 0) + 1000) / 25).astype(np.int64)
+    alt_field = ((N >> 4) << 5) | (1 << 4) | (N & 0xF)
+    me[a] = (U(11) << U(51)) | (alt_field.astype(U) << U(36)) | (odd[a].astype(U) << U(34)) | \
+            (yz[a].astype(U) << U(17)) | xz[a].astype(U)
+
+    # velocidad TC 19 subtipo 1 en vuelo, medio segundo después de la posición
+    vx = kts[a] * np.sin(np.radians(trk[a]))
+    vy = kts[a] * np.cos(np.radians(trk[a]))
+    me_vel = (U(19) << U(51)) | (U(1) << U(48)) | ((vx < 0).astype(U) << U(42)) | \
+             (np.minimum(np.abs(np.round(vx)) + 1, 1023).astype(U) << U(32)) | ((vy < 0).astype(U) << U(31)) | \
+             (np.minimum(np.abs(np.round(vy)) + 1, 1023).astype(U) << U(21)) | ((vr[a] < 0).astype(U) << U(19)) | \
+             (np.minimum(np.abs(np.round(vr[a] / 64)) + 1, 511).astype(U) << U(10))
+
+    partes_t = [t, t[a] + 0.5]
+    partes_raw = [df17(icao, me), df17(icao, me_vel)]
+    if df11_cada:
+        sel = np.arange(0, n, df11_cada)
+        partes_t.append(t[sel] + 0.25)
+        partes_raw.append(df11(icao, len(sel)))
+    return np.concatenate(partes_t), np.vstack(partes_raw)
+
+# ------------------------------------------------------------------ trayectorias
+
+def path(points, speeds):
+    """Interpolación segundo a segundo entre waypoints (lon, lat) con la velocidad (kts) de cada tramo."""
+    lon, lat = [], []
+    for p0, p1, v in zip(points[:-1], points[1:], speeds):
+        d = np.hypot((p1[0] - p0[0]) * 84_600, (p1[1] - p0[1]) * 111_200)
+        n = max(int(d / (max(v, 1) * 0.5144)), 1)
+        f = np.arange(n) / n
+        lon.append(p0[0] + f * (p1[0] - p0[0]))
+        lat.append(p0[1] + f * (p1[1] - p0[1]))
+    return np.concatenate(lon), np.concatenate(lat)
+
+def track(lon, lat):
+    return np.degrees(np.arctan2(np.gradient(lon) * 0.76, np.gradient(lat))) % 360
+
+def runway_axis(a, name):
+    """Extremos del eje de una pista (lon, lat): puntos medios de los lados cortos de su rectángulo mínimo."""
+    rect = shapely.minimum_rotated_rectangle(shapely.union_all(a.runways_lonlat[a.runway_names == name]))
+    c = shapely.get_coordinates(rect)[:4]
+    medios = [(c[i] + c[(i + 1) % 4]) / 2 for i in range(4)]
+    if np.hypot(*(c[1] - c[0])) > np.hypot(*(c[2] - c[1])):
+        return medios[1], medios[3]
+    return medios[0], medios[2]
+
+def takeoff(a, rng, t0, h):
+    """Rodaje desde un stand hasta el punto de espera h, espera parado, entrada a pista, carrera y ascenso."""
+    hp = a.holding_xy[h]
+    e0, e1 = runway_axis(a, a.holding_runway[h])
+    start, end = (e0, e1) if np.hypot(*(e0 - hp)) < np.hypot(*(e1 - hp)) else (e1, e0)
+    gate = hp + rng.normal(0, 0.01, 2)
+    lift = start + 0.6 * (end - start)
+    out = end + 6 * (end - start)
+    wait = rng.integers(30, 400)
+    tramos = [path([gate, hp], [15]), (np.full(wait, hp[0]), np.full(wait, hp[1])),
+              path([hp, start], [10]), path([start, lift], [60]), path([lift, end, out], [160, 170])]
+    n1, n2, n3, n4, n5 = (len(lon) for lon, _ in tramos)
+    lon = np.concatenate([lon for lon, _ in tramos])
+    lat = np.concatenate([lat for _, lat in tramos])
+    n_suelo = n1 + n2 + n3 + n4
+    kts = np.concatenate([np.full(n1, 15.), np.zeros(n2), np.full(n3, 10.), np.linspace(10, 150, n4), np.full(n5, 165.)])
+    alt = np.concatenate([np.zeros(n_suelo), np.arange(n5) * 2500 / 60])
+    vr = np.concatenate([np.zeros(n_suelo), np.full(n5, 2500.)])
+    ground = np.arange(len(lon)) < n_suelo
+    return t0 + np.arange(len(lon)), lat, lon, alt, kts, track(lon, lat), vr, ground
+
+def landing(a, rng, t0, rw):
+    """Aproximación desde 6 longitudes de pista, toma, frenada y salida a rodadura."""
+    e0, e1 = runway_axis(a, rw)
+    if rng.random() < .5:
+        e0, e1 = e1, e0
+    far = e0 - 6 * (e1 - e0)
+    stop = e0 + 0.7 * (e1 - e0)
+    exit_ = stop + rng.normal(0, 0.004, 2)
+    tramos = [path([far, e0], [150]), path([e0, stop], [80]), path([stop, exit_], [15])]
+    n1, n2, n3 = (len(lon) for lon, _ in tramos)
+    lon = np.concatenate([lon for lon, _ in tramos])
+    lat = np.concatenate([lat for _, lat in tramos])
+    alt = np.concatenate([np.linspace(4000, 0, n1), np.zeros(n2 + n3)])
+    kts = np.concatenate([np.full(n1, 150.), np.linspace(140, 15, n2), np.full(n3, 15.)])
+    vr = np.concatenate([np.full(n1, -800.), np.zeros(n2 + n3)])
+    ground = np.arange(len(lon)) >= n1
+    return t0 + np.arange(len(lon)), lat, lon, alt, kts, track(lon, lat), vr, ground
+
+def overflight(rng, t0):
+    """Cruce este-oeste a 35000 ft por encima del aeropuerto."""
+    lon, lat = path([np.array([-3.9, rng.uniform(40.2, 40.8)]), np.array([-3.2, rng.uniform(40.2, 40.8)])], [450])
+    n = len(lon)
+    return t0 + np.arange(n), lat, lon, np.full(n, 35000.), np.full(n, 450.), np.full(n, 90.), np.zeros(n), np.zeros(n, dtype=bool)
+
+def resample(tr, tasa):
+    """Trayectoria muestreada a 1 Hz pasada a tasa mensajes de posición por segundo."""
+    t = tr[0]
+    if tasa == 1 or len(t) == 0:
+        return tr
+    nuevo = t[0] + np.arange(int(np.floor((t[-1] - t[0]) * tasa)) + 1) / tasa
+    previo = np.minimum(np.floor(nuevo - t[0]).astype(np.int64), len(t) - 1)
+    lat, lon, alt = (np.interp(nuevo, t, x) for x in tr[1:4])
+    return (nuevo, lat, lon, alt) + tuple(x[previo] for x in tr[4:])
+
+# ------------------------------------------------------------------ día
+
+def generate(n_aviones=8, n_rotaciones=6, n_sobrevuelos=30, n_ruido=40, tasa=1, antenas=1, df11_cada=5,
+             horas=4, seed=0, dia=DIA):
+    """Mensajes (ts_kafka en ms, array (n, 14) uint8) de un día sintético, ordenados por ts.
+
+    n_aviones aviones empiezan en las primeras horas horas del día y hacen n_rotaciones aterrizaje + despegue
+    en pistas y puntos de espera al azar; tasa son los mensajes de posición por segundo y avión, y antenas el
+    número de receptores que entregan cada mensaje (copias con hasta 200 ms de retraso, como en los datos reales).
+    """
+    rng = np.random.default_rng(seed)
+    a = aeropuerto.get_aeropuerto()
+    t_base = dia.value / 1e9
+    ts_all, raw_all = [], []
+
+    def emitir(icao, tr):
+        ts, raw = messages(icao, *resample(tr, tasa), df11_cada=df11_cada)
+        ts_all.append(ts)
+        raw_all.append(raw)
+
+    for k in range(n_aviones):
+        t = t_base + rng.uniform(0, 3600 * horas)
+        for _ in range(n_rotaciones):
+            tr = landing(a, rng, t, a.runway_order[rng.integers(0, len(a.runway_order))])
+            emitir(ICAO_ROTACIONES + k, tr)
+            t = tr[0][-1] + rng.uniform(1800, 3600)
+            tr = takeoff(a, rng, t, rng.integers(0, len(a.holding_xy)))
+            emitir(ICAO_ROTACIONES + k, tr)
+            t = tr[0][-1] + rng.uniform(1800, 3600)
+    for k in range(n_sobrevuelos):
+        emitir(ICAO_SOBREVUELO + k, overflight(rng, t_base + rng.uniform(0, 86000)))
+    for k in range(n_ruido):
+        tr = overflight(rng, t_base + rng.uniform(0, 86000))
+        keep = rng.random(len(tr[0])) < 0.02
+        emitir(ICAO_RUIDO + k, tuple(x[keep] for x in tr))
+
+    ts = np.concatenate(ts_all)
+    raw = np.vstack(raw_all)
+    if antenas > 1:
+        copias = len(ts) * (antenas - 1)
+        ts = np.concatenate([ts, np.tile(ts, antenas - 1) + rng.uniform(0, 0.2, copias)])
+        raw = np.vstack([raw] * antenas)
+    # sólo el día pedido: las últimas rotaciones pueden pasar de medianoche
+    dentro = ts < t_base + 86400
+    ts, raw = ts[dentro], raw[dentro]
+    orden = np.argsort(ts, kind='stable')
+    return (ts[orden] * 1000).astype(np.int64), raw[orden]
+
+def write_day(out_dir, ts, raw, archivos_por_hora=6):
+    """Escribe el día como out_dir/HH/i.csv (ts_kafka;message en base64), el formato de decodificacion.day_sources."""
+    longitud = adsb_np.message_length(raw)
+    mensajes = [base64.b64encode(r[:n].tobytes()).decode() for r, n in zip(raw, longitud)]
+    df = pd.DataFrame({'ts_kafka': ts, 'message': mensajes})
+    hora = (ts // 3_600_000) % 24
+    for h, grupo in df.groupby(hora):
+        path_hora = os.path.join(out_dir, f"{h:02d}")
+        os.makedirs(path_hora, exist_ok=True)
+        for i, idx in enumerate(np.array_split(np.arange(len(grupo)), archivos_por_hora)):
+            grupo.iloc[idx].to_csv(os.path.join(path_hora, f"{i}.csv"), sep=';', index=False)
+    return len(df)
+
+def generate_day(out_dir, dia=DIA, **kwargs):
+    ts, raw = generate(dia=dia, **kwargs)
+    n = write_day(out_dir, ts, raw)
+    print(f"🧪 Día sintético {dia:%Y-%m-%d}: {n} mensajes en {out_dir}")
+    return n
+
+def main():
+    out_dir = os.path.join(SALIDA, f"{DIA.year}", f"{DIA.month:02d}", f"{DIA.day:02d}")
+    generate_day(out_dir)
+
+if __name__ == "__main__":
+    main()
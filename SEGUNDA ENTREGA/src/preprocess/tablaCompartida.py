@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from multiprocessing import shared_memory
+
+# Tabla de un día en memoria compartida (Arrow IPC) para los pools por ICAO: el padre la escribe
+# una vez y cada worker la abre sin copiar; las tareas sólo llevan el rango de filas (inicio, fin)
+
+class TablaCompartida:
+    """DataFrame serializado una sola vez como stream Arrow IPC en un bloque de multiprocessing.shared_memory."""
+    def __init__(self, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # primero se mide el stream para reservar el bloque justo
+        mock = pa.MockOutputStream()
+        with pa.ipc.new_stream(mock, table.schema) as writer:
+            writer.write_table(table)
+        self.nbytes = mock.size()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(self.nbytes, 1))
+        self.name = self.shm.name
+        buffer = pa.py_buffer(self.shm.buf)
+        sink = pa.FixedSizeBufferWriter(buffer)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        sink.close()
+        # sin referencias vivas al buffer para poder cerrar el bloque al final
+        del sink, buffer, table
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_shm = None
+_tabla = None
+
+def attach(name):
+    """Initializer de los workers: abre el bloque y lee la tabla sin copiarla."""
+    global _shm, _tabla
+    _shm = shared_memory.SharedMemory(name=name)
+    _tabla = pa.ipc.open_stream(pa.py_buffer(_shm.buf)).read_all()
+
+def rows(start, stop):
+    """Filas [start, stop) de la tabla del worker como DataFrame, con los tipos de pandas originales."""
+    return _tabla.slice(start, stop - start).to_pandas()
+
+def row_ranges(df, key):
+    """Ordena df por key de forma estable y devuelve (df ordenado, [(valor, inicio, fin), ...]).
+
+    Dentro de cada grupo se conserva el orden previo de las filas, como en df.groupby(key);
+    las filas con key nulo se descartan igual que en groupby.
+    """
+    codes, uniques = pd.factorize(df[key], sort=True)
+    orden = np.argsort(codes, kind='stable')
+    codes = codes[orden]
+    validas = codes >= 0
+    df = df.iloc[orden[validas]].reset_index(drop=True)
+    codes = codes[validas]
+    if len(codes) == 0:
+        return df, []
+    cortes = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.r_[0, cortes]
+    stops = np.r_[cortes, len(codes)]
+    return df, [(uniques[codes[start]], int(start), int(stop)) for start, stop in zip(starts, stops)]
+
+def write_part(df, parts_dir, name):
+    """Escribe un resultado de worker como fichero Arrow IPC (sin comprimir) y devuelve su ruta; None si está vacío."""
+    if df is None or df.empty:
+        return None
+    path = os.path.join(parts_dir, f"{name}.arrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return path
+
+def read_parts(paths):
+    """Concatena las partes en el orden dado (con pd.concat: columnas distintas entre partes se alinean)."""
+    dfs = []
+    for path in paths:
+        # lectura a memoria (no mmap) para poder borrar el directorio de partes después
+        with pa.OSFile(path, 'rb') as source:
+            dfs.append(pa.ipc.open_file(source).read_all().to_pandas())
+    return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
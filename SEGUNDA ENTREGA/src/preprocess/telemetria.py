@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+
+# Escribir <salida>.telemetria.json y <salida>.tareas.csv junto a cada parquet generado
+ACTIVADA = True
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (None si no se puede medir)."""
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        # Windows: resource no existe, psutil expone el pico del working set
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 1024 ** 2, 1)
+    except ImportError:
+        return None
+
+@contextmanager
+def medir(tiempos, nombre):
+    """Acumula en tiempos[nombre] los segundos del bloque (tiempos = None: no mide)."""
+    if tiempos is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[nombre] = tiempos.get(nombre, 0.0) + time.perf_counter() - start
+
+def task_stats(start, rows_in, rows_out, tiempos=None, **extra):
+    """Estadísticas de una tarea de un pool, calculadas dentro del propio worker."""
+    stats = {
+        'pid':      os.getpid(),
+        'seconds':  time.perf_counter() - start,
+        'rows_in':  rows_in,
+        'rows_out': rows_out,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    stats.update(extra)
+    if tiempos:
+        stats['tiempos'] = tiempos
+    return stats
+
+class Telemetria:
+    """Métricas de una etapa para un día o semana: filas, rendimiento, tiempos por función y memoria."""
+    def __init__(self, etapa, unidad):
+        self.etapa = etapa
+        self.unidad = str(unidad)
+        self.start = time.perf_counter()
+        self.rows_in = 0
+        self.rows_out = 0
+        self.tiempos = {}
+        self.tareas = []
+
+    def medir(self, nombre):
+        return medir(self.tiempos, nombre)
+
+    def add_tasks(self, stats):
+        self.tareas.extend(stats)
+
+    def summary(self):
+        seconds = time.perf_counter() - self.start
+        resumen = {
+            'etapa':        self.etapa,
+            'unidad':       self.unidad,
+            'seconds':      round(seconds, 3),
+            'rows_in':      int(self.rows_in),
+            'rows_out':     int(self.rows_out),
+            'msgs_per_s':   round(self.rows_in / seconds, 1) if seconds > 0 else None,
+            'tiempos':      {k: round(v, 3) for k, v in self.tiempos.items()},
+            'peak_rss_mb_parent': peak_rss_mb(),
+        }
+        if self.tareas:
+            tareas = pd.DataFrame(self.tareas)
+            duraciones = tareas['seconds'].to_numpy()
+            p50, p90, p99 = np.percentile(duraciones, [50, 90, 99])
+            resumen['tareas'] = {
+                'n': len(tareas),
+                'seconds_min': round(duraciones.min(), 3),
+                'seconds_p50': round(p50, 3),
+                'seconds_p90': round(p90, 3),
+                'seconds_p99': round(p99, 3),
+                'seconds_max': round(duraciones.max(), 3),
+                # peso de la tarea más lenta sobre el total: detecta un ICAO o lote que domina el día
+                'max_share': round(duraciones.max() / duraciones.sum(), 3) if duraciones.sum() > 0 else None,
+                'workers': int(tareas['pid'].nunique()),
+            }
+            if tareas['peak_rss_mb'].notna().any():
+                resumen['peak_rss_mb_workers'] = tareas.groupby('pid')['peak_rss_mb'].max().round(1).to_dict()
+            if 'tiempos' in tareas.columns:
+                worker_tiempos = pd.DataFrame(tareas['tiempos'].dropna().tolist()).sum()
+                resumen['tiempos_workers'] = worker_tiempos.round(3).to_dict()
+            lenta = tareas.loc[tareas['seconds'].idxmax()].drop(labels=['tiempos'], errors='ignore')
+            resumen['tarea_mas_lenta'] = {k: (v.item() if hasattr(v, 'item') else v) for k, v in lenta.items()}
+        return resumen
+
+    def write(self, out_path):
+        if not ACTIVADA:
+            return None
+        resumen = self.summary()
+        base = os.path.splitext(out_path)[0]
+        with open(base + ".telemetria.json", 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False, default=str)
+        if self.tareas:
+            tareas = pd.DataFrame(self.tareas)
+            if 'tiempos' in tareas.columns:
+                tiempos = pd.DataFrame(tareas.pop('tiempos').apply(lambda t: t if isinstance(t, dict) else {}).tolist())
+                tareas = pd.concat([tareas, tiempos.add_prefix('t_')], axis=1)
+            tareas.to_csv(base + ".tareas.csv", index=False)
+        print(f"📈 Telemetría {self.etapa} {self.unidad}: {resumen['rows_in']} → {resumen['rows_out']} filas, "
+              f"{resumen['msgs_per_s']} msg/s, pico RSS {resumen['peak_rss_mb_parent']} MB")
+        return resumen
@@ -0,0 +1,41 @@
+import os
+import sys
+import base64
+import pytest
+
+# Los módulos de preprocess se importan en plano y leen ../json/... relativo a preprocess/
+PREPROCESS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PREPROCESS)
+
+@pytest.fixture(scope="session", autouse=True)
+def en_preprocess():
+    anterior = os.getcwd()
+    os.chdir(PREPROCESS)
+    yield
+    os.chdir(anterior)
+
+@pytest.fixture(scope="session")
+def dia():
+    """Día sintético pequeño decodificado, ordenado por icao y ts como lo escribe decodificacion."""
+    import pandas as pd
+    import adsbVectorizado as adsb_np
+    import decodificacion
+    import sintetico
+    ts, raw = sintetico.generate(n_aviones=2, n_rotaciones=2, n_sobrevuelos=4, n_ruido=4, horas=2)
+    longitud = adsb_np.message_length(raw)
+    chunk = pd.DataFrame({'ts_kafka': ts, 'message': [base64.b64encode(r[:n].tobytes()).decode() for r, n in zip(raw, longitud)]})
+    day = decodificacion.change_types(decodificacion.process_chunk(chunk))
+    return day.sort_values(["icao", "ts"], kind='stable').reset_index(drop=True)
+
+@pytest.fixture(scope="session")
+def despegues(tmp_path_factory, dia):
+    """Despegues de filtrado del día sintético (con puntos de espera, pistas y horas de despegue)."""
+    import pandas as pd
+    import filtrado
+    base = tmp_path_factory.mktemp("filtrado")
+    dia.to_parquet(base / "1.parquet", row_group_size=4096)
+    paths = [base / tipo / "1.parquet" for tipo in ("despegues", "aterrizajes", "raros")]
+    for path in paths:
+        path.parent.mkdir()
+    filtrado.process_data(str(base / "1.parquet"), *map(str, paths), processes=1)
+    return pd.read_parquet(paths[0])
@@ -0,0 +1,109 @@
+import base64
+import numpy as np
+import pandas as pd
+import pyModeS as pms
+import pytest
+import adsbVectorizado as adsb_np
+import decodificacion
+
+# Paridad de la decodificación vectorizada (adsbVectorizado vía process_chunk) con pyModeS mensaje a mensaje
+
+def frames(n, seed=0):
+    """Mensajes DF17/18 aleatorios con CRC válido (todos los typecode) y un 10 % con la paridad corrupta."""
+    rng = np.random.default_rng(seed)
+    mensajes = []
+    for i in range(n):
+        datos = bytearray(rng.integers(0, 256, 11, dtype=np.uint8).tobytes())
+        datos[0] = (int(rng.choice([17, 18])) << 3) | int(rng.integers(0, 8))
+        msg_hex = datos.hex().upper() + "000000"
+        paridad = pms.crc(msg_hex, encode=True)
+        if i % 10 == 0:
+            paridad ^= 1 << int(rng.integers(0, 24))
+        mensajes.append(base64.b64encode(bytes(datos) + paridad.to_bytes(3, "big")).decode())
+    return pd.DataFrame({'ts_kafka': 1733011200000 + np.arange(n, dtype=np.int64) * 100, 'message': mensajes})
+
+def altitude_pms(msg_hex):
+    try:
+        return pms.adsb.altitude(msg_hex)
+    except Exception:
+        return np.nan
+
+def velocity_pms(msg_hex):
+    try:
+        return tuple(pms.adsb.velocity(msg_hex)[:3])
+    except Exception:
+        return (np.nan, np.nan, np.nan)
+
+def process_chunk_pms(chunk):
+    """Decodificación mensaje a mensaje con pyModeS (la de process_chunk antes de adsbVectorizado)."""
+    msg_hex = chunk['message'].map(lambda m: base64.b64decode(m).hex().upper())
+    valido = (msg_hex.map(lambda m: pms.crc(m, encode=False)) == 0) & (msg_hex.map(pms.typecode) != -1)
+    msg_hex = msg_hex[valido]
+    velocidad = msg_hex.map(velocity_pms)
+    return pd.DataFrame({
+        'ts':            pd.to_datetime(chunk['ts_kafka'][valido], unit='ms'),
+        'msg_hex':       msg_hex,
+        'tc':            msg_hex.map(pms.typecode),
+        'oe_flag':       msg_hex.map(pms.adsb.oe_flag),
+        'icao':          msg_hex.map(lambda m: int(pms.icao(m), 16)),
+        'altitude':      msg_hex.map(altitude_pms),
+        'speed':         velocidad.map(lambda v: v[0]),
+        'angle':         velocidad.map(lambda v: v[1]),
+        'vertical_rate': velocidad.map(lambda v: v[2]),
+    })
+
+@pytest.fixture(scope="module")
+def chunk():
+    return frames(4000)
+
+@pytest.fixture(scope="module")
+def esperado(chunk):
+    return process_chunk_pms(chunk)
+
+@pytest.fixture(scope="module")
+def resultado(chunk):
+    return decodificacion.process_chunk(chunk.copy())
+
+def test_mismas_filas(chunk, esperado, resultado):
+    assert 0 < len(resultado) < len(chunk)
+    assert resultado.index.equals(esperado.index)
+    assert (resultado['ts'].to_numpy() == esperado['ts'].to_numpy()).all()
+    assert resultado['msg_hex'].tolist() == esperado['msg_hex'].tolist()
+
+@pytest.mark.parametrize("col", ['tc', 'oe_flag', 'icao', 'altitude', 'speed', 'angle', 'vertical_rate'])
+def test_campos(esperado, resultado, col):
+    # los float32 del registro de esquema: tolerancia relativa de float32
+    np.testing.assert_allclose(resultado[col].astype(float).to_numpy(),
+                               pd.to_numeric(esperado[col]).astype(float).to_numpy(), rtol=1e-6, equal_nan=True)
+
+def test_mensajes_binarios(chunk, resultado):
+    binario = decodificacion.process_chunk(chunk.copy(), binary_msg=True)
+    assert [bytes(m).hex().upper() for m in binario['msg']] == resultado['msg_hex'].tolist()
+
+def comm_b_frames(n, seed=0):
+    """Campos MB aleatorios de DF20/21; la mitad con estados, reservados y temperatura coherentes (candidatos a BDS 4,5)."""
+    rng = np.random.default_rng(seed)
+    raw = rng.integers(0, 256, (n, 14), dtype=np.uint8)
+    raw[:, 0] = (rng.choice([20, 21], n).astype(np.uint8) << 3) | (raw[:, 0] & 7)
+    for i in range(0, n, 2):
+        bits = list(format(int.from_bytes(raw[i, 4:11].tobytes(), "big"), "056b"))
+        for sb, msb, lsb in adsb_np._BDS45_ESTADOS:
+            if rng.random() < 0.6:
+                bits[sb - 1] = '0'
+                bits[msb - 1:lsb] = '0' * (lsb - msb + 1)
+        if rng.random() < 0.8:
+            bits[51:56] = '00000'
+        if rng.random() < 0.8:
+            # temperatura de -80 a 60 ºC: signo y 9 bits en complemento a dos
+            bits[16:26] = format(int(rng.integers(-320, 241)) & 0x3FF, "010b")
+        raw[i, 4:11] = np.frombuffer(int("".join(bits), 2).to_bytes(7, "big"), dtype=np.uint8)
+    return raw
+
+def test_bds45():
+    raw = comm_b_frames(4000)
+    es_bds45, estela = adsb_np.bds45_array(raw)
+    msgs = [r.tobytes().hex().upper() for r in raw]
+    esperado = np.array([pms.bds.bds45.is45(m) for m in msgs])
+    assert 100 < esperado.sum() < len(raw) // 2
+    np.testing.assert_array_equal(es_bds45, esperado)
+    np.testing.assert_array_equal(estela, [-1 if (wv := pms.bds.bds45.wv45(m)) is None else wv for m in msgs])
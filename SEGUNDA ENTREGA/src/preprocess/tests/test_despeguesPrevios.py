@@ -0,0 +1,153 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import pytest
+import despeguesPrevios
+
+# Equivalencia de las consultas por índice de despeguesPrevios con las versiones fila a fila de referencia
+
+def get_num_despegues_previos(row, despegues, minutes):
+    despegues = despegues[despegues["hora_despegue"] > (row["ts"] - timedelta(minutes=minutes))]
+    despegues = despegues[despegues["hora_despegue"] < row["ts"]]
+    diff = despegues["hora_despegue"].diff()
+    return len(despegues), diff.mean()
+
+@pytest.mark.parametrize("seed", range(20))
+def test_despegues_previos(seed):
+    rng = np.random.default_rng(seed)
+    inicio = pd.Timestamp("2024-12-01").value // 10**6
+    # horas en ms, con repeticiones, como las de los parquets de filtrado
+    horas = np.sort(rng.integers(inicio, inicio + 3 * 3600 * 1000, rng.integers(0, 40)))
+    horas = np.repeat(horas, rng.integers(1, 3, len(horas)))
+    despegues = pd.DataFrame({'hora_despegue': pd.to_datetime(horas, unit='ms')})
+    flight = pd.DataFrame({'ts': pd.to_datetime(np.sort(rng.integers(inicio, inicio + 4 * 3600 * 1000, 60)), unit='ms')})
+
+    result = despeguesPrevios.add_despegues_previos(flight.copy(), despegues)
+    # pandas calcula la media de diff en la resolución de hora_despegue (ms): se compara en esa unidad
+    unidad = f"timedelta64[{np.datetime_data(despegues['hora_despegue'].dtype)[0]}]"
+    for nombre, minutes in despeguesPrevios.VENTANAS.items():
+        expected = flight.apply(lambda x: get_num_despegues_previos(x, despegues, minutes), axis=1, result_type='expand')
+        np.testing.assert_array_equal(result[f"despegues_previos_{nombre}"].to_numpy(), expected[0].to_numpy(dtype=np.int64))
+        np.testing.assert_array_equal(result[f"media_diff_{nombre}"].to_numpy().astype(unidad).view(np.int64),
+                                      pd.to_timedelta(expected[1]).to_numpy(unidad).view(np.int64))
+
+# ------------------------------------------------------------------ tráfico en tierra
+
+def get_other_aircraft_info(row, df_global, runway_target):
+    center_coords = despeguesPrevios.runway_centers()[runway_target]
+
+    current_ts = row['ts']
+    current_icao = row['icao']
+
+    nearby_traffic = df_global[
+        (df_global['ts'] >= current_ts - timedelta(seconds=5)) &
+        (df_global['ts'] <= current_ts + timedelta(seconds=2)) &
+        (df_global['icao'] != current_icao)
+    ].copy()
+
+    holding_ocupado = False
+    num_holding_aircrafts = 0
+    tiempo_holding = None
+    despegue_holdings = None
+    icaos_holdings = None
+    distancias_holdings = None
+
+    pista_ocupada = False
+    num_en_pista_aircrafts = 0
+    icaos_en_pista = None
+    distancia_en_pista = None
+
+    en_camino_antes = False
+    num_yendo_a_pista_aircrafts = 0
+    icaos_yendo_a_pista = None
+    distancia_yendo_a_pista = None
+
+    # 2. Revisar Punto de Espera (Holding Point)
+    holdings = nearby_traffic[
+        (nearby_traffic['holding_point_id'].notna()) &
+        (nearby_traffic['runway'] == runway_target)
+    ].drop_duplicates("icao")
+    if not holdings.empty:
+        holding_ocupado = True
+
+        num_holding_aircrafts = len(holdings)
+        tiempo_holding = [(current_ts - aircraft[1]["llegada_punto_espera"]) for aircraft in holdings.iterrows()]
+        despegue_holdings = [aircraft[1]["hora_despegue"] for aircraft in holdings.iterrows()]
+        icaos_holdings = [aircraft[1]["icao"] for aircraft in holdings.iterrows()]
+        distancias_holdings = [despeguesPrevios.haversine(aircraft[1]['lon_despegue'], aircraft[1]['lat_despegue'], center_coords['lon_despegue'], center_coords['lat_despegue']) for aircraft in holdings.iterrows()]
+
+    # 3. Revisar Pista Ocupada
+    on_runway = nearby_traffic[
+        (nearby_traffic['esta_en_pista']) &
+        (nearby_traffic['runway'] == runway_target)
+    ].drop_duplicates("icao")
+    if not on_runway.empty:
+        pista_ocupada = True
+        num_en_pista_aircrafts = len(on_runway)
+        icaos_en_pista = [aircraft[1]["icao"] for aircraft in on_runway.iterrows()]
+        distancia_en_pista = [despeguesPrevios.haversine(aircraft[1]['lon_despegue'], aircraft[1]['lat_despegue'], center_coords['lon_despegue'], center_coords['lat_despegue']) for aircraft in on_runway.iterrows()]
+
+    # 4. Revisar Avión en Camino (Antes que el actual)
+    current_takeoff_time = row['hora_despegue']
+
+    en_route = nearby_traffic[
+        (nearby_traffic['runway'] == runway_target) &
+        (~nearby_traffic['icao'].isin(holdings['icao'])) &
+        (~nearby_traffic['icao'].isin(on_runway['icao'])) &
+        (nearby_traffic['hora_despegue'] < current_takeoff_time)
+    ].drop_duplicates("icao")
+    en_route = en_route.sort_values('hora_despegue')
+
+    if not en_route.empty:
+        en_camino_antes = True
+        num_yendo_a_pista_aircrafts = len(en_route)
+        icaos_yendo_a_pista = [aircraft[1]["icao"] for aircraft in en_route.iterrows()]
+        distancia_yendo_a_pista = [despeguesPrevios.haversine(aircraft[1]['lon_despegue'], aircraft[1]['lat_despegue'], center_coords['lon_despegue'], center_coords['lat_despegue']) for aircraft in en_route.iterrows()]
+
+    return pd.Series([holding_ocupado, num_holding_aircrafts,       icaos_holdings,      distancias_holdings,    tiempo_holding, despegue_holdings,
+                      pista_ocupada,   num_en_pista_aircrafts,      icaos_en_pista,      distancia_en_pista,
+                      en_camino_antes, num_yendo_a_pista_aircrafts, icaos_yendo_a_pista, distancia_yendo_a_pista])
+
+def _iguales(a, b):
+    if isinstance(a, list) or isinstance(b, list):
+        return isinstance(a, list) and isinstance(b, list) and len(a) == len(b) and all(map(_iguales, a, b))
+    if a is None or b is None:
+        return a is None and b is None
+    return (pd.isna(a) and pd.isna(b)) or (type(a) == type(b) and a == b)
+
+@pytest.fixture(scope="module")
+def dia_ocupado(despegues):
+    """Despegues del día más copias con otro icao desplazadas unos segundos: hay tráfico en espera, en pista y en camino."""
+    copias = [despegues]
+    for k, segundos in enumerate((3, -4, 60, 1800), start=1):
+        copia = despegues.copy()
+        copia['icao'] = copia['icao'] + k * 0x1000
+        for col in ('ts', 'hora_despegue', 'llegada_punto_espera'):
+            copia[col] = copia[col] + pd.Timedelta(seconds=segundos)
+        copias.append(copia)
+    return despeguesPrevios.DiaDespegues(pd.concat(copias, ignore_index=True), "sintetico")
+
+def test_trafico(dia_ocupado):
+    ocupados = 0
+    for _, flight in dia_ocupado.df.groupby(['icao', 'flight_id'], observed=True):
+        # una de cada 20 filas: la referencia filtra los despegues previos fila a fila
+        flight = flight.iloc[::20]
+        rw = flight['runway'].iloc[0]
+        for hora in (flight['hora_despegue'].iloc[0] + pd.Timedelta(minutes=m) for m in (0, -30, 45)):
+            filtered_previos, _ = dia_ocupado.previos(rw, hora)
+            expected = flight.apply(lambda x: get_other_aircraft_info(x, filtered_previos, rw), axis=1, result_type='expand')
+            result = dia_ocupado.trafico(flight, rw, hora)
+            for k, col in enumerate(despeguesPrevios.COLUMNAS_TRAFICO):
+                assert all(_iguales(a, b) for a, b in zip(expected[k].tolist(), result[col].tolist())), col
+            ocupados += int(result[['holding_ocupado', 'pista_ocupada', 'en_camino_antes']].any(axis=None))
+    assert ocupados > 0
+
+def test_trafico_sin_despegues(dia_ocupado, despegues):
+    """Pista sin despegues en el día u hora NaT: los valores por defecto en todas las filas."""
+    flight = despegues.head(20)
+    vacio = dia_ocupado.df.iloc[:0]
+    rw = flight['runway'].iloc[0]
+    expected = flight.apply(lambda x: get_other_aircraft_info(x, vacio, rw), axis=1, result_type='expand').set_axis(despeguesPrevios.COLUMNAS_TRAFICO, axis=1)
+    pd.testing.assert_frame_equal(dia_ocupado.trafico(flight, rw, pd.NaT), expected)
+    sin_pista = despeguesPrevios.DiaDespegues(dia_ocupado.df[dia_ocupado.df['runway'] != rw], "sintetico")
+    pd.testing.assert_frame_equal(sin_pista.trafico(flight, rw, flight['hora_despegue'].iloc[0]), expected)
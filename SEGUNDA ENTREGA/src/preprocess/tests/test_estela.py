@@ -0,0 +1,60 @@
+import os
+import base64
+import pandas as pd
+import pyModeS as pms
+import pytest
+
+import decodificacion
+import estela
+import sintetico
+
+def comm_b(icao, wv, df=20, temperatura=0):
+    """Respuesta Comm-B con BDS 4,5 (estela wv, temperatura en 0,25 ºC) y el ICAO en la paridad, como la envía el avión."""
+    mb = ['0'] * 56
+    mb[12] = '1'
+    mb[13:15] = format(wv, '02b')
+    mb[15] = '1'
+    mb[17:26] = format(temperatura, '09b')
+    h = format(int(format(df, '05b') + '0' * 27 + ''.join(mb) + '0' * 24, 2), '028X')
+    return h[:22] + format(pms.crc(h, encode=True) ^ icao, '06X')
+
+# (icao, estela, mensajes distintos); 0x340001 ve 2 veces media y 1 ligera
+BDS45 = [(0x340001, 2, 2), (0x340001, 1, 1), (0x340002, 3, 1)]
+
+@pytest.fixture
+def dia_raw(tmp_path, monkeypatch):
+    """Día sintético en CSV con respuestas BDS 4,5 añadidas, y registro de estela en tmp_path."""
+    monkeypatch.setattr(estela, "PARTES", str(tmp_path / "estela" / "dias"))
+    monkeypatch.setattr(estela, "REGISTRO", str(tmp_path / "estela" / "registro.parquet"))
+    raw_dir = tmp_path / "raw" / "01"
+    ts, raw = sintetico.generate(n_aviones=1, n_rotaciones=1, n_sobrevuelos=1, n_ruido=1, horas=1)
+    sintetico.write_day(str(raw_dir), ts, raw, archivos_por_hora=2)
+    hora = sorted(os.listdir(raw_dir))[0]
+    # mensajes distintos (cambia la temperatura) y el primero repetido: se cuentan mensajes distintos
+    mensajes = [comm_b(icao, wv, df=20 + i % 2, temperatura=i) for icao, wv, n in BDS45 for i in range(n)]
+    mensajes.append(mensajes[0])
+    pd.DataFrame({'ts_kafka': ts[:len(mensajes)],
+                  'message': [base64.b64encode(bytes.fromhex(m)).decode() for m in mensajes]}
+                 ).to_csv(raw_dir / hora / "bds45.csv", sep=';', index=False)
+    return raw_dir
+
+def conteos():
+    df = pd.read_parquet(estela.REGISTRO)
+    return {(icao, wv): n for icao, wv, n in zip(df['icao'].tolist(), df['wake_vortex'].tolist(), df['mensajes'].tolist())}
+
+def test_redecodificar_no_cuenta_dos_veces(dia_raw, tmp_path):
+    out = str(tmp_path / "1.parquet")
+    esperado = {(icao, wv): n for icao, wv, n in BDS45}
+    for _ in range(2):
+        assert decodificacion.process_data(str(dia_raw), out, processes=1)
+        estela.consolidar()
+        assert conteos() == esperado
+    registro = estela.RegistroEstela(estela.REGISTRO)
+    assert registro.get(0x340001) == 2 and registro.get(0x340002) == 3
+
+def test_dia_fallido_no_toca_el_registro(dia_raw, tmp_path):
+    (tmp_path / "fichero").write_text("")
+    # la salida no se puede escribir: el día falla después de decodificar
+    assert decodificacion.process_data(str(dia_raw), str(tmp_path / "fichero" / "1.parquet"), processes=1) is False
+    assert not os.path.exists(estela.parte(str(dia_raw)))
+    assert estela.consolidar() == 0
@@ -0,0 +1,270 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import adsbVectorizado as adsb_np
+import filtrado
+import sintetico
+
+# Equivalencia de las versiones vectorizadas de filtrado con las de referencia (pyModeS, geopandas, vuelo a vuelo)
+
+@pytest.fixture(scope="module")
+def pares(dia):
+    """Pares par/impar de cada ICAO del día, con el mismo emparejamiento que add_position."""
+    posiciones = dia[dia['tc'].apply(filtrado.is_position_msg)]
+    pares = pd.concat([filtrado.pair_position_msgs(df_icao) for _, df_icao in posiciones.groupby('icao', observed=True)],
+                      ignore_index=True)
+    assert len(pares) > 1000
+    return pares
+
+def test_cpr_pyModeS(pares):
+    esperado = pares.apply(filtrado.decode_cpr, axis=1)
+    lat, lon = filtrado.decode_cpr_pairs(pares, 'msg_hex')
+    assert np.isfinite(lat).sum() > len(pares) // 2
+    np.testing.assert_allclose(lat, esperado['lat'].astype(float), rtol=0, atol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(lon, esperado['lon'].astype(float), rtol=0, atol=1e-9, equal_nan=True)
+
+def test_cpr_mensajes_binarios(pares):
+    binarios = pares.assign(msg_even=adsb_np.to_binary_array(adsb_np.to_raw_array(pares['msg_hex_even'])),
+                            msg_odd=adsb_np.to_binary_array(adsb_np.to_raw_array(pares['msg_hex_odd'])))
+    lat, lon = filtrado.decode_cpr_pairs(pares, 'msg_hex')
+    lat_b, lon_b = filtrado.decode_cpr_pairs(binarios, 'msg')
+    np.testing.assert_array_equal(lat_b, lat)
+    np.testing.assert_array_equal(lon_b, lon)
+
+# ------------------------------------------------------------------ zonas frente al sjoin de geopandas
+
+def runways_sjoin(df, geojson_path):
+    import geopandas as gpd
+    runways_utm = gpd.read_file(geojson_path).set_crs(epsg=4326, allow_override=True).to_crs(epsg=32630)
+    points_utm = gpd.GeoDataFrame(df.copy(), geometry=gpd.points_from_xy(df.lon, df.lat), crs="EPSG:4326").to_crs(epsg=32630)
+    joined = gpd.sjoin(points_utm, runways_utm[['RWY', 'geometry']], how='left', predicate='within')
+    joined = joined[~joined.index.duplicated(keep='first')]
+    return joined['RWY'].tolist()
+
+def holding_points_sjoin(df, geojson_path, buffer_radius=filtrado.HOLDING_BUFFER):
+    import geopandas as gpd
+    holding_points = gpd.read_file(geojson_path)
+    if 'id' not in holding_points.columns:
+        holding_points = holding_points.reset_index().rename(columns={'index': 'id'})
+    holding_points['buffered'] = holding_points.geometry.buffer(buffer_radius)
+    holding_points = holding_points.set_geometry('buffered')
+    puntos = gpd.GeoDataFrame(df.copy(), geometry=gpd.points_from_xy(df.lon, df.lat), crs="EPSG:4326")
+    joined = gpd.sjoin(puntos, holding_points[['id', 'buffered']], how='left', predicate='within')
+    return joined['id'].tolist()
+
+def como_lista(col):
+    return col.astype(object).where(col.notna(), None).tolist()
+
+@pytest.fixture(scope="module")
+def posiciones(dia):
+    """Posiciones del día en BBOX (rodajes, pistas y esperas) más puntos al azar por el aeropuerto."""
+    pos = pd.concat([filtrado.add_position(df_icao) for _, df_icao in dia.groupby('icao', observed=True)], ignore_index=True)
+    pos = pos.dropna(subset=['lat', 'lon'])
+    pos = pos[pos['lat'].between(filtrado.BBOX['lat_min'], filtrado.BBOX['lat_max']) &
+              pos['lon'].between(filtrado.BBOX['lon_min'], filtrado.BBOX['lon_max'])]
+    rng = np.random.default_rng(0)
+    azar = pd.DataFrame({'lat': filtrado.LAT + rng.uniform(-0.04, 0.04, 20000),
+                         'lon': filtrado.LON + rng.uniform(-0.04, 0.04, 20000)})
+    return pd.concat([pos[['lat', 'lon']], azar], ignore_index=True)
+
+@pytest.mark.parametrize("grid", [None, filtrado.ZONE_GRID], ids=["indice", "rejilla"])
+def test_pistas(monkeypatch, posiciones, grid):
+    monkeypatch.setattr(filtrado, "ZONE_GRID", grid)
+    esperado = runways_sjoin(posiciones, "../json/puntosespera/runways.geojson")
+    obtenido = como_lista(filtrado.adding_runways(posiciones, "../json/puntosespera/runways.geojson")['runway'])
+    assert sum(e is not None for e in esperado) > 1000
+    assert obtenido == [None if pd.isna(e) else e for e in esperado]
+
+# HOLDING_BUFFER va en grados, como en los polígonos de aeropuerto
+@pytest.mark.filterwarnings("ignore:Geometry is in a geographic CRS")
+@pytest.mark.parametrize("grid", [None, filtrado.ZONE_GRID], ids=["indice", "rejilla"])
+def test_puntos_espera(monkeypatch, posiciones, grid):
+    monkeypatch.setattr(filtrado, "ZONE_GRID", grid)
+    esperado = holding_points_sjoin(posiciones, "../json/puntosespera/holding_points.geojson")
+    obtenido = como_lista(filtrado.adding_holding_points(posiciones, "../json/puntosespera/holding_points.geojson")['holding_point_id'])
+    assert sum(not pd.isna(e) for e in esperado) > 100
+    assert obtenido == [None if pd.isna(e) else e for e in esperado]
+
+# ------------------------------------------------------------------ poda del día
+
+def filtrar(entrada, salida):
+    paths = [salida / tipo / "1.parquet" for tipo in ("despegues", "aterrizajes", "raros")]
+    for path in paths:
+        path.parent.mkdir(parents=True)
+    filtrado.process_data(str(entrada), *map(str, paths), processes=1)
+    return [pd.read_parquet(path) for path in paths]
+
+@pytest.fixture(scope="module")
+def dia_parquet(tmp_path_factory, dia):
+    assert dia['tc'].isna().sum() > 0  # DF11: filas sin tc
+    entrada = tmp_path_factory.mktemp("decodificado") / "1.parquet"
+    dia.to_parquet(entrada, row_group_size=4096)
+    return entrada
+
+@pytest.fixture(scope="module")
+def sin_poda(tmp_path_factory, dia_parquet):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(filtrado, "PRUNE_DAY", False)
+        return filtrar(dia_parquet, tmp_path_factory.mktemp("sin_poda"))
+
+def test_poda_mismo_resultado(monkeypatch, tmp_path, dia_parquet, sin_poda):
+    """Sin PRUNE_ALTITUDE la poda (ICAOs y ventanas) da exactamente los mismos despegues, aterrizajes y raros."""
+    monkeypatch.setattr(filtrado, "PRUNE_ALTITUDE", None)
+    podado = filtrar(dia_parquet, tmp_path)
+    assert len(podado[0]) > 0
+    for a, b in zip(podado, sin_poda):
+        pd.testing.assert_frame_equal(a, b)
+
+def test_poda_por_altitud(tmp_path, dia_parquet, sin_poda):
+    """Con PRUNE_ALTITUDE sólo se pierden los raros de ICAOs sin mensajes bajos cerca del aeropuerto (sobrevuelos)."""
+    despegues, aterrizajes, raros = filtrar(dia_parquet, tmp_path)
+    pd.testing.assert_frame_equal(despegues, sin_poda[0])
+    pd.testing.assert_frame_equal(aterrizajes, sin_poda[1])
+    perdidos = set(sin_poda[2]['icao'].unique()) - set(raros['icao'].unique()) if len(raros) else set(sin_poda[2]['icao'].unique())
+    assert all(icao >= sintetico.ICAO_SOBREVUELO for icao in perdidos)
+
+# ------------------------------------------------------------------ vuelos por columnas frente a vuelo a vuelo
+
+def filter_takeoffs_loop(flights):
+    """filter_takeoffs vuelo a vuelo (la versión anterior a la de reducciones por vuelo)."""
+    dfs_takeoffs = []
+    dfs_landings = []
+    dfs_raros = []
+    for _, flight in flights.groupby("flight_id"):
+        flight["altitude"] = flight["altitude"].ffill()
+        rw = flight["runway"].dropna().value_counts().idxmax()
+        flight["esta_en_pista"] = flight["runway"].notna()
+        flight["runway"] = flight["runway"].fillna(rw)
+        desnivel = flight["altitude"].diff().sum()
+        min_speed = flight["speed"].min()
+        todo_nans_speed = flight["speed"].isna().sum() == len(flight)
+        if desnivel > 1500 and (min_speed < 110 or todo_nans_speed):
+            dfs_takeoffs.append(flight)
+        elif desnivel < -500 and (min_speed < 100 or todo_nans_speed):
+            dfs_landings.append(flight)
+        else:
+            dfs_raros.append(flight)
+    takeoffs = pd.DataFrame()
+    landings = pd.DataFrame()
+    raros = pd.DataFrame()
+    if dfs_takeoffs:
+        takeoffs = pd.concat(dfs_takeoffs)
+        takeoffs["runway"] = takeoffs["runway"].astype("category")
+        takeoffs["flight_id"] = takeoffs["flight_id"].astype("uint8")
+    if dfs_landings:
+        landings = pd.concat(dfs_landings)
+        landings["runway"] = landings["runway"].astype("category")
+        landings["flight_id"] = landings["flight_id"].astype("uint8")
+    if dfs_raros:
+        raros = pd.concat(dfs_raros)
+        raros["runway"] = raros["runway"].astype("category")
+        raros["flight_id"] = raros["flight_id"].astype("uint8")
+
+    return takeoffs, landings, raros
+
+def extend_takeoffs_loop(takeoffs, icao):
+    """extend_takeoffs vuelo a vuelo (la versión anterior a la de reducciones por vuelo)."""
+    dfs = []
+    for flight_id, flight in takeoffs.groupby("flight_id"):
+        idx_llegada_holding_point = flight["holding_point_id"].first_valid_index()
+        flight = flight.loc[idx_llegada_holding_point: ]
+
+        idx_comienzo_despegue = flight[flight["altitude"] > 1000].first_valid_index()
+        flight = flight.loc[:idx_comienzo_despegue]
+        flight["momento_despegue"] = True if idx_comienzo_despegue is not None else False
+        if idx_comienzo_despegue is None or not flight.iloc[-1]["esta_en_pista"]:
+            flight["pos_recalculada"] = True
+            with open('../json/runway_takeoffs_centers.json', 'r', encoding='utf-8') as f:
+                runway_grids = json.load(f)
+            rw = flight.iloc[0]["runway"]
+            lat_despegue = runway_grids[rw]["lat_despegue_onground"]
+            lon_despegue = runway_grids[rw]["lon_despegue_onground"]
+            flight["lat_despegue"] = lat_despegue
+            flight["lon_despegue"] = lon_despegue
+            dists = np.sqrt((flight["lat"].to_numpy() - lat_despegue) ** 2 + (flight["lon"].to_numpy() - lon_despegue) ** 2)
+            idx_nearest = np.argmin(dists)
+            closest_point = flight.iloc[idx_nearest]
+            flight["hora_despegue"] = closest_point["ts"]
+
+            flight["hora_despegue_mala"] = flight.iloc[-1]["ts"]
+            flight["lat_despegue_mala"] = flight.iloc[-1]["lat"]
+            flight["lon_despegue_mala"] = flight.iloc[-1]["lon"]
+
+        else:
+            flight["hora_despegue"] = flight.iloc[-1]["ts"]
+            lat_despegue = flight.iloc[-1]["lat"]
+            lon_despegue = flight.iloc[-1]["lon"]
+            flight["lat_despegue"] = lat_despegue
+            flight["lon_despegue"] = lon_despegue
+
+        if idx_llegada_holding_point is not None:
+            flight["llegada_punto_espera"] = flight.iloc[0]["ts"]
+            flight["lat_espera"] = flight.iloc[0]["lat"]
+            flight["lon_espera"] = flight.iloc[0]["lon"]
+            aux = flight[flight["holding_point_id"].notna()]
+            aux = aux[aux["speed"] == 0]
+            flight["para_en_espera"] = (len(aux)>0)
+            flight["tiempo_en_espera"] = (flight["ts"] - flight["llegada_punto_espera"]).dt.total_seconds()
+        else:
+            flight["tiempo_en_espera"] = 0
+
+        flight["tiempo_hasta_despegue"] = (flight["hora_despegue"] - flight["ts"]).dt.total_seconds()
+        flight["distancia"] = flight.apply(
+            lambda row: filtrado.haversine_vectorized(row["lat"], row["lon"], lat_despegue, lon_despegue), axis=1
+        )
+        dfs.append(flight)
+    return pd.concat(dfs)
+
+@pytest.fixture(scope="module")
+def vuelos(dia):
+    """Entradas de filter_takeoffs de cada ICAO del día, con los pasos de process_icao hasta separate_flights."""
+    entradas = []
+    for icao, df_icao in dia.sort_values('ts', kind='stable').groupby('icao', observed=True):
+        if len(df_icao) < filtrado.MIN_MESSAGES:
+            continue
+        pos = filtrado.add_position(df_icao)
+        if pos.empty:
+            continue
+        pos = pos.set_index('ts')
+        pos[['lat', 'lon']] = pos[['lat', 'lon']].interpolate(method='time', limit_direction='both')
+        pos = pos.reset_index()
+        pos = pos[pos['lat'].between(filtrado.BBOX['lat_min'], filtrado.BBOX['lat_max']) &
+                  pos['lon'].between(filtrado.BBOX['lon_min'], filtrado.BBOX['lon_max'])]
+        if len(pos) == 0:
+            continue
+        pos = filtrado.adding_runways(pos, "../json/puntosespera/runways.geojson")
+        if pos['runway'].notna().any():
+            entradas.append(filtrado.separate_flights(pos))
+    assert sum(flights['flight_id'].nunique() for flights in entradas) >= 8
+    return entradas
+
+def test_filter_takeoffs(vuelos):
+    for flights in vuelos:
+        for a, b in zip(filtrado.filter_takeoffs(flights.copy()), filter_takeoffs_loop(flights.copy())):
+            pd.testing.assert_frame_equal(a, b)
+
+def test_extend_takeoffs(vuelos):
+    extendidos = 0
+    for flights in vuelos:
+        takeoffs = filtrado.filter_takeoffs(flights.copy())[0]
+        if takeoffs.empty:
+            continue
+        holdings = filtrado.adding_holding_points(takeoffs, "../json/puntosespera/holding_points.geojson")
+        pd.testing.assert_frame_equal(filtrado.extend_takeoffs(holdings.copy(), None), extend_takeoffs_loop(holdings.copy(), None))
+        extendidos += 1
+    assert extendidos > 0
+
+# ------------------------------------------------------------------ copias de varias antenas
+
+def test_dedup_mensaje_repetido():
+    ventana = 2.0
+    # el mismo mensaje cada 0.5 * ventana durante 5 ventanas, cada uno recibido por dos antenas a 0.1 s
+    t = np.arange(10) * 0.5 * ventana
+    t = np.sort(np.r_[t, t + 0.1])
+    day = pd.DataFrame({'ts': pd.to_datetime(t, unit='s'), 'msg_hex': "8D4840D6202CC371C32CE0576098"})
+    dedup = filtrado.dedup_messages(day, ventana)
+    # una copia por ventana, no sólo la primera de la serie
+    assert dedup['ts'].tolist() == pd.to_datetime(np.arange(5) * ventana, unit='s').tolist()
+    otro = day.assign(msg_hex="8D4840D6202CC371C32CE0576099")
+    assert len(filtrado.dedup_messages(pd.concat([day, otro]).sort_values('ts'), ventana)) == 10
@@ -0,0 +1,400 @@
+import os
+import math
+import time
+import socket
+import numpy as np
+import pandas as pd
+import pyModeS as pms
+from collections import deque
+import decodificacion
+import estela
+import ventanas
+from aeropuerto import Aeropuerto
+import puntosEspera
+# mismas constantes que el procesamiento por lotes: las variables en línea no pueden separarse de las de entrenamiento
+from filtrado import LAT, LON, BBOX
+from despeguesPrevios import VENTANAS
+import warnings
+
+warnings.filterwarnings("ignore")
+
+MODEL_PATH        = "../../models/Gradient_Boosting.joblib"
+# Preprocesador de limpieza.py (imputación, log, escalado y codificación) con el que se entrenó el modelo; obligatorio
+PREPROCESADOR_PATH = "../../models/preprocesador.joblib"
+
+CPR_MAX_GAP       = 10       # segundos entre mensajes par/impar para emparejarlos
+FLIGHT_GAP        = 300      # segundos sin pisar pista que separan dos vuelos
+TRAFFIC_WINDOW    = 5        # segundos hacia atrás para contar tráfico en pista/espera
+PREDICTION_EVERY  = 10       # segundos entre predicciones de un mismo avión parado en espera
+STATE_TTL         = 20 * 60  # segundos sin mensajes tras los que se olvida un ICAO
+TAKEOFF_ALTITUDE  = 1000
+
+# ---------------------------------------------------------------- fuentes
+
+class FileTailSource:
+    """Lee líneas 'ts_kafka;message' de un CSV y, con follow, espera a que se añadan más (tail -f)."""
+    def __init__(self, path, follow=True, poll=0.5):
+        self.path, self.follow, self.poll = path, follow, poll
+
+    def __iter__(self):
+        with open(self.path, 'r') as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    if not self.follow:
+                        return
+                    time.sleep(self.poll)
+                    continue
+                record = parse_line(line)
+                if record is not None:
+                    yield record
+
+class SocketSource:
+    """Servidor TCP que recibe líneas 'ts_kafka;message' (p. ej. enviadas con netcat)."""
+    def __init__(self, host="127.0.0.1", port=30005):
+        self.host, self.port = host, port
+
+    def __iter__(self):
+        with socket.create_server((self.host, self.port)) as server:
+            conn, _ = server.accept()
+            with conn, conn.makefile('r') as f:
+                for line in f:
+                    record = parse_line(line)
+                    if record is not None:
+                        yield record
+
+class KafkaSource:
+    """Consume el topic de Kafka original; el valor es el mensaje en base64 y ts_kafka el timestamp del registro."""
+    def __init__(self, topic, bootstrap_servers="localhost:9092", group_id="macbrides-tiempo-real"):
+        try:
+            from kafka import KafkaConsumer
+        except ImportError:
+            raise ImportError("KafkaSource necesita kafka-python (pip install kafka-python)")
+        self.consumer = KafkaConsumer(topic, bootstrap_servers=bootstrap_servers, group_id=group_id,
+                                      value_deserializer=lambda v: v.decode('ascii'))
+
+    def __iter__(self):
+        for record in self.consumer:
+            yield record.timestamp, record.value
+
+def parse_line(line):
+    partes = line.strip().split(';')
+    if len(partes) < 2 or not partes[0].isdigit():
+        return None
+    return int(partes[0]), partes[1]
+
+# ---------------------------------------------------------------- estado por ICAO
+
+class EstadoAvion:
+    __slots__ = ('icao', 'last_ts', 'even', 'odd', 'lat', 'lon', 'altitude', 'speed', 'flight_id',
+                 'runway', 'esta_en_pista', 'last_runway_ts', 'holding_point_id', 'llegada_punto_espera',
+                 'last_prediction_ts', 'despegado')
+
+    def __init__(self, icao):
+        self.icao = icao
+        self.last_ts = None
+        self.even = None
+        self.odd = None
+        self.lat = self.lon = np.nan
+        self.altitude = self.speed = np.nan
+        self.flight_id = 1
+        self.esta_en_pista = False
+        self.last_runway_ts = None
+        self.nuevo_vuelo()
+
+    def nuevo_vuelo(self):
+        self.runway = None
+        self.holding_point_id = None
+        self.llegada_punto_espera = None
+        self.last_prediction_ts = None
+        self.despegado = False
+
+class LatencyBudget:
+    """Latencias por mensaje (ms) de cada etapa: espera en el lote, decodificación, estado y predicción."""
+    ETAPAS = ('espera', 'decodificacion', 'estado', 'prediccion', 'total')
+
+    def __init__(self, maxlen=100_000):
+        self.samples = {etapa: deque(maxlen=maxlen) for etapa in self.ETAPAS}
+
+    def add(self, etapa, ms):
+        self.samples[etapa].append(ms)
+
+    def extend(self, etapa, ms):
+        self.samples[etapa].extend(ms)
+
+    def report(self):
+        print("\n⏱️ Presupuesto de latencia por mensaje (ms):")
+        print(f"   {'etapa':<15}{'n':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for etapa in self.ETAPAS:
+            valores = np.asarray(self.samples[etapa])
+            if len(valores) == 0:
+                continue
+            p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+            print(f"   {etapa:<15}{len(valores):>9}{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}{valores.max():>10.3f}")
+
+def haversine(lat1, lon1, lat2, lon2, R=6371):
+    φ1, φ2 = math.radians(lat1), math.radians(lat2)
+    Δφ, Δλ = φ2 - φ1, math.radians(lon2 - lon1)
+    a = math.sin(Δφ/2)**2 + math.cos(φ1)*math.cos(φ2)*math.sin(Δλ/2)**2
+    return (R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))) * 1000
+
+def cyclic(valor, periodo):
+    angulo = 2 * math.pi * valor / periodo
+    return math.sin(angulo), math.cos(angulo)
+
+def columnas_preprocesador(ct):
+    """Nombres de las columnas que produce el ColumnTransformer de limpieza.py, en orden (sus pasos no las renombran)."""
+    return [str(col) for name, transformer, cols in ct.transformers_
+            if name != 'remainder' and not (isinstance(transformer, str) and transformer == 'drop') for col in cols]
+
+# ---------------------------------------------------------------- motor
+
+class MotorTiempoReal:
+    def __init__(self, aeropuerto=None, model_path=MODEL_PATH, preprocesador_path=PREPROCESADOR_PATH, on_prediction=None):
+        import joblib
+        # el modelo se entrenó con variables transformadas: sin el preprocesador sus predicciones no valen
+        if not preprocesador_path or not os.path.exists(preprocesador_path):
+            raise FileNotFoundError(f"Falta el preprocesador de entrenamiento ({preprocesador_path}): "
+                                    "se guarda al ejecutar limpieza/limpieza.py")
+        self.aeropuerto = aeropuerto or Aeropuerto()
+        self.model = joblib.load(model_path)
+        self.preprocesador = joblib.load(preprocesador_path)
+        self.features = [str(col) for col in getattr(self.model, 'feature_names_in_', [])]
+        self.entradas = [str(col) for col in self.preprocesador.feature_names_in_]
+        self.salidas = columnas_preprocesador(self.preprocesador)
+        sin_preprocesar = [col for col in self.features if col not in self.salidas]
+        if sin_preprocesar:
+            raise ValueError(f"El preprocesador no produce las variables del modelo: {sin_preprocesar}")
+        self.on_prediction = on_prediction or self.print_prediction
+        self.aviones = {}
+        self.despegues = {rw: deque() for rw in self.aeropuerto.runway_order}
+        # estela de cada ICAO: registro de decodificacion, ampliado con las respuestas BDS 4,5 que llegan en línea
+        self.estela = estela.registro()
+        self.latencias = LatencyBudget()
+        self.no_disponibles = set()
+        self.mensajes = 0
+        self.predicciones = 0
+
+    # -- estado ----------------------------------------------------------
+
+    def update(self, ts, fila):
+        """Actualiza el estado del ICAO con un mensaje decodificado; devuelve el estado si procede predecir."""
+        icao = fila.icao
+        estado = self.aviones.get(icao)
+        if estado is None:
+            estado = self.aviones[icao] = EstadoAvion(icao)
+        estado.last_ts = ts
+
+        tc = fila.tc
+        if not pd.isna(fila.altitude):
+            estado.altitude = fila.altitude
+        if not pd.isna(fila.speed):
+            estado.speed = fila.speed
+
+        if not pd.isna(tc) and 5 <= tc <= 18:
+            self.update_position(estado, ts, fila)
+
+        if estado.runway is not None and not estado.despegado and estado.llegada_punto_espera is not None \
+                and estado.altitude > TAKEOFF_ALTITUDE:
+            estado.despegado = True
+            self.despegues[estado.runway].append((ts, icao))
+
+        if estado.holding_point_id is not None and estado.speed == 0 and not estado.despegado:
+            if estado.last_prediction_ts is None or ts - estado.last_prediction_ts >= PREDICTION_EVERY * 1000:
+                estado.last_prediction_ts = ts
+                return estado
+        return None
+
+    def update_position(self, estado, ts, fila):
+        msg = (fila.msg_hex, ts)
+        if fila.oe_flag == 0:
+            estado.even, pareja = msg, estado.odd
+        else:
+            estado.odd, pareja = msg, estado.even
+        if pareja is None or ts - pareja[1] > CPR_MAX_GAP * 1000:
+            return
+        even, odd = estado.even, estado.odd
+        try:
+            lat, lon = pms.adsb.position(even[0], odd[0], even[1], odd[1], LAT, LON)
+        except (RuntimeError, TypeError):
+            return
+        if lat is None or lon is None:
+            return
+        if not (BBOX['lon_min'] <= lon <= BBOX['lon_max'] and BBOX['lat_min'] <= lat <= BBOX['lat_max']):
+            return
+        estado.lat, estado.lon = lat, lon
+
+        runway = self.aeropuerto.runway_at(lon, lat)
+        estado.esta_en_pista = runway is not None
+        if runway is not None:
+            if estado.last_runway_ts is not None and ts - estado.last_runway_ts > FLIGHT_GAP * 1000:
+                estado.flight_id += 1
+                estado.nuevo_vuelo()
+            estado.last_runway_ts = ts
+
+        holding = self.aeropuerto.holding_at(lon, lat)
+        if holding is not None:
+            if estado.llegada_punto_espera is None:
+                estado.llegada_punto_espera = ts
+                estado.runway = self.aeropuerto.holding_runway[holding]
+            estado.holding_point_id = holding
+        elif runway is not None and estado.runway is None:
+            estado.runway = runway
+
+    def expire(self, ts):
+        limite = ts - STATE_TTL * 1000
+        for icao in [icao for icao, e in self.aviones.items() if e.last_ts < limite]:
+            del self.aviones[icao]
+        for despegues in self.despegues.values():
+            while despegues and despegues[0][0] < ts - max(VENTANAS.values()) * 60 * 1000 * 2:
+                despegues.popleft()
+
+    # -- variables -------------------------------------------------------
+
+    def build_features(self, estado, fila):
+        ts = estado.last_ts
+        rw = estado.runway
+        hora = pd.Timestamp(ts, unit='ms')
+        center = self.aeropuerto.centers[rw]
+        f = {
+            'tiempo_en_espera': (ts - estado.llegada_punto_espera) / 1000,
+            'distancia': haversine(estado.lat, estado.lon, center['lat_despegue_onground'], center['lon_despegue_onground']),
+            'runway': rw,
+            'holding_point_id': estado.holding_point_id,
+        }
+        f['hour_sin'], f['hour_cos'] = cyclic(hora.hour + hora.minute / 60, 24)
+        f['month_sin'], f['month_cos'] = cyclic(hora.month, 12)
+        f['day_of_week_sin'], f['day_of_week_cos'] = cyclic(hora.dayofweek, 7)
+
+        # mismo motor de ventanas que despeguesPrevios, con un solo instante de consulta
+        horas = np.sort(np.fromiter((t for t, _ in self.despegues[rw]), dtype=np.int64, count=len(self.despegues[rw])))
+        n, media = ventanas.contar(horas, [ts], [minutos * 60 * 1000 for minutos in VENTANAS.values()])
+        for k, nombre in enumerate(VENTANAS):
+            f[f'despegues_previos_{nombre}'] = int(n[k, 0])
+            f[f'media_diff_{nombre}'] = media[k, 0] / 1000
+        previos = np.searchsorted(horas, ts)
+        if previos:
+            f['tiempo_desde_ultimo_despegue'] = (ts - horas[previos - 1]) / 1000
+
+        desde = ts - TRAFFIC_WINDOW * 1000
+        otros = [e for e in self.aviones.values() if e.icao != estado.icao and e.last_ts >= desde and e.runway == rw]
+        en_espera = [e for e in otros if e.holding_point_id is not None and not e.despegado]
+        en_pista = [e for e in otros if e.esta_en_pista]
+        f['holding_ocupado'] = len(en_espera) > 0
+        f['num_holding_aircrafts'] = len(en_espera)
+        f['pista_ocupada'] = len(en_pista) > 0
+        f['num_en_pista_aircrafts'] = len(en_pista)
+        tiempos = sorted(((ts - e.llegada_punto_espera) / 1000 for e in en_espera), reverse=True)
+        for i, t in enumerate(tiempos[:3]):
+            f[f'tiempo_holding_{i}'] = t
+
+        f.update({k: v for k, v in puntosEspera.get_info_extra(fila.msg_hex).items() if v is not None})
+        wake_vortex = self.estela.get(estado.icao)
+        if wake_vortex is not None:
+            f['wake_vortex'] = wake_vortex
+        return f
+
+    def predict(self, estado, fila):
+        valores = self.build_features(estado, fila)
+        faltan = [col for col in self.entradas if pd.isna(valores.get(col, np.nan))]
+        self.no_disponibles.update(faltan)
+        # las variables que no pueden calcularse en línea las imputa el preprocesador como en el entrenamiento
+        X = pd.DataFrame([{col: valores.get(col, np.nan) for col in self.entradas}])
+        X = pd.DataFrame(self.preprocesador.transform(X), columns=self.salidas)[self.features]
+        tiempo = float(np.expm1(self.model.predict(X)[0]))
+        self.predicciones += 1
+        return {
+            'ts': pd.Timestamp(estado.last_ts, unit='ms'),
+            'icao': estado.icao,
+            'flight_id': estado.flight_id,
+            'runway': estado.runway,
+            'holding_point_id': estado.holding_point_id,
+            'tiempo_en_espera': valores['tiempo_en_espera'],
+            'tiempo_hasta_despegue': tiempo,
+            'hora_despegue_estimada': pd.Timestamp(estado.last_ts, unit='ms') + pd.Timedelta(seconds=tiempo),
+        }
+
+    @staticmethod
+    def print_prediction(prediccion):
+        print(f"🛫 {prediccion['ts']} {prediccion['icao']:06X} pista {prediccion['runway']} "
+              f"espera {prediccion['holding_point_id']}: despegue en {prediccion['tiempo_hasta_despegue']:.0f}s "
+              f"(~{prediccion['hora_despegue_estimada']:%H:%M:%S})", flush=True)
+
+    # -- bucle -----------------------------------------------------------
+
+    def process_batch(self, lote, llegadas):
+        t_decode = time.perf_counter()
+        chunk = pd.DataFrame(lote, columns=['ts_kafka', 'message'])
+        obs_estela = []
+        decoded = decodificacion.process_chunk(chunk, obs_estela=obs_estela)
+        for obs in obs_estela:
+            self.estela.add(obs)
+        t_estado = time.perf_counter()
+        decode_ms = (t_estado - t_decode) * 1000 / len(lote)
+
+        # el estado trabaja en ms enteros; icao es el uint32 del registro de esquema (nulo si no es válido)
+        ts_ms = decoded['ts'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        predicciones = []
+        for ts, fila in zip(ts_ms, decoded.itertuples(index=False)):
+            if pd.isna(fila.icao):
+                continue
+            t0 = time.perf_counter()
+            estado = self.update(int(ts), fila)
+            t1 = time.perf_counter()
+            self.latencias.add('estado', (t1 - t0) * 1000)
+            if estado is not None:
+                prediccion = self.predict(estado, fila)
+                t2 = time.perf_counter()
+                self.latencias.add('prediccion', (t2 - t1) * 1000)
+                predicciones.append(prediccion)
+        fin = time.perf_counter()
+
+        self.latencias.extend('espera', ((t_decode - llegada) * 1000 for llegada in llegadas))
+        self.latencias.extend('decodificacion', [decode_ms] * len(lote))
+        self.latencias.extend('total', ((fin - llegada) * 1000 for llegada in llegadas))
+        self.mensajes += len(lote)
+        if len(decoded):
+            self.expire(int(ts_ms[-1]))
+        for prediccion in predicciones:
+            self.on_prediction(prediccion)
+        return predicciones
+
+    def run(self, source, batch_size=256, max_wait=0.2, report_every=60):
+        """Agrupa la fuente en microlotes (batch_size mensajes o max_wait segundos) y los procesa."""
+        lote, llegadas = [], []
+        inicio_lote = time.perf_counter()
+        ultimo_informe = inicio_lote
+        try:
+            for record in source:
+                ahora = time.perf_counter()
+                lote.append(record)
+                llegadas.append(ahora)
+                if len(lote) >= batch_size or ahora - inicio_lote >= max_wait:
+                    self.process_batch(lote, llegadas)
+                    lote, llegadas = [], []
+                    inicio_lote = time.perf_counter()
+                    if inicio_lote - ultimo_informe >= report_every:
+                        self.report()
+                        ultimo_informe = inicio_lote
+            if lote:
+                self.process_batch(lote, llegadas)
+        except KeyboardInterrupt:
+            print("\n🛑 Detenido por el usuario.")
+        self.report()
+
+    def report(self):
+        print(f"\n📡 {self.mensajes} mensajes, {len(self.aviones)} aviones en seguimiento, {self.predicciones} predicciones")
+        self.latencias.report()
+        if self.no_disponibles:
+            print(f"⚠️ Variables no calculables en línea (imputadas por el preprocesador): {sorted(self.no_disponibles)}")
+
+def main():
+    # Para pruebas sin Kafka: FileTailSource sobre un CSV en crecimiento o SocketSource + netcat
+    # source = KafkaSource("adsb", bootstrap_servers="localhost:9092")
+    # source = SocketSource("127.0.0.1", 30005)
+    source = FileTailSource("D:/data/raw/live.csv", follow=True)
+    motor = MotorTiempoReal()
+    motor.run(source)
+
+if __name__ == "__main__":
+    main()
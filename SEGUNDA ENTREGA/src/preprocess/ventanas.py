@@ -0,0 +1,36 @@
+import numpy as np
+
+# Despegues previos en ventanas móviles para todas las filas y todas las ventanas en una sola llamada:
+# con los despegues de la pista ordenados, los de la ventana (ts - w, ts) de cada fila son el tramo
+# [lo, hi) que dan dos searchsorted. La suma de las separaciones del tramo sale de la suma acumulada de
+# las separaciones, que es telescópica: P[hi - 1] - P[lo] = horas[hi - 1] - horas[lo]. Lo usan
+# despeguesPrevios (por lotes) y tiempoReal (un instante cada vez)
+
+def contar(horas, ts, ventanas):
+    """Despegues con ts - ventana < hora < ts y media de la separación entre ellos, por ventana y fila.
+
+    horas: instantes de despegue ordenados; ts: instantes de consulta; ventanas: longitudes de ventana.
+    Todo como enteros en la misma unidad (ns, ms...). Devuelve (n, media), ambos de forma
+    (len(ventanas), len(ts)); media es float y NaN con menos de dos despegues en la ventana.
+    """
+    horas = np.asarray(horas, dtype=np.int64)
+    ts = np.asarray(ts, dtype=np.int64)
+    ventanas = np.asarray(ventanas, dtype=np.int64).reshape(-1, 1)
+
+    hi = np.searchsorted(horas, ts, side='left')                      # primer despegue >= ts
+    lo = np.searchsorted(horas, ts[None, :] - ventanas, side='right')  # primer despegue > ts - ventana
+    n = np.maximum(hi - lo, 0)
+
+    media = np.full(n.shape, np.nan)
+    varios = n >= 2
+    if varios.any():
+        hi_v = np.broadcast_to(hi, n.shape)[varios]
+        media[varios] = (horas[hi_v - 1] - horas[lo[varios]]) / (n[varios] - 1)
+    return n, media
+
+def contar_despegues(horas, ts, minutos):
+    """contar con datetime64 (instantes) y ventanas en minutos; la media sale como timedelta64[ns] (NaT sin pares)."""
+    horas = np.asarray(horas, dtype='datetime64[ns]').astype(np.int64)
+    ts = np.asarray(ts, dtype='datetime64[ns]').astype(np.int64)
+    n, media = contar(horas, ts, [int(m * 60 * 10**9) for m in minutos])
+    return n, np.where(np.isnan(media), np.iinfo(np.int64).min, np.trunc(media)).astype(np.int64).view('timedelta64[ns]')